@@ -46,7 +46,7 @@ class DataLoaderConfig:
     num_workers: int = 6
     pin_memory: bool = True
     drop_last: bool = True
-    prefetch_factor: str = "${hyperparameters.batch_size}"
+    prefetch_factor: int = 2
 
 
 @dataclass
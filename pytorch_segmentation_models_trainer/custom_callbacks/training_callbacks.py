@@ -105,16 +105,18 @@ class FrameFieldOnlyCrossfieldWarmupCallback(pl.callbacks.base.Callback):
 
 
 class FrameFieldComputeWeightNormLossesCallback(pl.callbacks.base.Callback):
-    def __init__(self) -> None:
+    def __init__(self, warmup_num_workers=4, warmup_prefetch_factor=4) -> None:
         super().__init__()
         self.loss_norm_is_initializated = False
+        self.warmup_num_workers = warmup_num_workers
+        self.warmup_prefetch_factor = warmup_prefetch_factor
 
     def on_train_epoch_start(self, trainer, pl_module) -> None:
         if self.loss_norm_is_initializated or trainer.current_epoch > 1:
             return
         pl_module.model.train()  # Important for batchnorm and dropout, even in computing loss norms
-        init_dl = pl_module.train_dataloader()
-        with torch.no_grad():
+        init_dl = self.get_warmup_dataloader(pl_module.train_dataloader())
+        with torch.inference_mode():
             loss_norm_batches_min = (
                 pl_module.cfg.loss_params.multiloss.normalization_params.min_samples
                 // (2 * pl_module.cfg.hyperparameters.batch_size)
@@ -130,3 +132,30 @@ class FrameFieldComputeWeightNormLossesCallback(pl.callbacks.base.Callback):
             )
             pl_module.compute_loss_norms(init_dl, loss_norm_batches)
         self.loss_norm_is_initializated = True
+
+    def get_warmup_dataloader(self, init_dl: DataLoader) -> DataLoader:
+        """Builds a dedicated loader for the loss norm warmup pass, with pinned
+        memory and worker prefetching, so that the model does not wait for the
+        decoding of each batch.
+
+        Args:
+            init_dl (DataLoader): train dataloader of the pl_module
+
+        Returns:
+            DataLoader: dataloader over the same dataset
+        """
+        num_workers = max(init_dl.num_workers, self.warmup_num_workers)
+        # torch refuses a prefetch_factor when the data is loaded in the main process
+        worker_kwargs = (
+            {"prefetch_factor": self.warmup_prefetch_factor} if num_workers > 0 else {}
+        )
+        return DataLoader(
+            init_dl.dataset,
+            batch_size=init_dl.batch_size,
+            shuffle=True,
+            num_workers=num_workers,
+            pin_memory=True,
+            drop_last=init_dl.drop_last,
+            collate_fn=init_dl.collate_fn,
+            **worker_kwargs,
+        )
@@ -23,6 +23,7 @@ import itertools
 from typing import List, Tuple, Union
 import numpy as np
 import similaritymeasures as sm
+from geopandas import GeoSeries
 from shapely.geometry import Polygon, LineString, Point
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry.multipolygon import MultiPolygon
@@ -59,6 +60,50 @@ def polygon_iou(
     return _iou_with_invalid_geom(geom1, geom2)
 
 
+def batch_polygon_iou(
+    batch_polygon_a: Union[np.ndarray, List[np.ndarray]],
+    batch_polygon_b: Union[np.ndarray, List[np.ndarray]],
+) -> np.ndarray:
+    """Compute the polygon iou between two polygon batches. The valid pairs are
+    handled by a single GeoSeries intersection call (vectorized by geopandas when
+    pygeos is available), while pairs with an invalid geometry fall back to
+    polygon_iou.
+
+    Args:
+        batch_polygon_a (Union[np.ndarray, List[np.ndarray]]): predicted polygons
+        batch_polygon_b (Union[np.ndarray, List[np.ndarray]]): ground truth polygons
+
+    Returns:
+        np.ndarray: (N, 3) array with the iou, the intersection area and the union
+            area of each pair of polygons
+    """
+    geoseries_a = GeoSeries(
+        [polygonrnn_utils.handle_vertices(vertices) for vertices in batch_polygon_a],
+        dtype="geometry",
+    )
+    geoseries_b = GeoSeries(
+        [polygonrnn_utils.handle_vertices(vertices) for vertices in batch_polygon_b],
+        dtype="geometry",
+    )
+    output = np.zeros((len(geoseries_a), 3), dtype=np.float64)
+    if len(geoseries_a) == 0:
+        return output
+    valid_mask = (geoseries_a.is_valid & geoseries_b.is_valid).to_numpy()
+    valid_a, valid_b = geoseries_a[valid_mask], geoseries_b[valid_mask]
+    intersection = valid_a.intersection(valid_b, align=False).area.to_numpy()
+    union = valid_a.area.to_numpy() + valid_b.area.to_numpy() - intersection
+    output[valid_mask, 0] = np.divide(
+        intersection, union, out=np.zeros_like(intersection), where=union != 0
+    )
+    output[valid_mask, 1] = intersection
+    output[valid_mask, 2] = union
+    for idx in np.flatnonzero(~valid_mask):
+        output[idx] = _iou_with_invalid_geom(
+            geoseries_a.iloc[idx], geoseries_b.iloc[idx]
+        )
+    return output
+
+
 def shapely_polygon_iou(polygon_a: Polygon, polygon_b: Polygon) -> float:
     """Compute the iou between two polygons.
 
@@ -18,9 +18,11 @@
  *                                                                         *
  ****
 """
+import warnings
 import torch
 from torch import nn
 from torch.nn.modules.loss import _Loss
+from torch.nn.utils.fusion import fuse_conv_bn_eval
 from torchvision.models.detection.faster_rcnn import FasterRCNN
 from torchvision.models.detection.backbone_utils import resnet_fpn_backbone
 from torchvision.ops import RoIAlign, roi_align
@@ -48,11 +50,13 @@ class FinalConvBlock(torch.nn.Module):
         kernel_size: Tuple = (3, 3),
         apply_pooling: bool = False,
         upsample_factor: int = 1.0,
+        groups: int = 1,
     ):
         super().__init__()
         assert upsample_factor >= 1, "upsample_factor must be equal or greater than 1.0"
         self.in_channels = in_channels
         self.out_channels = out_channels
+        self.groups = groups
         self.conv_block = torch.nn.Sequential(
             torch.nn.MaxPool2d(2, 2) if apply_pooling else torch.nn.Identity(),
             torch.nn.Conv2d(
@@ -61,9 +65,10 @@ class FinalConvBlock(torch.nn.Module):
                 kernel_size=kernel_size,
                 stride=1,
                 padding=1,
+                groups=groups,
             ),
-            torch.nn.ReLU(),
             torch.nn.BatchNorm2d(out_channels),
+            torch.nn.ReLU(inplace=True),
             torch.nn.Identity()
             if upsample_factor == 1.0
             else torch.nn.Upsample(scale_factor=upsample_factor, mode="bilinear"),
@@ -83,36 +88,95 @@ class FinalConvBlock(torch.nn.Module):
                 if m.biase is not None:
                     nn.init.constant_(m.bias, 0)
 
+    def fuse_conv_bn(self):
+        """Folds the batch norm into the preceding convolution. Only valid in eval
+        mode, since the batch norm statistics are frozen into the conv weights.
+        """
+        assert not self.training, "conv-bn fusion is only valid in eval mode"
+        if not isinstance(self.conv_block[2], nn.BatchNorm2d):
+            return
+        self.conv_block[1] = fuse_conv_bn_eval(self.conv_block[1], self.conv_block[2])
+        self.conv_block[2] = nn.Identity()
+
+    def _load_from_state_dict(
+        self,
+        state_dict,
+        prefix,
+        local_metadata,
+        strict,
+        missing_keys,
+        unexpected_keys,
+        error_msgs,
+    ):
+        # blocks saved before the Conv -> BN -> ReLU reorder kept the batch norm at
+        # index 3 (Conv -> ReLU -> BN), which no longer matches this layout.
+        if f"{prefix}conv_block.3.running_mean" in state_dict:
+            raise RuntimeError(
+                f"{prefix}conv_block was saved with the old Conv -> ReLU -> BN "
+                "FinalConvBlock layout, which is not compatible with the current "
+                "Conv -> BN -> ReLU one. Checkpoints from before this change must be "
+                "retrained."
+            )
+        super()._load_from_state_dict(
+            state_dict,
+            prefix,
+            local_metadata,
+            strict,
+            missing_keys,
+            unexpected_keys,
+            error_msgs,
+        )
+
     def forward(self, x: torch.Tensor) -> torch.Tensor:
         x = self.conv_block(x)
         return x
 
 
 class GenericPolygonRNN(torch.nn.Module):
-    def __init__(self, backbone, grid_size=28):
+    def __init__(
+        self,
+        backbone,
+        grid_size=28,
+        compile_graph=False,
+        grouped_final_conv=False,
+        cuda_graph_inference=False,
+    ):
         super().__init__()
         self.backbone = backbone
         self.grid_size = grid_size
-        self.final_conv_block1 = FinalConvBlock(
-            in_channels=256, out_channels=128, kernel_size=(3, 3), apply_pooling=True
-        )
-        self.final_conv_block2 = FinalConvBlock(
-            in_channels=256, out_channels=128, kernel_size=(3, 3), apply_pooling=False
-        )
-        self.final_conv_block3 = FinalConvBlock(
-            in_channels=256,
-            out_channels=128,
-            kernel_size=(3, 3),
-            apply_pooling=False,
-            upsample_factor=2.0,
-        )
-        self.final_conv_block4 = FinalConvBlock(
-            in_channels=256,
-            out_channels=128,
-            kernel_size=(3, 3),
-            apply_pooling=False,
-            upsample_factor=4.0,
-        )
+        self.grouped_final_conv = grouped_final_conv
+        if grouped_final_conv:
+            # the four FPN levels are resampled to the grid size and processed by a
+            # single grouped convolution (one group per level).
+            self.final_conv_block = self._build_grouped_final_conv_block()
+        else:
+            self.final_conv_block1 = FinalConvBlock(
+                in_channels=256,
+                out_channels=128,
+                kernel_size=(3, 3),
+                apply_pooling=True,
+            )
+            self.final_conv_block2 = FinalConvBlock(
+                in_channels=256,
+                out_channels=128,
+                kernel_size=(3, 3),
+                apply_pooling=False,
+            )
+            self.final_conv_block3 = FinalConvBlock(
+                in_channels=256,
+                out_channels=128,
+                kernel_size=(3, 3),
+                apply_pooling=False,
+                upsample_factor=2.0,
+            )
+            self.final_conv_block4 = FinalConvBlock(
+                in_channels=256,
+                out_channels=128,
+                kernel_size=(3, 3),
+                apply_pooling=False,
+                upsample_factor=4.0,
+            )
+        self.poollayer = torch.nn.MaxPool2d(2, 2)
         self.upsample1 = torch.nn.Upsample(scale_factor=2.0, mode="bilinear")
         self.upsample2 = torch.nn.Upsample(scale_factor=4.0, mode="bilinear")
         self.convlayer5 = make_basic_conv_block(512, 128, 3, 1, 1)
@@ -126,13 +190,55 @@ class GenericPolygonRNN(torch.nn.Module):
             bias=True,
             return_all_layers=True,
         )
+        # lstmlayer works on the cuDNN native (seq_len, batch, features) layout
         self.lstmlayer = nn.LSTM(
             grid_size * grid_size * 8 + (grid_size * grid_size + 3) * 2,
             grid_size * grid_size * 2,
-            batch_first=True,
+            batch_first=False,
         )
         self.linear = nn.Linear(grid_size * grid_size * 2, grid_size * grid_size + 3)
+        self._register_constant_buffers()
+        self.cuda_graph_inference = cuda_graph_inference and hasattr(
+            torch.cuda, "graph"
+        )
+        self._decode_step_graphs = {}
         self.init_weights()
+        if compile_graph:
+            self.compile_graph()
+
+    def compile_graph(self):
+        """Compiles the static-shape parts of the network (feature head and the
+        teacher-forced rnn) with torch.compile. test is left eager because its
+        loop length varies. Requires torch>=2.0; ignored on older versions.
+        """
+        if not hasattr(torch, "compile"):
+            warnings.warn(
+                "torch.compile is not available in this torch version. "
+                "GenericPolygonRNN will run in eager mode."
+            )
+            return
+        self.get_backbone_output_features = torch.compile(
+            self.get_backbone_output_features, dynamic=False
+        )
+        self.get_rnn_output = torch.compile(self.get_rnn_output, dynamic=False)
+
+    def _register_constant_buffers(self):
+        """Registers the constant tensors used to build the rnn inputs, so that they
+        are allocated once and follow the module device. They are expanded to the
+        batch size when used and are never written to.
+        """
+        vocab_size = self.grid_size * self.grid_size + 3
+        self.register_buffer(
+            "_zero_gxg",
+            torch.zeros(1, 1, 1, self.grid_size, self.grid_size),
+            persistent=False,
+        )
+        second_init = torch.zeros(1, 1, vocab_size)
+        second_init[:, 0, vocab_size - 2] = 1
+        third_init = torch.zeros(1, 1, vocab_size)
+        third_init[:, 0, vocab_size - 1] = 1
+        self.register_buffer("_second_init", second_init, persistent=False)
+        self.register_buffer("_third_init", third_init, persistent=False)
 
     def init_weights(self):
         """
@@ -160,6 +266,8 @@ class GenericPolygonRNN(torch.nn.Module):
             elif "weight" in name:
                 # nn.init.xavier_normal_(param)
                 nn.init.orthogonal_(param)
+        # device and dtype moves are already handled by nn.LSTM._apply
+        self.lstmlayer.flatten_parameters()
 
     def _init_convlstm(self):
         for name, param in self.convlstm.named_parameters():
@@ -168,24 +276,99 @@ class GenericPolygonRNN(torch.nn.Module):
             elif "weight" in name:
                 nn.init.xavier_normal_(param)
 
-    def _init_final_conv_blocks(self):
-        for block in [
+    @property
+    def final_conv_blocks(self) -> List[FinalConvBlock]:
+        if self.grouped_final_conv:
+            return [self.final_conv_block]
+        return [
             self.final_conv_block1,
             self.final_conv_block2,
             self.final_conv_block3,
             self.final_conv_block4,
-        ]:
+        ]
+
+    def _init_final_conv_blocks(self):
+        for block in self.final_conv_blocks:
             block.init_weights()
 
+    def _build_grouped_final_conv_block(self) -> FinalConvBlock:
+        return FinalConvBlock(
+            in_channels=4 * 256, out_channels=4 * 128, kernel_size=(3, 3), groups=4
+        )
+
+    def group_final_conv_blocks(self):
+        """Replaces the four final conv blocks by the grouped block, copying each
+        block's conv and batch norm parameters into its group slice. Used to port
+        weights trained without grouping. Levels "2" and "3" are upsampled before
+        the convolution in the grouped block, so their outputs are close to, but
+        not the same as, the original ones. Blocks already fused by fuse_conv_bn
+        give a fused grouped block, with only the conv parameters copied.
+        """
+        if self.grouped_final_conv:
+            return
+        fused = [
+            not isinstance(block.conv_block[2], nn.BatchNorm2d)
+            for block in self.final_conv_blocks
+        ]
+        if any(fused) and not all(fused):
+            raise ValueError(
+                "Cannot group final conv blocks when only some of them are fused."
+            )
+        grouped_block = (
+            self._build_grouped_final_conv_block()
+            .to(self.final_conv_block1.conv_block[1].weight.device)
+            .train(self.training)
+        )
+        if all(fused):
+            grouped_block.conv_block[2] = nn.Identity()
+        grouped_conv, grouped_bn = (
+            grouped_block.conv_block[1],
+            grouped_block.conv_block[2],
+        )
+        with torch.no_grad():
+            for idx, block in enumerate(self.final_conv_blocks):
+                conv, bn = block.conv_block[1], block.conv_block[2]
+                group_slice = slice(
+                    idx * conv.out_channels, (idx + 1) * conv.out_channels
+                )
+                grouped_conv.weight[group_slice].copy_(conv.weight)
+                grouped_conv.bias[group_slice].copy_(conv.bias)
+                if not isinstance(bn, nn.BatchNorm2d):
+                    continue
+                for name in ["weight", "bias", "running_mean", "running_var"]:
+                    getattr(grouped_bn, name)[group_slice].copy_(getattr(bn, name))
+        for idx in range(1, 5):
+            delattr(self, f"final_conv_block{idx}")
+        self.final_conv_block = grouped_block
+        self.grouped_final_conv = True
+
+    def fuse_conv_bn(self):
+        """Folds the batch norms of the final conv blocks for inference."""
+        for block in self.final_conv_blocks:
+            block.fuse_conv_bn()
+
     def get_backbone_output_features(self, x):
         backbone_output = self.backbone(x)
-        roi_output11 = self.final_conv_block1(backbone_output["0"])
-        roi_output22 = self.final_conv_block2(backbone_output["1"])
-        roi_output33 = self.final_conv_block3(backbone_output["2"])
-        roi_output44 = self.final_conv_block4(backbone_output["3"])
-        output = torch.cat(
-            [roi_output11, roi_output22, roi_output33, roi_output44], dim=1
-        )
+        if self.grouped_final_conv:
+            output = self.final_conv_block(
+                torch.cat(
+                    [
+                        self.poollayer(backbone_output["0"]),
+                        backbone_output["1"],
+                        self.upsample1(backbone_output["2"]),
+                        self.upsample2(backbone_output["3"]),
+                    ],
+                    dim=1,
+                )
+            )
+        else:
+            roi_output11 = self.final_conv_block1(backbone_output["0"])
+            roi_output22 = self.final_conv_block2(backbone_output["1"])
+            roi_output33 = self.final_conv_block3(backbone_output["2"])
+            roi_output44 = self.final_conv_block4(backbone_output["3"])
+            output = torch.cat(
+                [roi_output11, roi_output22, roi_output33, roi_output44], dim=1
+            )
         output = self.convlayer5(output)
         return output
 
@@ -197,17 +380,16 @@ class GenericPolygonRNN(torch.nn.Module):
         third: torch.Tensor,
     ) -> torch.Tensor:
         bs, length_s = second.shape[0], second.shape[1]
-        output = output.unsqueeze(1)
-        output = output.repeat(1, length_s, 1, 1, 1)
-        padding_f = torch.zeros([bs, 1, 1, self.grid_size, self.grid_size]).to(
-            output.device
-        )
+        # zero-copy broadcast along the sequence; the only materialization of the
+        # convlstm input happens in the channel concatenation below.
+        output = output.unsqueeze(1).expand(-1, length_s, -1, -1, -1)
+        padding_f = self._zero_gxg.expand(bs, -1, -1, -1, -1)
 
         input_f = (
             first[:, :-3]
             .view(-1, 1, self.grid_size, self.grid_size)
             .unsqueeze(1)
-            .repeat(1, length_s - 1, 1, 1, 1)
+            .expand(-1, length_s - 1, -1, -1, -1)
         )
         input_f = torch.cat([padding_f, input_f], dim=1)
         input_s = second[:, :, :-3].view(
@@ -220,8 +402,8 @@ class GenericPolygonRNN(torch.nn.Module):
 
         output = output.contiguous().view(bs, length_s, -1)
         output = torch.cat([output, second, third], dim=2)
-        output = self.lstmlayer(output)[0]
-        output = output.contiguous().view(bs * length_s, -1)
+        output = self.lstmlayer(output.transpose(0, 1).contiguous())[0]
+        output = output.transpose(0, 1).contiguous().view(bs * length_s, -1)
         output = self.linear(output)
         output = output.contiguous().view(bs, length_s, -1)
 
@@ -239,70 +421,200 @@ class GenericPolygonRNN(torch.nn.Module):
 
     def test(self, input_data1: torch.Tensor, len_s: int):
         bs = input_data1.shape[0]
-        result = torch.zeros([bs, len_s]).to(input_data1.device)
+        result = torch.zeros((bs, len_s), device=input_data1.device)
         feature = self.get_backbone_output_features(input_data1)
         if feature.shape[0] == 0:
-            return torch.zeros([bs, 1, self.grid_size * self.grid_size + 3])
+            return torch.zeros(
+                (bs, 1, self.grid_size * self.grid_size + 3), device=input_data1.device
+            )
 
-        padding_f = (
-            torch.zeros([bs, 1, 1, self.grid_size, self.grid_size])
-            .float()
-            .to(input_data1.device)
-        )
-        input_s = (
-            torch.zeros([bs, 1, 1, self.grid_size, self.grid_size])
-            .float()
-            .to(input_data1.device)
-        )
-        input_t = (
-            torch.zeros([bs, 1, 1, self.grid_size, self.grid_size])
-            .float()
-            .to(input_data1.device)
+        # The convlstm input is allocated once and updated in place on each step:
+        # the feature channels are written once and only the three vertex
+        # channels (first, second, third) change along the loop.
+        input1 = feature.new_zeros(
+            (bs, 1, feature.shape[1] + 3, self.grid_size, self.grid_size)
         )
+        input1[:, 0, :-3] = feature
 
-        output = torch.cat([feature.unsqueeze(1), padding_f, input_s, input_t], dim=2)
-
-        output, hidden1 = self.convlstm(output)
+        output, hidden1 = self.convlstm(input1)
         output = output[-1]
         output = output.contiguous().view(bs, 1, -1)
-        second = torch.zeros([bs, 1, self.grid_size * self.grid_size + 3]).to(
-            input_data1.device
-        )
-        second[:, 0, self.grid_size * self.grid_size + 1] = 1
-        third = torch.zeros([bs, 1, self.grid_size * self.grid_size + 3]).to(
-            input_data1.device
-        )
-        third[:, 0, self.grid_size * self.grid_size + 2] = 1
+        second = self._second_init.expand(bs, -1, -1)
+        third = self._third_init.expand(bs, -1, -1)
         output = torch.cat([output, second, third], dim=2)
 
-        output, hidden2 = self.lstmlayer(output)
+        # with a single time step the transposition is a free view
+        output, hidden2 = self.lstmlayer(output.transpose(0, 1))
         output = output.contiguous().view(bs, -1)
         output = self.linear(output)
         output = output.contiguous().view(bs, 1, -1)
-        output = (output == output.max(dim=2, keepdim=True)[0]).float()
+        output, idx = self._one_hot(output)
         first = output
-        result[:, 0] = (output.argmax(2))[:, 0]
+        result[:, 0] = idx[:, 0]
+        input1[:, 0, -3] = first[:, 0, :-3].view(-1, self.grid_size, self.grid_size)
 
+        if self._use_cuda_graph(input1, len_s):
+            return self._decode_with_cuda_graph(
+                result, input1, third, output, hidden1, hidden2
+            )
         for i in range(len_s - 1):
             second = third
             third = output
-            input_f = first[:, :, :-3].view(-1, 1, 1, self.grid_size, self.grid_size)
-            input_s = second[:, :, :-3].view(-1, 1, 1, self.grid_size, self.grid_size)
-            input_t = third[:, :, :-3].view(-1, 1, 1, self.grid_size, self.grid_size)
-            input1 = torch.cat([feature.unsqueeze(1), input_f, input_s, input_t], dim=2)
-            output, hidden1 = self.convlstm(input1, hidden1)
-            output = output[-1]
-            output = output.contiguous().view(bs, 1, -1)
-            output = torch.cat([output, second, third], dim=2)
-            output, hidden2 = self.lstmlayer(output, hidden2)
-            output = output.contiguous().view(bs, -1)
-            output = self.linear(output)
-            output = output.contiguous().view(bs, 1, -1)
-            output = (output == output.max(dim=2, keepdim=True)[0]).float()
-            result[:, i + 1] = (output.argmax(2))[:, 0]
+            output, idx, hidden1, hidden2 = self._decode_step(
+                input1, second, third, hidden1, hidden2
+            )
+            result[:, i + 1] = idx[:, 0]
+
+        return result
 
+    def _decode_step(
+        self,
+        input1: torch.Tensor,
+        second: torch.Tensor,
+        third: torch.Tensor,
+        hidden1: List,
+        hidden2: Tuple[torch.Tensor, torch.Tensor],
+    ) -> Tuple[torch.Tensor, torch.Tensor, List, Tuple[torch.Tensor, torch.Tensor]]:
+        """Runs one autoregressive step of test.
+
+        Args:
+            input1 (torch.Tensor): convlstm input. The vertex channels are updated in
+                place with second and third.
+            second (torch.Tensor): one-hot of the second to last vertex.
+            third (torch.Tensor): one-hot of the last vertex.
+            hidden1 (List): convlstm hidden states.
+            hidden2 (Tuple[torch.Tensor, torch.Tensor]): lstmlayer hidden states.
+
+        Returns:
+            Tuple: one-hot prediction, predicted index and the updated hidden states.
+        """
+        bs = input1.shape[0]
+        input1[:, 0, -2] = second[:, 0, :-3].view(-1, self.grid_size, self.grid_size)
+        input1[:, 0, -1] = third[:, 0, :-3].view(-1, self.grid_size, self.grid_size)
+        output, hidden1 = self.convlstm(input1, hidden1)
+        output = output[-1]
+        output = output.contiguous().view(bs, 1, -1)
+        output = torch.cat([output, second, third], dim=2)
+        output, hidden2 = self.lstmlayer(output.transpose(0, 1), hidden2)
+        output = output.contiguous().view(bs, -1)
+        output = self.linear(output)
+        output = output.contiguous().view(bs, 1, -1)
+        output, idx = self._one_hot(output)
+        return output, idx, hidden1, hidden2
+
+    def _use_cuda_graph(self, input1: torch.Tensor, len_s: int) -> bool:
+        return (
+            self.cuda_graph_inference
+            and len_s > 1
+            and input1.is_cuda
+            and not self.training
+            and not torch.is_grad_enabled()
+        )
+
+    def _decode_with_cuda_graph(
+        self,
+        result: torch.Tensor,
+        input1: torch.Tensor,
+        third: torch.Tensor,
+        output: torch.Tensor,
+        hidden1: List,
+        hidden2: Tuple[torch.Tensor, torch.Tensor],
+    ) -> torch.Tensor:
+        """Runs the remaining steps of test by replaying a captured CUDA graph of
+        _decode_step. The decoder state is copied into the static buffers of the
+        graph, and only the predicted index is read back after each replay.
+        """
+        bs = input1.shape[0]
+        graph, static = self._get_decode_step_graph(
+            input1, third, output, hidden1, hidden2
+        )
+        static["input1"][:bs].copy_(input1)
+        static["third"][:bs].copy_(third)
+        static["output"][:bs].copy_(output)
+        for (static_h, static_c), (h, c) in zip(static["hidden1"], hidden1):
+            static_h[:bs].copy_(h)
+            static_c[:bs].copy_(c)
+        for static_h, h in zip(static["hidden2"], hidden2):
+            static_h[:, :bs].copy_(h)
+        for i in range(result.shape[1] - 1):
+            graph.replay()
+            result[:, i + 1] = static["idx"][:bs, 0]
         return result
 
+    def _get_decode_step_graph(
+        self,
+        input1: torch.Tensor,
+        third: torch.Tensor,
+        output: torch.Tensor,
+        hidden1: List,
+        hidden2: Tuple[torch.Tensor, torch.Tensor],
+    ) -> Tuple["torch.cuda.CUDAGraph", Dict[str, Any]]:
+        """Returns the CUDA graph of _decode_step for the batch size of input1,
+        capturing it on the first call. The batch size is padded to the next power
+        of two so that a varying number of detections reuses a few graphs. The
+        padded rows are decoded independently and discarded.
+        """
+        bs = input1.shape[0]
+        padded_bs = 1 << (bs - 1).bit_length()
+        key = (padded_bs, input1.device, torch.is_inference_mode_enabled())
+        if key in self._decode_step_graphs:
+            return self._decode_step_graphs[key]
+
+        def _pad(tensor: torch.Tensor, dim: int = 0) -> torch.Tensor:
+            shape = list(tensor.shape)
+            shape[dim] = padded_bs
+            padded = tensor.new_zeros(shape)
+            padded.narrow(dim, 0, bs).copy_(tensor)
+            return padded
+
+        static = {
+            "input1": _pad(input1),
+            "third": _pad(third),
+            "output": _pad(output),
+            "hidden1": [[_pad(h), _pad(c)] for h, c in hidden1],
+            "hidden2": tuple(_pad(h, dim=1) for h in hidden2),
+        }
+
+        def _step() -> torch.Tensor:
+            output, idx, hidden1, hidden2 = self._decode_step(
+                static["input1"],
+                static["third"],
+                static["output"],
+                static["hidden1"],
+                static["hidden2"],
+            )
+            static["third"].copy_(static["output"])
+            static["output"].copy_(output)
+            for (static_h, static_c), (h, c) in zip(static["hidden1"], hidden1):
+                static_h.copy_(h)
+                static_c.copy_(c)
+            for static_h, h in zip(static["hidden2"], hidden2):
+                static_h.copy_(h)
+            return idx
+
+        # warmup on a side stream before capturing, as required by torch.cuda.graph
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream):
+            for _ in range(3):
+                _step()
+        torch.cuda.current_stream().wait_stream(stream)
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph):
+            static["idx"] = _step()
+        self._decode_step_graphs[key] = (graph, static)
+        return graph, static
+
+    def _one_hot(self, logits: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Returns the one-hot encoding of the argmax of logits (bs, 1, vocab_size)
+        and the argmax indexes (bs, 1). The encoding is scattered into a new buffer
+        instead of a persistent one because the two previous predictions are still
+        read as second and third in the next step.
+        """
+        idx = logits.argmax(dim=2, keepdim=True)
+        one_hot = torch.zeros_like(logits, dtype=torch.float32).scatter_(2, idx, 1.0)
+        return one_hot, idx[..., 0]
+
     def get_polygonrnn_losses_and_accuracy(
         self,
         croped_images: torch.Tensor,
@@ -312,18 +624,18 @@ class GenericPolygonRNN(torch.nn.Module):
         ta: torch.Tensor,
     ) -> Tuple[_Loss, torch.Tensor]:
         output = self.forward(croped_images, first, second, third)
-        result = output.contiguous().view(-1, self.grid_size * self.grid_size + 3)
+        result = output.reshape(-1, self.grid_size * self.grid_size + 3)
         loss, acc = self.compute_loss_and_accuracy(ta=ta, result=result)
         return loss, acc
 
     def compute_loss_and_accuracy(
         self, ta: torch.Tensor, result: torch.Tensor
     ) -> Tuple[_Loss, torch.Tensor]:
-        target = ta.contiguous().view(-1)
+        target = ta.reshape(-1)
         loss = nn.functional.cross_entropy(result, target)
         result_index = torch.argmax(result, 1)
-        correct = (target == result_index).float().sum().item()
-        acc = torch.tensor(correct * 1.0 / target.shape[0], device=loss.device)
+        # kept on device to avoid a host sync on every step
+        acc = (target == result_index).float().mean()
         return loss, acc
 
 
@@ -337,16 +649,30 @@ class GenericModPolyMapper(nn.Module):
         train_obj_detection_model: bool = True,
         train_polygonrnn_model: bool = True,
         train_backbone: bool = True,
+        channels_last: bool = False,
+        inference_amp: bool = False,
+        compile_polygonrnn: bool = False,
+        grouped_final_conv: bool = False,
+        cuda_graph_inference: bool = False,
     ):
         super(GenericModPolyMapper, self).__init__()
         self.obj_detection_model = obj_detection_model
         self.backbone = self.obj_detection_model.backbone
         self.polygonrnn_model = (
-            GenericPolygonRNN(backbone=self.backbone, grid_size=grid_size)
+            GenericPolygonRNN(
+                backbone=self.backbone,
+                grid_size=grid_size,
+                compile_graph=compile_polygonrnn,
+                grouped_final_conv=grouped_final_conv,
+                cuda_graph_inference=cuda_graph_inference,
+            )
             if polygonrnn_model is None
             else polygonrnn_model
         )
         self.val_seq_len = val_seq_len
+        # mixed precision for training is handled by the lightning trainer
+        # (pl_trainer.precision=16), which owns the grad scaler.
+        self.inference_amp = inference_amp
         self.train_obj_detection_model = train_obj_detection_model
         self.train_polygonrnn_model = train_polygonrnn_model
         self.train_backbone = train_backbone
@@ -364,6 +690,31 @@ class GenericModPolyMapper(nn.Module):
             set_model_components_trainable(
                 self, trainable=False, exception_list=freeze_exception_list
             )
+        self.memory_format = (
+            torch.channels_last if channels_last else torch.contiguous_format
+        )
+        if channels_last:
+            self.set_channels_last()
+
+    def set_channels_last(self):
+        """Converts the convolutional path shared by the object detection and the
+        polygonrnn models to the channels_last (NHWC) memory format, which enables
+        the cuDNN NHWC kernels on tensor core GPUs. Should be left disabled on
+        CPU-only runs.
+        """
+        self.backbone.to(memory_format=torch.channels_last)
+        if isinstance(self.polygonrnn_model, GenericPolygonRNN):
+            for block in self.polygonrnn_model.final_conv_blocks + [
+                self.polygonrnn_model.convlayer5
+            ]:
+                block.to(memory_format=torch.channels_last)
+
+    def fuse_conv_bn(self):
+        """Folds conv-bn pairs of the polygonrnn head for inference. Must be called
+        after eval(); the model cannot be trained afterwards.
+        """
+        if isinstance(self.polygonrnn_model, GenericPolygonRNN):
+            self.polygonrnn_model.fuse_conv_bn()
 
     def forward(
         self,
@@ -374,6 +725,8 @@ class GenericModPolyMapper(nn.Module):
     ) -> Union[
         List[Dict[str, Any]], Dict[str, Any], Tuple[Dict[str, Any], torch.Tensor]
     ]:
+        if obj_det_images is not None:
+            obj_det_images = obj_det_images.contiguous(memory_format=self.memory_format)
         if self.training:
             losses = dict()
             if self.train_obj_detection_model:
@@ -387,7 +740,9 @@ class GenericModPolyMapper(nn.Module):
                     polygon_rnn_batch is not None
                 ), "Polygon RNN batches are required for training PolygonRNN model."
                 polygonrnn_loss, acc = self.polygonrnn_model.get_polygonrnn_losses_and_accuracy(  # type: ignore
-                    croped_images=polygon_rnn_batch["image"],
+                    croped_images=polygon_rnn_batch["image"].contiguous(
+                        memory_format=self.memory_format
+                    ),
                     first=polygon_rnn_batch["x1"],
                     second=polygon_rnn_batch["x2"],
                     third=polygon_rnn_batch["x3"],
@@ -395,11 +750,16 @@ class GenericModPolyMapper(nn.Module):
                 )
                 losses.update({"polygonrnn_loss": polygonrnn_loss})
             return losses, acc
-        detections = (
-            self._forward_both_models(obj_det_images, threshold)
-            if obj_det_images is not None
-            else self._forward_only_polygonrnn(polygon_rnn_batch)
-        )
+        with torch.autocast(
+            device_type="cuda",
+            dtype=torch.float16,
+            enabled=self.inference_amp and torch.cuda.is_available(),
+        ):
+            detections = (
+                self._forward_both_models(obj_det_images, threshold)
+                if obj_det_images is not None
+                else self._forward_only_polygonrnn(polygon_rnn_batch)
+            )
         return detections
 
     def _forward_both_models(self, obj_det_images, threshold):
@@ -410,6 +770,7 @@ class GenericModPolyMapper(nn.Module):
                 for det in detections
             ]
 
+        boxes_list, non_empty_idx_list = [], []
         for idx, item in enumerate(detections):
             if item["boxes"].shape[0] == 0:
                 detections[idx].update(
@@ -424,6 +785,7 @@ class GenericModPolyMapper(nn.Module):
                         ]
                     }
                 )
+                boxes_list.append(item["boxes"].float())
                 continue
             extended_bboxes = polygonrnn_utils.get_extended_bounds_from_tensor_bbox(
                 item["boxes"], obj_det_images[idx].shape[1::], extend_factor=0.1
@@ -434,22 +796,30 @@ class GenericModPolyMapper(nn.Module):
                     extended_bboxes
                 )
             )
-            croped_images = roi_align(
-                obj_det_images[idx].unsqueeze(0),
-                boxes=[extended_bboxes.float()],
-                output_size=(224, 224),
-            )
-            polygonrnn_output = self.polygonrnn_model.test(
-                croped_images, self.val_seq_len  # type: ignore
-            )
-            detections[idx].update({"polygonrnn_output": polygonrnn_output})
+            boxes_list.append(extended_bboxes.float())
+            non_empty_idx_list.append(idx)
+        if len(non_empty_idx_list) == 0:
+            return detections
+        # all the crops of the batch are decoded in a single polygonrnn call
+        croped_images = roi_align(
+            obj_det_images, boxes=boxes_list, output_size=(224, 224)
+        ).contiguous(memory_format=self.memory_format)
+        polygonrnn_output = self.polygonrnn_model.test(
+            croped_images, self.val_seq_len  # type: ignore
+        )
+        output_list = torch.split(
+            polygonrnn_output, [boxes.shape[0] for boxes in boxes_list]
+        )
+        for idx in non_empty_idx_list:
+            detections[idx].update({"polygonrnn_output": output_list[idx]})
         return detections
 
     def _forward_only_polygonrnn(
         self, polygon_rnn_batch: Dict[str, torch.Tensor]
     ) -> List[Dict[str, torch.Tensor]]:
         polygonrnn_output = self.polygonrnn_model.test(
-            polygon_rnn_batch["image"], self.val_seq_len  # type: ignore
+            polygon_rnn_batch["image"].contiguous(memory_format=self.memory_format),
+            self.val_seq_len,  # type: ignore
         )
         output_dict = {"polygonrnn_output": polygonrnn_output}
         output_dict.update(
@@ -478,6 +848,11 @@ class ModPolyMapper(GenericModPolyMapper):
         train_obj_detection_model: bool = True,
         train_polygonrnn_model: bool = True,
         train_backbone: bool = True,
+        channels_last: bool = False,
+        inference_amp: bool = False,
+        compile_polygonrnn: bool = False,
+        grouped_final_conv: bool = False,
+        cuda_graph_inference: bool = False,
         **kwargs,
     ):
         backbone = resnet_fpn_backbone(
@@ -493,4 +868,9 @@ class ModPolyMapper(GenericModPolyMapper):
             train_obj_detection_model=train_obj_detection_model,
             train_polygonrnn_model=train_polygonrnn_model,
             train_backbone=train_backbone,
+            channels_last=channels_last,
+            inference_amp=inference_amp,
+            compile_polygonrnn=compile_polygonrnn,
+            grouped_final_conv=grouped_final_conv,
+            cuda_graph_inference=cuda_graph_inference,
         )
@@ -39,7 +39,6 @@ from pytorch_segmentation_models_trainer.custom_metrics import metrics
 from pytorch_segmentation_models_trainer.model_loader.model import Model
 from pytorch_segmentation_models_trainer.utils import polygonrnn_utils, tensor_utils
 from torch import nn
-from torch.autograd import Variable
 from tqdm import tqdm
 
 current_dir = os.path.dirname(__file__)
@@ -104,15 +103,11 @@ class ConvLSTMCell(nn.Module):
 
     def init_hidden(self, batch_size, device=torch.device("cpu")):
         return (
-            Variable(
-                torch.zeros(batch_size, self.hidden_dim, self.height, self.width).to(
-                    device
-                )
+            torch.zeros(
+                batch_size, self.hidden_dim, self.height, self.width, device=device
             ),
-            Variable(
-                torch.zeros(batch_size, self.hidden_dim, self.height, self.width).to(
-                    device
-                )
+            torch.zeros(
+                batch_size, self.hidden_dim, self.height, self.width, device=device
             ),
         )
 
@@ -458,17 +453,18 @@ class PolygonRNN(nn.Module):
         output44 = self.upsample(output44)
         output = torch.cat([output11, output22, output33, output44], dim=1)
         output = self.convlayer5(output)
-        output = output.unsqueeze(1)
-        output = output.repeat(1, length_s, 1, 1, 1)
-        padding_f = torch.zeros([bs, 1, 1, self.grid_size, self.grid_size]).to(
-            output.device
+        output = output.unsqueeze(1).expand(-1, length_s, -1, -1, -1)
+        padding_f = torch.zeros(
+            (bs, 1, 1, self.grid_size, self.grid_size),
+            dtype=torch.float32,
+            device=output.device,
         )
 
         input_f = (
             first[:, :-3]
             .view(-1, 1, self.grid_size, self.grid_size)
             .unsqueeze(1)
-            .repeat(1, length_s - 1, 1, 1, 1)
+            .expand(-1, length_s - 1, -1, -1, -1)
         )
         input_f = torch.cat([padding_f, input_f], dim=1)
         input_s = second[:, :, :-3].view(
@@ -490,7 +486,7 @@ class PolygonRNN(nn.Module):
 
     def test(self, input_data1, len_s):
         bs = input_data1.shape[0]
-        result = torch.zeros([bs, len_s]).to(input_data1.device)
+        result = torch.zeros((bs, len_s), device=input_data1.device)
         output1, output11 = self._compute_output(
             model=self.model1,
             x=input_data1,
@@ -510,20 +506,20 @@ class PolygonRNN(nn.Module):
         output = torch.cat([output11, output22, output33, output44], dim=1)
         feature = self.convlayer5(output)
 
-        padding_f = (
-            torch.zeros([bs, 1, 1, self.grid_size, self.grid_size])
-            .float()
-            .to(input_data1.device)
+        padding_f = torch.zeros(
+            (bs, 1, 1, self.grid_size, self.grid_size),
+            dtype=torch.float32,
+            device=input_data1.device,
         )
-        input_s = (
-            torch.zeros([bs, 1, 1, self.grid_size, self.grid_size])
-            .float()
-            .to(input_data1.device)
+        input_s = torch.zeros(
+            (bs, 1, 1, self.grid_size, self.grid_size),
+            dtype=torch.float32,
+            device=input_data1.device,
         )
-        input_t = (
-            torch.zeros([bs, 1, 1, self.grid_size, self.grid_size])
-            .float()
-            .to(input_data1.device)
+        input_t = torch.zeros(
+            (bs, 1, 1, self.grid_size, self.grid_size),
+            dtype=torch.float32,
+            device=input_data1.device,
         )
 
         output = torch.cat([feature.unsqueeze(1), padding_f, input_s, input_t], dim=2)
@@ -531,12 +527,12 @@ class PolygonRNN(nn.Module):
         output, hidden1 = self.convlstm(output)
         output = output[-1]
         output = output.contiguous().view(bs, 1, -1)
-        second = torch.zeros([bs, 1, self.grid_size * self.grid_size + 3]).to(
-            input_data1.device
+        second = torch.zeros(
+            (bs, 1, self.grid_size * self.grid_size + 3), device=input_data1.device
         )
         second[:, 0, self.grid_size * self.grid_size + 1] = 1
-        third = torch.zeros([bs, 1, self.grid_size * self.grid_size + 3]).to(
-            input_data1.device
+        third = torch.zeros(
+            (bs, 1, self.grid_size * self.grid_size + 3), device=input_data1.device
         )
         third[:, 0, self.grid_size * self.grid_size + 2] = 1
         output = torch.cat([output, second, third], dim=2)
@@ -18,18 +18,23 @@
  *                                                                         *
  ****
 """
+import hashlib
+import io
 import itertools
 import json
 import os
 from abc import abstractmethod
+from collections import OrderedDict
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import albumentations as A
+import cv2
 import numpy as np
 import pandas as pd
 import shapely.wkt
 import torch
+import torchvision
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
 from PIL import Image
@@ -37,15 +42,54 @@ from pytorch_segmentation_models_trainer.utils import polygonrnn_utils
 from pytorch_segmentation_models_trainer.utils.object_detection_utils import (
     bbox_xywh_to_xyxy,
     bbox_xyxy_to_xywh,
+    bboxes_xywh_to_xyxy,
+    bboxes_xyxy_to_xywh,
 )
 from shapely.geometry import Polygon
 from shapely.geometry.base import BaseGeometry
 from torch.utils.data import Dataset
+from torch.utils.data.dataloader import default_collate
+
+
+# augmentation pipelines already built from a hydra config, keyed by the serialized
+# config, so that datasets sharing a config also share its A.Compose.
+_augmentation_object_cache: Dict[str, A.Compose] = {}
 
 
 def load_augmentation_object(input_list, bbox_params=None):
     if isinstance(input_list, A.Compose):
         return input_list
+    cache_key = _get_augmentation_cache_key(input_list, bbox_params)
+    if cache_key is not None and cache_key in _augmentation_object_cache:
+        return _augmentation_object_cache[cache_key]
+    augmentation_object = _build_augmentation_object(
+        input_list, bbox_params=bbox_params
+    )
+    if cache_key is not None:
+        _augmentation_object_cache[cache_key] = augmentation_object
+    return augmentation_object
+
+
+def _get_augmentation_cache_key(input_list, bbox_params=None) -> Optional[str]:
+    """Serializes the augmentation config. Returns None when it is not a plain
+    hydra config (e.g. a list of already instantiated transforms).
+    """
+    if not OmegaConf.is_config(input_list) or not (
+        bbox_params is None or OmegaConf.is_config(bbox_params)
+    ):
+        return None
+    return json.dumps(
+        [
+            OmegaConf.to_container(input_list, resolve=True),
+            None
+            if bbox_params is None
+            else OmegaConf.to_container(bbox_params, resolve=True),
+        ],
+        sort_keys=True,
+    )
+
+
+def _build_augmentation_object(input_list, bbox_params=None):
     try:
         aug_list = [instantiate(i, _recursive_=False) for i in input_list]
     except:
@@ -57,6 +101,258 @@ def load_augmentation_object(input_list, bbox_params=None):
     return A.Compose(aug_list, bbox_params=OmegaConf.to_container(bbox_params))
 
 
+def normalize_on_device(
+    images: torch.Tensor,
+    mean: Optional[List[float]] = None,
+    std: Optional[List[float]] = None,
+    max_pixel_value: float = 255.0,
+) -> torch.Tensor:
+    """Converts a uint8 (B, C, H, W) image batch to float and normalizes it in place
+    on its current device. Meant to be used after the host to device copy, so that
+    the dataloader only moves uint8 images.
+
+    Args:
+        images (torch.Tensor): uint8 image batch.
+        mean (Optional[List[float]], optional): per channel mean, in the [0, 1]
+            range. Defaults to None (no mean subtraction).
+        std (Optional[List[float]], optional): per channel std, in the [0, 1]
+            range. Defaults to None (no std division).
+        max_pixel_value (float, optional): Defaults to 255.0.
+
+    Returns:
+        torch.Tensor: float image batch.
+    """
+    images = images.float().div_(max_pixel_value)
+    if mean is not None:
+        images.sub_(torch.as_tensor(mean, device=images.device).view(1, -1, 1, 1))
+    if std is not None:
+        images.div_(torch.as_tensor(std, device=images.device).view(1, -1, 1, 1))
+    return images
+
+
+def stack_images(images: Tuple[torch.Tensor, ...]) -> torch.Tensor:
+    """Stacks the images of a batch. Inside a dataloader worker, default_collate
+    writes the stacked batch straight into shared memory, which saves a copy of the
+    whole batch when it is sent to the main process.
+    """
+    if images[0].dim() == 1:
+        # encoded images (gpu_decode), which have different lengths
+        return list(images)
+    return default_collate(images)
+
+
+def decode_images_on_device(
+    encoded_images: List[torch.Tensor], device: Union[str, torch.device]
+) -> torch.Tensor:
+    """Decodes a list of encoded images to an uint8 (B, 3, H, W) batch on device. On
+    cuda devices, the images are decoded by nvjpeg and must be JPEG files.
+
+    Args:
+        encoded_images (List[torch.Tensor]): 1D uint8 cpu tensors with the bytes of
+            each image file.
+        device (Union[str, torch.device]): device of the decoded batch.
+
+    Returns:
+        torch.Tensor: decoded batch.
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        return torch.stack(
+            [
+                torchvision.io.decode_jpeg(
+                    image, mode=torchvision.io.ImageReadMode.RGB, device=device
+                )
+                for image in encoded_images
+            ]
+        )
+    return torch.stack(
+        [
+            torchvision.io.decode_image(image, mode=torchvision.io.ImageReadMode.RGB)
+            for image in encoded_images
+        ]
+    ).to(device)
+
+
+def get_ragged_array_cache_fingerprint(
+    values: Iterable[Any], root_dir: Optional[str] = None
+) -> str:
+    """Fingerprint of the rows a ragged array cache is built from: the row count and
+    a hash of root_dir and of the source column values. A cache built from an
+    edited csv, another n_first_rows_to_read or another root_dir gets a different
+    fingerprint.
+
+    Args:
+        values (Iterable[Any]): values of the column the cache is built from.
+        root_dir (Optional[str], optional): root dir of the paths in values.
+            Defaults to None.
+
+    Returns:
+        str: fingerprint.
+    """
+    row_count = 0
+    value_hash = hashlib.sha1(str(root_dir).encode("utf-8"))
+    for value in values:
+        value_hash.update(b"\0" + str(value).encode("utf-8"))
+        row_count += 1
+    return f"{row_count}-{value_hash.hexdigest()}"
+
+
+def ragged_array_cache_exists(
+    cache_dir: str, name: str, fingerprint: Optional[str] = None
+) -> bool:
+    """Checks that the ragged array cache name exists in cache_dir and, when
+    fingerprint is given, that it was saved with the same fingerprint.
+    """
+    if not all(
+        os.path.isfile(os.path.join(cache_dir, f"{name}_{suffix}.npy"))
+        for suffix in ("data", "offsets")
+    ):
+        return False
+    if fingerprint is None:
+        return True
+    fingerprint_path = os.path.join(cache_dir, f"{name}_fingerprint.txt")
+    if not os.path.isfile(fingerprint_path):
+        return False
+    with open(fingerprint_path, "r") as f:
+        return f.read() == fingerprint
+
+
+def _replace_file_atomically(output_path: str, write_func: Callable) -> None:
+    # written to a temporary file first so that concurrent readers never see a
+    # partially written cache.
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write_func(f)
+    os.replace(tmp_path, output_path)
+
+
+def save_ragged_array_cache(
+    arrays: List[np.ndarray],
+    cache_dir: str,
+    name: str,
+    dtype: np.dtype,
+    fingerprint: Optional[str] = None,
+) -> None:
+    """Saves a list of arrays with a variable first dimension as a single
+    concatenated array ({name}_data.npy) and a CSR-style index
+    ({name}_offsets.npy, length len(arrays) + 1), so that item i can later be read
+    as data[offsets[i]:offsets[i + 1]] from a memory map.
+
+    Args:
+        arrays (List[np.ndarray]): arrays to be cached. All dimensions but the first
+            must match.
+        cache_dir (str): output folder.
+        name (str): prefix of the output files.
+        dtype (np.dtype): dtype of the cached data.
+        fingerprint (Optional[str], optional): fingerprint of the source rows,
+            saved as {name}_fingerprint.txt. Defaults to None.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(array) for array in arrays])
+    data = np.concatenate(arrays, axis=0).astype(dtype)
+    for suffix, array in (("data", data), ("offsets", offsets)):
+        _replace_file_atomically(
+            os.path.join(cache_dir, f"{name}_{suffix}.npy"),
+            lambda f: np.save(f, array),
+        )
+    if fingerprint is not None:
+        # saved last, so that an interrupted build is never taken as valid
+        _replace_file_atomically(
+            os.path.join(cache_dir, f"{name}_fingerprint.txt"),
+            lambda f: f.write(fingerprint.encode("utf-8")),
+        )
+
+
+def load_ragged_array_cache(
+    cache_dir: str, name: str, expected_length: Optional[int] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Loads the ragged array cache name from cache_dir, with the data as a memory
+    map. Raises a ValueError when expected_length is given and the cache does not
+    hold that many items.
+    """
+    offsets = np.load(os.path.join(cache_dir, f"{name}_offsets.npy"))
+    if expected_length is not None and len(offsets) != expected_length + 1:
+        raise ValueError(
+            f"The {name} cache in {cache_dir} holds {len(offsets) - 1} items, but the "
+            f"dataset has {expected_length}. Remove the cache to rebuild it."
+        )
+    return (
+        np.load(os.path.join(cache_dir, f"{name}_data.npy"), mmap_mode="r"),
+        offsets,
+    )
+
+
+def read_dataset_table(
+    input_path: Path, n_first_rows_to_read: Optional[int] = None
+) -> pd.DataFrame:
+    """Reads the dataset table. Besides csv files, parquet files (.parquet
+    extension) are accepted, which are parsed much faster than csv on large
+    datasets. Reading parquet requires pyarrow or fastparquet.
+
+    Args:
+        input_path (Path): path of the csv or parquet file.
+        n_first_rows_to_read (Optional[int], optional): number of rows to read.
+            Defaults to None (all rows).
+
+    Returns:
+        pd.DataFrame: dataset table.
+    """
+    if str(input_path).endswith(".parquet"):
+        df = pd.read_parquet(input_path)
+        return df if n_first_rows_to_read is None else df.head(n_first_rows_to_read)
+    return (
+        pd.read_csv(input_path)
+        if n_first_rows_to_read is None
+        else pd.read_csv(input_path, nrows=n_first_rows_to_read)
+    )
+
+
+class PackedStringArray:
+    """Read-only array of strings stored as one utf-8 byte buffer and a CSR-style
+    offsets array. Unlike an object array, it holds no python object per string, so
+    reading it from forked dataloader workers does not touch reference counts and
+    the parent memory pages stay shared instead of being copied to every worker.
+
+    Args:
+        strings (Iterable[str]): strings to be packed.
+    """
+
+    def __init__(self, strings: Iterable[str]) -> None:
+        encoded = [string.encode("utf-8") for string in strings]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(item) for item in encoded])
+        self.data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[str]:
+        return (self._get(idx) for idx in range(len(self)))
+
+    def __getitem__(self, idx: Union[int, slice, np.ndarray]) -> Union[str, List[str]]:
+        if isinstance(idx, slice) or np.ndim(idx) > 0:
+            return [self._get(i) for i in np.arange(len(self))[idx]]
+        return self._get(range(len(self))[int(idx)])
+
+    def _get(self, idx: int) -> str:
+        return (
+            self.data[self.offsets[idx] : self.offsets[idx + 1]]
+            .tobytes()
+            .decode("utf-8")
+        )
+
+
+def get_column_array(column: pd.Series) -> Union[np.ndarray, PackedStringArray]:
+    """Returns the values of a csv column, packing columns of strings into a
+    PackedStringArray.
+    """
+    values = column.to_numpy()
+    if values.dtype == object and all(isinstance(value, str) for value in values):
+        return PackedStringArray(values)
+    return values
+
+
 class AbstractDataset(Dataset):
     def __init__(
         self,
@@ -67,23 +363,32 @@ class AbstractDataset(Dataset):
         image_key=None,
         mask_key=None,
         n_first_rows_to_read=None,
+        image_decoder="pil",
+        image_cache_size=0,
     ) -> None:
+        if image_decoder not in ("pil", "cv2"):
+            raise ValueError("image_decoder must be either pil or cv2")
         self.input_csv_path = input_csv_path
         self.root_dir = root_dir
-        self.df = (
-            pd.read_csv(input_csv_path)
-            if n_first_rows_to_read is None
-            else pd.read_csv(input_csv_path, nrows=n_first_rows_to_read)
-        )
+        self.df = read_dataset_table(input_csv_path, n_first_rows_to_read)
         self.transform = (
             None
             if augmentation_list is None
             else load_augmentation_object(augmentation_list)
         )
+        # plain array views of the columns, to avoid building a pandas row on each
+        # item access.
+        self._columns = {key: get_column_array(self.df[key]) for key in self.df.columns}
+        self._full_path_columns = {}
         self.data_loader = data_loader
         self.len = len(self.df)
         self.image_key = image_key if image_key is not None else "image"
         self.mask_key = mask_key if mask_key is not None else "mask"
+        self.image_decoder = image_decoder
+        # decoded images are kept per process (each dataloader worker fills its own
+        # cache), keyed by path and decode options. Disabled when the size is 0.
+        self.image_cache_size = image_cache_size
+        self._image_cache = OrderedDict()
 
     def __len__(self) -> int:
         return self.len
@@ -102,12 +407,24 @@ class AbstractDataset(Dataset):
         """
         pass
 
+    def get_value(self, idx: int, key: str) -> Any:
+        return self._columns[key][idx]
+
     def get_path(self, idx: int, key: str = None, add_root_dir: bool = True):
         key = self.image_key if key is None else key
-        image_path = str(self.df.iloc[idx][key])
         if self.root_dir is not None and add_root_dir:
-            return self._add_root_dir_to_path(image_path)
-        return image_path
+            return self._get_full_path_column(key)[idx]
+        return str(self.get_value(idx, key))
+
+    def _get_full_path_column(self, key: str) -> PackedStringArray:
+        """Paths of a column joined with root_dir, built on the first access to the
+        column instead of joining them on every item.
+        """
+        if key not in self._full_path_columns:
+            self._full_path_columns[key] = PackedStringArray(
+                self._add_root_dir_to_path(str(path)) for path in self._columns[key]
+            )
+        return self._full_path_columns[key]
 
     def _add_root_dir_to_path(self, image_path):
         return os.path.join(
@@ -123,15 +440,63 @@ class AbstractDataset(Dataset):
         )
 
     def load_image_from_path(self, image_path, is_mask=False, force_rgb=False):
-        image = (
-            Image.open(image_path)
-            if not is_mask
-            else Image.open(image_path).convert("L")
-        )
+        if self.image_cache_size <= 0:
+            return self._decode_image(image_path, is_mask=is_mask, force_rgb=force_rgb)
+        cache_key = (image_path, is_mask, force_rgb)
+        image = self._image_cache.get(cache_key)
+        if image is None:
+            image = self._decode_image(image_path, is_mask=is_mask, force_rgb=force_rgb)
+            self._image_cache[cache_key] = image
+            if len(self._image_cache) > self.image_cache_size:
+                self._image_cache.popitem(last=False)
+        else:
+            self._image_cache.move_to_end(cache_key)
+        # transforms and callers may write on the returned array
+        return image.copy()
+
+    def _decode_image(self, image_path, is_mask=False, force_rgb=False):
+        if self.image_decoder == "cv2":
+            return self._decode_image_with_cv2(
+                image_path, is_mask=is_mask, force_rgb=force_rgb
+            )
+        # the whole file is read with a single call, instead of letting PIL issue
+        # several small reads while it identifies and decodes the image.
+        with open(image_path, "rb") as f:
+            image = Image.open(io.BytesIO(f.read()))
+        if is_mask:
+            image = image.convert("L")
         if force_rgb:
             image = image.convert("RGB")
         image = np.array(image)
-        return (image > 0).astype(np.uint8) if is_mask else image
+        return self._binarize_mask(image) if is_mask else image
+
+    @staticmethod
+    def _binarize_mask(mask):
+        """Maps every non zero pixel of an uint8 mask to 1, in place."""
+        cv2.threshold(mask, 0, 1, cv2.THRESH_BINARY, dst=mask)
+        return mask
+
+    def _decode_image_with_cv2(self, image_path, is_mask=False, force_rgb=False):
+        """Decodes the image with OpenCV (libjpeg-turbo/libpng), writing the
+        decoded array directly instead of copying it out of a PIL buffer.
+        Channels are returned in RGB(A) order, like the PIL decoder.
+        """
+        if is_mask:
+            flags = cv2.IMREAD_GRAYSCALE
+        elif force_rgb:
+            flags = cv2.IMREAD_COLOR
+        else:
+            flags = cv2.IMREAD_UNCHANGED
+        image = cv2.imdecode(np.fromfile(image_path, dtype=np.uint8), flags)
+        if image is None:
+            raise ValueError(f"Could not decode image {image_path}")
+        if is_mask:
+            return self._binarize_mask(image)
+        if image.ndim == 3 and image.shape[-1] == 3:
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if image.ndim == 3 and image.shape[-1] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2RGBA)
+        return image
 
     def to_tensor(self, x):
         return x if isinstance(x, torch.Tensor) else torch.from_numpy(x)
@@ -153,7 +518,15 @@ class SegmentationDataset(AbstractDataset):
         image_key=None,
         mask_key=None,
         n_first_rows_to_read=None,
+        image_decoder="pil",
+        image_cache_size=0,
+        gpu_decode=False,
     ) -> None:
+        if gpu_decode and augmentation_list is not None:
+            raise ValueError(
+                "gpu_decode cannot be used with augmentation_list, since the images "
+                "are only decoded after being collated"
+            )
         super(SegmentationDataset, self).__init__(
             input_csv_path=input_csv_path,
             root_dir=root_dir,
@@ -162,12 +535,21 @@ class SegmentationDataset(AbstractDataset):
             image_key=image_key,
             mask_key=mask_key,
             n_first_rows_to_read=n_first_rows_to_read,
+            image_decoder=image_decoder,
+            image_cache_size=image_cache_size,
         )
+        # when set, items hold the encoded image file bytes, which are decoded on
+        # the training device (see Model.on_before_batch_transfer).
+        self.gpu_decode = gpu_decode
 
     def __getitem__(self, idx: int) -> Dict[str, Any]:
         idx = idx % self.len
 
-        image = self.load_image(idx, key=self.image_key)
+        image = (
+            torchvision.io.read_file(self.get_path(idx, key=self.image_key))
+            if self.gpu_decode
+            else self.load_image(idx, key=self.image_key)
+        )
         mask = self.load_image(idx, key=self.mask_key, is_mask=True)
         result = (
             {"image": image, "mask": mask}
@@ -176,6 +558,13 @@ class SegmentationDataset(AbstractDataset):
         )
         return result
 
+    @staticmethod
+    def collate_fn(batch: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Collates the items like default_collate, but keeps the encoded images
+        of gpu_decode datasets, which have different lengths, as a list.
+        """
+        return {key: stack_images([item[key] for item in batch]) for key in batch[0]}
+
 
 class FrameFieldSegmentationDataset(SegmentationDataset):
     def __init__(
@@ -201,6 +590,8 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
         image_width=224,
         image_height=224,
         gpu_augmentation_list=None,
+        image_decoder="pil",
+        image_cache_size=0,
     ) -> None:
         mask_key = "polygon_mask" if mask_key is None else mask_key
         super(FrameFieldSegmentationDataset, self).__init__(
@@ -211,6 +602,8 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
             image_key=image_key,
             mask_key=mask_key,
             n_first_rows_to_read=n_first_rows_to_read,
+            image_decoder=image_decoder,
+            image_cache_size=image_cache_size,
         )
         self.multi_band_mask = multi_band_mask
         self.boundary_mask_key = (
@@ -231,14 +624,43 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
             distance_mask_key if distance_mask_key is not None else "distance_mask"
         )
         self.size_mask_key = size_mask_key if size_mask_key is not None else "size_mask"
-        self.alternative_transform = A.Compose(
-            [A.Resize(image_height, image_width), A.Normalize(), A.pytorch.ToTensorV2()]
-        )
+        self.image_height = image_height
+        self.image_width = image_width
+        self._alternative_transform = None
         self.masks_to_load_dict = {
             mask_key: True,
             self.boundary_mask_key: return_boundary_mask,
             self.vertex_mask_key: return_vertex_mask,
         }
+        self._active_mask_keys = tuple(
+            key for key, load_mask in self.masks_to_load_dict.items() if load_mask
+        )
+        self._num_base_masks = len(self._active_mask_keys)
+        self.class_freq_array = (
+            np.stack(
+                [
+                    np.fromstring(class_freq.strip("[]"), sep=" ")
+                    for class_freq in self.df["class_freq"].to_numpy()
+                ]
+            )
+            if "class_freq" in self.df.columns
+            else None
+        )
+
+    @property
+    def alternative_transform(self) -> A.Compose:
+        """Transform used when the augmented crop is not valid. Built on first use,
+        since most items never need it.
+        """
+        if self._alternative_transform is None:
+            self._alternative_transform = A.Compose(
+                [
+                    A.Resize(self.image_height, self.image_width),
+                    A.Normalize(),
+                    A.pytorch.ToTensorV2(),
+                ]
+            )
+        return self._alternative_transform
 
     def load_masks(self, idx):
         if self.multi_band_mask:
@@ -251,8 +673,7 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
         else:
             mask_dict = {
                 mask_key: self.load_image(idx, key=mask_key, is_mask=True)
-                for mask_key, load_mask in self.masks_to_load_dict.items()
-                if load_mask
+                for mask_key in self._active_mask_keys
             }
         if self.return_crossfield_mask:
             mask_dict[self.crossfield_mask_key] = self.load_image(
@@ -271,6 +692,17 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
     def compute_class_freq(self, gt_polygons_image):
         pass
 
+    def get_mask_class_freq(self, mask: np.ndarray) -> np.ndarray:
+        """Mean of each band of a (H, W) or (H, W, C) mask, as a 1D array.
+
+        Args:
+            mask (np.ndarray): decoded mask.
+
+        Returns:
+            np.ndarray: class frequencies.
+        """
+        return np.atleast_1d(mask.mean(axis=(0, 1))) / 255
+
     def get_mean_axis(self, mask):
         if len(mask.shape) > 2:
             return tuple(
@@ -298,17 +730,53 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
             return False
         return True
 
+    def apply_transform_to_packed_masks(
+        self, transform: A.Compose, image: np.ndarray, masks: List[np.ndarray]
+    ) -> Dict[str, Any]:
+        """Applies transform to the image and masks. Masks with the same dtype and
+        size are packed into a single multi band mask, so that each augmentation
+        processes one array per group instead of one per mask. The masks are
+        unpacked afterwards, keeping the order of the input list.
+
+        Args:
+            transform (A.Compose): albumentations transform.
+            image (np.ndarray): (H, W, C) image.
+            masks (List[np.ndarray]): (H, W) or (H, W, C) masks.
+
+        Returns:
+            Dict[str, Any]: transform output, with the unpacked masks in "masks".
+        """
+        groups: Dict[Tuple, List[int]] = {}
+        for mask_idx, mask in enumerate(masks):
+            groups.setdefault((mask.dtype, mask.shape[:2]), []).append(mask_idx)
+        group_list = list(groups.values())
+        transformed = transform(
+            image=image,
+            masks=[np.dstack([masks[i] for i in group]) for group in group_list],
+        )
+        unpacked_masks = [None] * len(masks)
+        for group, packed_mask in zip(group_list, transformed["masks"]):
+            band = 0
+            for mask_idx in group:
+                if masks[mask_idx].ndim == 2:
+                    unpacked_masks[mask_idx] = packed_mask[..., band]
+                    band += 1
+                else:
+                    n_bands = masks[mask_idx].shape[2]
+                    unpacked_masks[mask_idx] = packed_mask[..., band : band + n_bands]
+                    band += n_bands
+        transformed["masks"] = unpacked_masks
+        return transformed
+
     def build_ds_item_dict(self, idx, transformed):
-        gt_polygons_image = self.to_tensor(
-            np.stack(
-                [
-                    transformed["masks"][0],
-                    transformed["masks"][1],
-                    transformed["masks"][2],
-                ],
-                axis=0,
-            )
-        ).float()
+        polygon_masks = [self.to_tensor(mask) for mask in transformed["masks"][:3]]
+        # each mask is cast while being copied into its channel, instead of stacking
+        # into a uint8 buffer and casting the result afterwards.
+        gt_polygons_image = torch.empty(
+            (len(polygon_masks),) + tuple(polygon_masks[0].shape), dtype=torch.float32
+        )
+        for channel, mask in zip(gt_polygons_image, polygon_masks):
+            channel.copy_(mask)
         ds_item_dict = {
             "idx": idx,
             "path": self.get_path(idx),
@@ -324,36 +792,22 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
         image = self.load_image(idx, force_rgb=True)
         mask_dict = self.load_masks(idx)
         if self.transform is None:
+            # computed while the polygon mask is still hot, before it is stacked
+            class_freq = (
+                self.get_mask_class_freq(mask_dict[self.mask_key])
+                if self.class_freq_array is None
+                else self.class_freq_array[idx].copy()
+            )
+            # image and gt_polygons_image are returned as contiguous (C, H, W)
+            # tensors, the same layout as the transformed items
             ds_item_dict = {
                 "idx": idx,
                 "path": self.get_path(idx),
-                "image": self.to_tensor(image),
+                "image": self.to_tensor(np.ascontiguousarray(image.transpose(2, 0, 1))),
                 "gt_polygons_image": self.to_tensor(
-                    np.stack(
-                        [
-                            mask_dict[key]
-                            for key, load_key in self.masks_to_load_dict.items()
-                            if load_key
-                        ],
-                        axis=-1,
-                    )
-                ),
-                "class_freq": self.to_tensor(
-                    np.mean(
-                        mask_dict[self.mask_key],
-                        axis=self.get_mean_axis(mask_dict[self.mask_key]),
-                    )
-                    / 255
-                    if "class_freq" not in self.df.columns
-                    else self.to_tensor(
-                        np.fromstring(
-                            self.df.iloc[idx]["class_freq"]
-                            .replace("[", "")
-                            .replace("]", ""),
-                            sep=" ",
-                        )
-                    )
+                    np.stack([mask_dict[key] for key in self._active_mask_keys])
                 ),
+                "class_freq": self.to_tensor(class_freq),
             }
             if self.return_crossfield_mask:
                 ds_item_dict["gt_crossfield_angle"] = (
@@ -372,15 +826,16 @@ class FrameFieldSegmentationDataset(SegmentationDataset):
                     self.to_tensor(mask_dict[self.size_mask_key]).float().unsqueeze(0)
                 )
             return ds_item_dict
-        transformed = self.transform(image=image, masks=list(mask_dict.values()))
+        masks = list(mask_dict.values())
+        transformed = self.apply_transform_to_packed_masks(self.transform, image, masks)
         ds_item_dict = self.build_ds_item_dict(idx, transformed)
         if not self.is_valid_crop(ds_item_dict):
-            transformed = self.alternative_transform(
-                image=image, masks=list(mask_dict.values())
+            transformed = self.apply_transform_to_packed_masks(
+                self.alternative_transform, image, masks
             )
             ds_item_dict = self.build_ds_item_dict(idx, transformed)
 
-        mask_idx = sum(self.masks_to_load_dict.values())
+        mask_idx = self._num_base_masks
         if self.return_crossfield_mask:
             ds_item_dict["gt_crossfield_angle"] = (
                 self.to_tensor(transformed["masks"][mask_idx]).float().unsqueeze(0)
@@ -419,6 +874,9 @@ class PolygonRNNDataset(AbstractDataset):
         n_first_rows_to_read: str = None,
         dataset_type: str = "train",
         grid_size=28,
+        image_decoder="pil",
+        image_cache_size=0,
+        polygon_cache_dir: str = None,
     ) -> None:
         super(PolygonRNNDataset, self).__init__(
             input_csv_path=input_csv_path,
@@ -428,6 +886,8 @@ class PolygonRNNDataset(AbstractDataset):
             image_key=image_key,
             mask_key=mask_key,
             n_first_rows_to_read=n_first_rows_to_read,
+            image_decoder=image_decoder,
+            image_cache_size=image_cache_size,
         )
         self.sequence_length = sequence_length
         self.scale_h_key = scale_h_key if scale_h_key is not None else "scale_h"
@@ -450,9 +910,65 @@ class PolygonRNNDataset(AbstractDataset):
         if dataset_type == "val":
             self.unique_image_path_list = self.df[self.original_image_path_key].unique()
         self.grid_size = grid_size
+        # positional indexes of the entries of each original image, built once with
+        # a single vectorized pass instead of a column scan per lookup.
+        self._image_path_to_indices = self.df.groupby(
+            self.original_image_path_key
+        ).indices
+        self.polygon_cache_dir = polygon_cache_dir
+        self._polygon_cache = None
+        # label index sequences of every entry, filled on first use. They live in
+        # shared memory, so a sequence built by one dataloader worker is reused by
+        # the others. Labels go up to grid_size * grid_size + 2, so int16 is only used
+        # while they fit in it.
+        self._label_index_arrays = torch.zeros(
+            (self.len, sequence_length - 2),
+            dtype=torch.int16
+            if grid_size * grid_size + 3 <= torch.iinfo(torch.int16).max + 1
+            else torch.int32,
+        ).share_memory_()
+        self._label_index_arrays_built = torch.zeros(
+            self.len, dtype=torch.bool
+        ).share_memory_()
+        self._polygon_cache_fingerprint = (
+            None
+            if polygon_cache_dir is None
+            else get_ragged_array_cache_fingerprint(self.df[self.mask_key], root_dir)
+        )
+        if polygon_cache_dir is not None and not ragged_array_cache_exists(
+            polygon_cache_dir, "polygons", self._polygon_cache_fingerprint
+        ):
+            self.build_polygon_cache()
+
+    def build_polygon_cache(self) -> None:
+        """Reads every polygon json of the dataset once and stores them as a single
+        ragged array in polygon_cache_dir, so that load_polygon reads from a memory
+        map instead of opening and parsing one json file per item.
+        """
+        polygon_list = [
+            self._load_polygon_from_path(
+                os.path.join(self.root_dir, self.get_value(idx, self.mask_key))
+            )[0].reshape(-1, 2)
+            for idx in range(self.len)
+        ]
+        save_ragged_array_cache(
+            polygon_list,
+            self.polygon_cache_dir,
+            "polygons",
+            np.float64,
+            fingerprint=self._polygon_cache_fingerprint,
+        )
 
     def load_polygon(self, idx: int) -> Tuple[np.ndarray, int]:
-        mask_name = os.path.join(self.root_dir, self.df.iloc[idx][self.mask_key])
+        if self.polygon_cache_dir is not None:
+            if self._polygon_cache is None:
+                self._polygon_cache = load_ragged_array_cache(
+                    self.polygon_cache_dir, "polygons", expected_length=self.len
+                )
+            data, offsets = self._polygon_cache
+            polygon = np.array(data[offsets[idx] : offsets[idx + 1]])
+            return polygon, len(polygon)
+        mask_name = os.path.join(self.root_dir, self.get_value(idx, self.mask_key))
         return self._load_polygon_from_path(mask_name)
 
     def _load_polygon_from_path(self, mask_name: str) -> Tuple[np.ndarray, int]:
@@ -490,11 +1006,11 @@ class PolygonRNNDataset(AbstractDataset):
         if self.dataset_type == "val":
             output_dict.update(
                 {
-                    "polygon_wkt": self.df.iloc[index][self.original_polygon_key],
-                    "scale_h": self.df.iloc[index][self.scale_h_key],
-                    "scale_w": self.df.iloc[index][self.scale_w_key],
-                    "min_col": self.df.iloc[index][self.min_col_key],
-                    "min_row": self.df.iloc[index][self.min_row_key],
+                    "polygon_wkt": self.get_value(index, self.original_polygon_key),
+                    "scale_h": self.get_value(index, self.scale_h_key),
+                    "scale_w": self.get_value(index, self.scale_w_key),
+                    "min_col": self.get_value(index, self.min_col_key),
+                    "min_row": self.get_value(index, self.min_row_key),
                     "original_image_path": self.get_path(
                         index, key=self.original_image_path_key
                     ),
@@ -510,25 +1026,94 @@ class PolygonRNNDataset(AbstractDataset):
             output_dict.update({"image": self.to_tensor(image).float()})
         return output_dict
 
+    def get_label_index_arrays(self, indices: np.ndarray) -> torch.Tensor:
+        """Returns the (len(indices), sequence_length - 2) label index sequences
+        (the ta targets) of the entries in indices, building the missing ones.
+        """
+        indices = torch.as_tensor(indices, dtype=torch.int64)
+        for idx in indices[~self._label_index_arrays_built[indices]].tolist():
+            polygon, num_vertexes = self.load_polygon(idx)
+            _, label_index_array = polygonrnn_utils.build_arrays(
+                polygon, num_vertexes, self.sequence_length, grid_size=self.grid_size
+            )
+            self._label_index_arrays[idx] = torch.from_numpy(label_index_array[2:])
+            self._label_index_arrays_built[idx] = True
+        return self._label_index_arrays[indices].long()
+
+    def get_stacked_items(self, indices: np.ndarray) -> Dict[str, Any]:
+        """Same values as stacking __getitem__(idx, load_images=False) over indices,
+        gathered with one indexing operation per key instead of building and
+        stacking one dict per entry.
+
+        Args:
+            indices (np.ndarray): positional indexes of the entries.
+
+        Returns:
+            Dict[str, Any]: x1, x2, x3 and ta tensors with a leading len(indices)
+                dimension and, on val datasets, the csv values of the entries.
+        """
+        ta = self.get_label_index_arrays(indices)
+        num_classes = self.grid_size * self.grid_size + 3
+        label_array = torch.zeros((len(ta), self.sequence_length, num_classes))
+        label_array[:, 2:] = torch.nn.functional.one_hot(ta, num_classes)
+        output_dict: Dict[str, Any] = {
+            "x1": label_array[:, 2],
+            "x2": label_array[:, :-2],
+            "x3": label_array[:, 1:-1],
+            "ta": ta,
+        }
+        if self.dataset_type == "val":
+            output_dict.update(
+                {
+                    "polygon_wkt": self._columns[self.original_polygon_key][indices],
+                    "scale_h": torch.from_numpy(
+                        self._columns[self.scale_h_key][indices]
+                    ),
+                    "scale_w": torch.from_numpy(
+                        self._columns[self.scale_w_key][indices]
+                    ),
+                    "min_col": torch.from_numpy(
+                        self._columns[self.min_col_key][indices]
+                    ),
+                    "min_row": torch.from_numpy(
+                        self._columns[self.min_row_key][indices]
+                    ),
+                    "original_image_path": [
+                        self.get_path(idx, key=self.original_image_path_key)
+                        for idx in indices.tolist()
+                    ],
+                }
+            )
+        return output_dict
+
     def get_images_from_image_path(self, image_path: str) -> Dict[str, Any]:
-        entries, items = self.get_training_images_from_image_path(image_path)
+        indices = self.get_indices_from_image_path(image_path)
+        items = [self.__getitem__(idx) for idx in indices.tolist()]
+        # the per polygon scalars are gathered straight from the csv columns, with
+        # one vectorized take per field.
         return {
             "original_image": self.load_image(
-                entries.index.tolist()[0], key=self.original_image_path_key
+                indices[0], key=self.original_image_path_key
             ),
             "shapely_polygon_list": [
-                shapely.wkt.loads(item["polygon_wkt"]) for item in items
+                shapely.wkt.loads(polygon_wkt)
+                for polygon_wkt in self._columns[self.original_polygon_key][indices]
             ],
             "croped_images": torch.stack([item["image"] for item in items]),
-            "scale_h": torch.tensor([item["scale_h"] for item in items]),
-            "scale_w": torch.tensor([item["scale_w"] for item in items]),
-            "min_col": torch.tensor([item["min_col"] for item in items]),
-            "min_row": torch.tensor([item["min_row"] for item in items]),
+            "scale_h": torch.from_numpy(self._columns[self.scale_h_key][indices]),
+            "scale_w": torch.from_numpy(self._columns[self.scale_w_key][indices]),
+            "min_col": torch.from_numpy(self._columns[self.min_col_key][indices]),
+            "min_row": torch.from_numpy(self._columns[self.min_row_key][indices]),
             "ta": torch.stack([item["ta"] for item in items]),
         }
 
+    def get_indices_from_image_path(self, image_path: str) -> np.ndarray:
+        return self._image_path_to_indices.get(
+            image_path, np.empty((0,), dtype=np.int64)
+        )
+
     def get_entries_from_image_path(self, image_path: str) -> pd.DataFrame:
-        return self.df.loc[self.df[self.original_image_path_key] == image_path]
+        return self.df.iloc[self.get_indices_from_image_path(image_path)]
 
     def get_training_images_from_image_path(
         self, image_path: str
@@ -567,7 +1152,16 @@ class ObjectDetectionDataset(AbstractDataset):
         bbox_format="xywh",
         bbox_output_format="xyxy",
         bbox_params=None,
+        image_decoder="pil",
+        image_cache_size=0,
+        bbox_cache_dir=None,
+        gpu_decode=False,
     ) -> None:
+        if gpu_decode and augmentation_list is not None:
+            raise ValueError(
+                "gpu_decode cannot be used with augmentation_list, since the images "
+                "are only decoded after being collated"
+            )
         super(ObjectDetectionDataset, self).__init__(
             input_csv_path=input_csv_path,
             root_dir=root_dir,
@@ -576,6 +1170,8 @@ class ObjectDetectionDataset(AbstractDataset):
             image_key=image_key,
             mask_key=mask_key,
             n_first_rows_to_read=n_first_rows_to_read,
+            image_decoder=image_decoder,
+            image_cache_size=image_cache_size,
         )
         self.transform = (
             None
@@ -587,6 +1183,66 @@ class ObjectDetectionDataset(AbstractDataset):
         )
         self.bbox_format = bbox_format
         self.bbox_output_format = bbox_output_format
+        self.bbox_cache_dir = bbox_cache_dir
+        self._bbox_cache = None
+        self.gpu_decode = gpu_decode
+        self._bbox_cache_fingerprint = (
+            None
+            if bbox_cache_dir is None
+            else get_ragged_array_cache_fingerprint(
+                self.df[self.bounding_box_key], root_dir
+            )
+        )
+        if bbox_cache_dir is not None and not all(
+            ragged_array_cache_exists(
+                bbox_cache_dir, name, self._bbox_cache_fingerprint
+            )
+            for name in ("bboxes", "labels")
+        ):
+            self.build_bbox_cache()
+
+    def build_bbox_cache(self) -> None:
+        """Reads every bounding box json of the dataset once and stores the boxes and
+        labels as ragged arrays in bbox_cache_dir, so that
+        load_bounding_boxes_and_labels reads from a memory map instead of opening
+        and parsing one json file per item.
+        """
+        bbox_list, label_list = [], []
+        for idx in range(self.len):
+            bboxes, labels = self._load_bounding_boxes_and_labels_from_json(idx)
+            bbox_list.append(bboxes.reshape(-1, 4).numpy())
+            label_list.append(labels.numpy())
+        for name, arrays, dtype in (
+            ("bboxes", bbox_list, np.float32),
+            ("labels", label_list, np.int64),
+        ):
+            save_ragged_array_cache(
+                arrays,
+                self.bbox_cache_dir,
+                name,
+                dtype,
+                fingerprint=self._bbox_cache_fingerprint,
+            )
+
+    def load_detection_image(self, idx: int) -> Union[np.ndarray, torch.Tensor]:
+        """Loads the decoded RGB image, or, when gpu_decode is set, the encoded file
+        bytes as a 1D uint8 tensor, to be decoded with decode_images_on_device after
+        the batch is collated.
+        """
+        if self.gpu_decode:
+            return torchvision.io.read_file(self.get_path(idx, key=self.image_key))
+        return self.load_image(idx, key=self.image_key, is_mask=False, force_rgb=True)
+
+    def image_to_chw_tensor(
+        self, image: Union[np.ndarray, torch.Tensor]
+    ) -> torch.Tensor:
+        """Converts a HWC numpy image, which is returned when the augmentation list
+        does not end with ToTensorV2, to a CHW tensor keeping its dtype. uint8
+        images can be normalized on device with normalize_on_device.
+        """
+        if isinstance(image, torch.Tensor):
+            return image
+        return torch.from_numpy(np.ascontiguousarray(image.transpose(2, 0, 1)))
 
     def convert_bbox(self, bbox: List) -> List:
         if self.bbox_format == self.bbox_output_format:
@@ -598,8 +1254,42 @@ class ObjectDetectionDataset(AbstractDataset):
         else:
             raise NotImplementedError
 
+    def convert_bboxes(self, bboxes: Any) -> torch.Tensor:
+        """Converts all the bboxes of an item at once, returning a (N, 4) float32
+        tensor in bbox_output_format.
+        """
+        bboxes = torch.as_tensor(bboxes, dtype=torch.float32).reshape(-1, 4)
+        if self.bbox_format == self.bbox_output_format:
+            return bboxes
+        elif self.bbox_format == "xywh" and self.bbox_output_format == "xyxy":
+            return bboxes_xywh_to_xyxy(bboxes)
+        elif self.bbox_format == "xyxy" and self.bbox_output_format == "xywh":
+            return bboxes_xyxy_to_xywh(bboxes)
+        else:
+            raise NotImplementedError
+
     def load_bounding_boxes_and_labels(
         self, idx: int
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        if self.bbox_cache_dir is None:
+            return self._load_bounding_boxes_and_labels_from_json(idx)
+        if self._bbox_cache is None:
+            self._bbox_cache = {
+                name: load_ragged_array_cache(
+                    self.bbox_cache_dir, name, expected_length=self.len
+                )
+                for name in ("bboxes", "labels")
+            }
+        bbox_data, offsets = self._bbox_cache["bboxes"]
+        label_data, _ = self._bbox_cache["labels"]
+        start, end = offsets[idx], offsets[idx + 1]
+        return (
+            torch.from_numpy(np.array(bbox_data[start:end])),
+            torch.from_numpy(np.array(label_data[start:end])),
+        )
+
+    def _load_bounding_boxes_and_labels_from_json(
+        self, idx: int
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         bbox_path = self.get_path(idx, key=self.bounding_box_key)
         with open(bbox_path, "r") as f:
@@ -616,18 +1306,13 @@ class ObjectDetectionDataset(AbstractDataset):
     def __getitem__(
         self, index: int
     ) -> Tuple[torch.Tensor, Dict[str, torch.Tensor], int]:
-        image = self.load_image(
-            index, key=self.image_key, is_mask=False, force_rgb=True
-        )
+        image = self.load_detection_image(index)
         bbox_list, label_list = self.load_bounding_boxes_and_labels(index)
         ds_item_dict = {"image": image, "bboxes": bbox_list, "labels": label_list}
         if self.transform is not None:
             ds_item_dict = self.transform(**ds_item_dict)
-        image = ds_item_dict.pop("image")
-        ds_item_dict["boxes"] = torch.as_tensor(
-            [self.convert_bbox(bbox) for bbox in ds_item_dict.pop("bboxes")],
-            dtype=torch.float32,
-        )
+        image = self.image_to_chw_tensor(ds_item_dict.pop("image"))
+        ds_item_dict["boxes"] = self.convert_bboxes(ds_item_dict.pop("bboxes"))
         ds_item_dict["labels"] = torch.as_tensor(
             ds_item_dict["labels"], dtype=torch.int64
         )
@@ -643,7 +1328,7 @@ class ObjectDetectionDataset(AbstractDataset):
         """
 
         images, targets, indexes = tuple(zip(*batch))
-        images = torch.stack(images, dim=0)
+        images = stack_images(images)
         indexes = torch.tensor(indexes, dtype=torch.int64)
         return images, list(targets), indexes
 
@@ -665,6 +1350,10 @@ class InstanceSegmentationDataset(ObjectDetectionDataset):
         return_mask=True,
         return_keypoints=False,
         bbox_params=None,
+        image_decoder="pil",
+        image_cache_size=0,
+        bbox_cache_dir=None,
+        gpu_decode=False,
     ) -> None:
         mask_key = "polygon_mask" if mask_key is None else mask_key
         super(InstanceSegmentationDataset, self).__init__(
@@ -679,6 +1368,10 @@ class InstanceSegmentationDataset(ObjectDetectionDataset):
             bbox_format=bbox_format,
             bbox_output_format=bbox_output_format,
             bbox_params=bbox_params,
+            image_decoder=image_decoder,
+            image_cache_size=image_cache_size,
+            bbox_cache_dir=bbox_cache_dir,
+            gpu_decode=gpu_decode,
         )
         self.return_mask = return_mask
         self.return_keypoints = return_keypoints
@@ -693,9 +1386,7 @@ class InstanceSegmentationDataset(ObjectDetectionDataset):
     def __getitem__(
         self, index: int
     ) -> Tuple[torch.Tensor, Dict[str, torch.Tensor], int]:
-        image = self.load_image(
-            index, key=self.image_key, is_mask=False, force_rgb=True
-        )
+        image = self.load_detection_image(index)
         bbox_list, label_list = self.load_bounding_boxes_and_labels(index)
         ds_item_dict = {"image": image, "bboxes": bbox_list, "labels": label_list}
         if self.return_mask:
@@ -706,11 +1397,8 @@ class InstanceSegmentationDataset(ObjectDetectionDataset):
             ds_item_dict["keypoints"] = self.load_keypoints(index)
         if self.transform is not None:
             ds_item_dict = self.transform(**ds_item_dict)
-        image = ds_item_dict.pop("image")
-        ds_item_dict["boxes"] = torch.as_tensor(
-            [self.convert_bbox(bbox) for bbox in ds_item_dict.pop("bboxes")],
-            dtype=torch.float32,
-        )
+        image = self.image_to_chw_tensor(ds_item_dict.pop("image"))
+        ds_item_dict["boxes"] = self.convert_bboxes(ds_item_dict.pop("bboxes"))
         ds_item_dict["labels"] = torch.as_tensor(
             ds_item_dict["labels"], dtype=torch.int64
         )
@@ -757,7 +1445,7 @@ class NaiveModPolyMapperDataset(Dataset):
         """
 
         images, targets, indexes = tuple(zip(*batch))
-        images = torch.stack(images, dim=0)
+        images = stack_images(images)
         indexes = torch.tensor(indexes, dtype=torch.int64)
         return images, list(targets), indexes
 
@@ -773,26 +1461,19 @@ class ModPolyMapperDataset(NaiveModPolyMapperDataset):
             polygon_rnn_dataset=polygon_rnn_dataset,
         )
 
-    def get_polygonrnn_polygon_data(self, idx: int) -> List[Any]:
+    def get_polygonrnn_polygon_data(self, idx: int) -> Dict[str, Any]:
         image_path = self.object_detection_dataset.get_path(
             idx, key=self.object_detection_dataset.image_key, add_root_dir=False
         )
-        entries = self.polygon_rnn_dataset.get_entries_from_image_path(image_path)
-        return [
-            self.polygon_rnn_dataset.__getitem__(idx) for idx in entries.index.tolist()
-        ]
+        return self.polygon_rnn_dataset.get_stacked_items(
+            self.polygon_rnn_dataset.get_indices_from_image_path(image_path)
+        )
 
     def __getitem__(
         self, index: int
     ) -> Tuple[torch.Tensor, torch.Tensor, Dict[str, torch.Tensor], int]:
         image, ds_item_dict, _ = self.object_detection_dataset[index]
-        polygonrnn_data = self.get_polygonrnn_polygon_data(index)
-        dict_items_to_update = {
-            key: torch.stack([torch.tensor(item[key]) for item in polygonrnn_data])
-            for key in polygonrnn_data[0].keys()
-        }
-        croped_images = dict_items_to_update.pop("image")
-        ds_item_dict.update(dict_items_to_update)
+        ds_item_dict.update(self.get_polygonrnn_polygon_data(index))
         return image, ds_item_dict, index
 
     @staticmethod
@@ -805,7 +1486,7 @@ class ModPolyMapperDataset(NaiveModPolyMapperDataset):
         """
 
         images, targets, indexes = tuple(zip(*batch))
-        images = torch.stack(images, dim=0)
+        images = stack_images(images)
         indexes = torch.tensor(indexes, dtype=torch.int64)
         return images, list(targets), indexes
 
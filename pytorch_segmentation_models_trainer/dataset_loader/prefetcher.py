@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ pytorch_segmentation_models_trainer
+                              -------------------
+        begin                : 2021-02-25
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Philipe Borba - Cartographic Engineer
+                                                            @ Brazilian Army
+        email                : philipeborba at gmail dot com
+ ***************************************************************************/
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ****
+"""
+from typing import Any, Iterable, Iterator, Optional, Union
+
+import torch
+
+
+def move_to_device(obj: Any, device: torch.device) -> Any:
+    """Copies every tensor of a (possibly nested) dict, list or tuple batch to
+    device without blocking the host. Cpu tensors are pinned first, since copies from
+    pageable memory are always synchronous. Other values (paths, python scalars,
+    shapely geometries) are returned untouched.
+    """
+    if isinstance(obj, torch.Tensor):
+        if obj.device.type == "cpu" and device.type == "cuda" and not obj.is_pinned():
+            obj = obj.pin_memory()
+        return obj.to(device, non_blocking=True)
+    if isinstance(obj, dict):
+        return {key: move_to_device(value, device) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(move_to_device(value, device) for value in obj)
+    return obj
+
+
+def record_stream(obj: Any, stream: torch.cuda.Stream) -> None:
+    """Marks every cuda tensor of a (possibly nested) batch as used by stream, so
+    that the caching allocator does not reuse its memory while stream still reads
+    it.
+    """
+    if isinstance(obj, torch.Tensor):
+        if obj.is_cuda:
+            obj.record_stream(stream)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            record_stream(value, stream)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            record_stream(value, stream)
+
+
+class DataPrefetcher:
+    """Wraps a dataloader, copying the next batch to device on a side cuda stream
+    while the current batch is being processed. Works with the dict and tuple
+    batches of the datasets of this project.
+
+    Args:
+        loader (Iterable): dataloader. It should use pin_memory=True, otherwise the
+            batches are pinned by the prefetcher in the main process.
+        device (Union[str, torch.device]): target device.
+        stream (Optional[torch.cuda.Stream], optional): stream used for the copies.
+            Defaults to None (a new stream on device). Ignored on cpu devices.
+    """
+
+    def __init__(
+        self,
+        loader: Iterable,
+        device: Union[str, torch.device],
+        stream: Optional[torch.cuda.Stream] = None,
+    ) -> None:
+        self.loader = loader
+        self.device = torch.device(device)
+        if self.device.type != "cuda":
+            self.stream = None
+        else:
+            self.stream = (
+                stream if stream is not None else torch.cuda.Stream(device=self.device)
+            )
+
+    def __len__(self) -> int:
+        return len(self.loader)
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.stream is None:
+            for batch in self.loader:
+                yield move_to_device(batch, self.device)
+            return
+        loader_iter = iter(self.loader)
+        has_next, next_batch = self._preload(loader_iter)
+        while has_next:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_stream(self.stream)
+            record_stream(next_batch, current_stream)
+            batch = next_batch
+            has_next, next_batch = self._preload(loader_iter)
+            yield batch
+
+    def _preload(self, loader_iter: Iterator[Any]):
+        try:
+            batch = next(loader_iter)
+        except StopIteration:
+            return False, None
+        with torch.cuda.stream(self.stream):
+            return True, move_to_device(batch, self.device)
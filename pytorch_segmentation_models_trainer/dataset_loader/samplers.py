@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ pytorch_segmentation_models_trainer
+                              -------------------
+        begin                : 2021-02-25
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Philipe Borba - Cartographic Engineer
+                                                            @ Brazilian Army
+        email                : philipeborba at gmail dot com
+ ***************************************************************************/
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ****
+"""
+from typing import Iterator, List
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+class ShapeGroupedBatchSampler(Sampler):
+    """Batch sampler that only groups items with the same image shape, read from the
+    width and height columns of the dataset csv. Every shape group is split into
+    batches and all the batches are served by a single dataloader, so datasets with
+    mixed image sizes can be batched without one dataloader per shape.
+
+    Args:
+        dataset (AbstractDataset): dataset with a df attribute that has the
+            width and height columns.
+        batch_size (int): maximum number of items of each batch.
+        shuffle (bool, optional): shuffles the items inside each group and the order
+            of the batches. Defaults to False.
+        drop_last (bool, optional): drops the incomplete last batch of each group.
+            Defaults to False.
+        width_key (str, optional): width column. Defaults to "width".
+        height_key (str, optional): height column. Defaults to "height".
+    """
+
+    def __init__(
+        self,
+        dataset,
+        batch_size: int,
+        shuffle: bool = False,
+        drop_last: bool = False,
+        width_key: str = "width",
+        height_key: str = "height",
+    ) -> None:
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        shapes = dataset.df[[width_key, height_key]].to_numpy()
+        _, group_ids = np.unique(shapes, axis=0, return_inverse=True)
+        group_ids = group_ids.reshape(-1)
+        self.groups = [
+            np.flatnonzero(group_ids == group_id)
+            for group_id in range(group_ids.max() + 1 if len(group_ids) > 0 else 0)
+        ]
+
+    def _split_group(self, group: np.ndarray) -> List[List[int]]:
+        batches = [
+            group[start : start + self.batch_size].tolist()
+            for start in range(0, len(group), self.batch_size)
+        ]
+        if self.drop_last and batches and len(batches[-1]) < self.batch_size:
+            batches.pop()
+        return batches
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = []
+        for group in self.groups:
+            if self.shuffle:
+                group = group[torch.randperm(len(group)).numpy()]
+            batches.extend(self._split_group(group))
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches)).tolist()]
+        return iter(batches)
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return sum(len(group) // self.batch_size for group in self.groups)
+        return sum(
+            (len(group) + self.batch_size - 1) // self.batch_size
+            for group in self.groups
+        )
@@ -19,34 +19,88 @@
  ****
 """
 
+import pytorch_lightning as pl
 import torch
+from pytorch_segmentation_models_trainer.dataset_loader.dataset import (
+    decode_images_on_device,
+    normalize_on_device,
+)
+from pytorch_segmentation_models_trainer.dataset_loader.samplers import (
+    ShapeGroupedBatchSampler,
+)
 from pytorch_segmentation_models_trainer.model_loader.model import Model
 from pytorch_segmentation_models_trainer.utils import object_detection_utils
+from pytorch_segmentation_models_trainer.utils.model_utils import (
+    loss_mode,
+    sum_losses,
+)
+from pytorch_segmentation_models_trainer.utils.tensor_utils import RunningMean
 from torch.utils.data import DataLoader
 
 
 class ObjectDetectionPLModel(Model):
     def __init__(self, cfg):
         super(ObjectDetectionPLModel, self).__init__(cfg)
+        self.running_logs = {"train": RunningMean(), "val": RunningMean()}
+
+    def on_before_batch_transfer(self, batch, dataloader_idx):
+        images, targets, indexes = batch
+        if isinstance(images, list):
+            images = decode_images_on_device(images, self.device)
+        return images, targets, indexes
+
+    def on_after_batch_transfer(self, batch, dataloader_idx):
+        images, targets, indexes = batch
+        if not images.is_floating_point():
+            images = normalize_on_device(images, **self.device_normalization_params)
+        return images, targets, indexes
 
     def get_loss_function(self):
         return None
 
+    def get_batching_kwargs(self, ds, data_loader_cfg, shuffle, drop_last):
+        """Returns the batching arguments of the DataLoader. When group_by_shape is
+        set on the data_loader config, batches only hold images of the same shape,
+        which allows datasets with mixed image sizes to be loaded without resizing.
+        """
+        if not data_loader_cfg.get("group_by_shape", False):
+            return dict(
+                batch_size=self.cfg.hyperparameters.batch_size,
+                shuffle=shuffle,
+                drop_last=drop_last,
+            )
+        return dict(
+            batch_sampler=ShapeGroupedBatchSampler(
+                ds,
+                batch_size=self.cfg.hyperparameters.batch_size,
+                shuffle=shuffle,
+                drop_last=drop_last,
+            )
+        )
+
     def train_dataloader(self):
         return DataLoader(
             self.train_ds,
-            batch_size=self.cfg.hyperparameters.batch_size,
-            shuffle=self.cfg.train_dataset.data_loader.shuffle,
+            **self.get_batching_kwargs(
+                self.train_ds,
+                self.cfg.train_dataset.data_loader,
+                shuffle=self.cfg.train_dataset.data_loader.shuffle,
+                drop_last=self.cfg.train_dataset.data_loader.drop_last
+                if "drop_last" in self.cfg.train_dataset.data_loader
+                else True,
+            ),
             num_workers=self.cfg.train_dataset.data_loader.num_workers,
+            persistent_workers=self.cfg.train_dataset.data_loader.persistent_workers
+            if "persistent_workers" in self.cfg.train_dataset.data_loader
+            else self.cfg.train_dataset.data_loader.num_workers > 0,
             pin_memory=self.cfg.train_dataset.data_loader.pin_memory
             if "pin_memory" in self.cfg.train_dataset.data_loader
             else True,
-            drop_last=self.cfg.train_dataset.data_loader.drop_last
-            if "drop_last" in self.cfg.train_dataset.data_loader
-            else True,
+            # prefetch_factor counts batches per worker, so the default must not
+            # grow with the batch size.
             prefetch_factor=self.cfg.train_dataset.data_loader.prefetch_factor
             if "prefetch_factor" in self.cfg.train_dataset.data_loader
-            else 4 * self.hyperparameters.batch_size,
+            else 2,
             collate_fn=self.train_ds.collate_fn
             if hasattr(self.train_ds, "collate_fn")
             else self.train_ds.train_dataset.collate_fn,
@@ -55,20 +109,26 @@ class ObjectDetectionPLModel(Model):
     def val_dataloader(self):
         return DataLoader(
             self.val_ds,
-            batch_size=self.cfg.hyperparameters.batch_size,
-            shuffle=self.cfg.val_dataset.data_loader.shuffle
-            if "shuffle" in self.cfg.val_dataset.data_loader
-            else False,
+            **self.get_batching_kwargs(
+                self.val_ds,
+                self.cfg.val_dataset.data_loader,
+                shuffle=self.cfg.val_dataset.data_loader.shuffle
+                if "shuffle" in self.cfg.val_dataset.data_loader
+                else False,
+                drop_last=self.cfg.val_dataset.data_loader.drop_last
+                if "drop_last" in self.cfg.val_dataset.data_loader
+                else True,
+            ),
             num_workers=self.cfg.val_dataset.data_loader.num_workers,
+            persistent_workers=self.cfg.val_dataset.data_loader.persistent_workers
+            if "persistent_workers" in self.cfg.val_dataset.data_loader
+            else self.cfg.val_dataset.data_loader.num_workers > 0,
             pin_memory=self.cfg.val_dataset.data_loader.pin_memory
             if "pin_memory" in self.cfg.val_dataset.data_loader
             else True,
-            drop_last=self.cfg.val_dataset.data_loader.drop_last
-            if "drop_last" in self.cfg.val_dataset.data_loader
-            else True,
             prefetch_factor=self.cfg.val_dataset.data_loader.prefetch_factor
             if "prefetch_factor" in self.cfg.val_dataset.data_loader
-            else 4 * self.hyperparameters.batch_size,
+            else 2,
             collate_fn=self.val_ds.collate_fn
             if hasattr(self.val_ds, "collate_fn")
             else self.val_ds.val_dataset.collate_fn,
@@ -77,57 +137,44 @@ class ObjectDetectionPLModel(Model):
     def training_step(self, batch, batch_idx):
         images, targets, _ = batch
         loss_dict = self.model(images, targets)
-        return {
-            "loss": sum(loss for loss in loss_dict.values()),
-            "log": loss_dict,
-            "progress_bar": loss_dict,
-        }
+        loss = sum_losses(loss_dict)
+        self.running_logs["train"].update({"loss": loss, **loss_dict})
+        return {"loss": loss}
 
     def validation_step(self, batch, batch_idx):
         images, targets, _ = batch
-        self.model.train()
-        loss_dict = self.model(images, targets)
-        self.model.eval()
+        with loss_mode(self.model):
+            loss_dict = self.model(images, targets)
         outs = self.model(images)
-        iou = torch.stack(
-            [
-                object_detection_utils.evaluate_box_iou(t, o)
-                for t, o in zip(targets, outs)
-            ]
-        ).mean()
-        return {
-            "val_iou": iou,
-            "loss": sum(loss for loss in loss_dict.values()),
-            "log": loss_dict,
-        }
+        iou = object_detection_utils.evaluate_batch_box_iou(targets, outs).mean()
+        loss = sum_losses(loss_dict)
+        self.running_logs["val"].update({"loss": loss, "val_iou": iou, **loss_dict})
+        return {"loss": loss}
 
-    def training_epoch_end(self, outputs):
-        tensorboard_logs = self._build_tensorboard_logs(outputs)
+    # Model overrides the *_epoch_end(outputs) hooks, which makes Lightning keep every
+    # step output until the end of the epoch. The logs come from running_logs, so the
+    # LightningModule defaults are restored and the outputs-free hooks are used.
+    training_epoch_end = pl.LightningModule.training_epoch_end
+    validation_epoch_end = pl.LightningModule.validation_epoch_end
+
+    def on_train_epoch_end(self):
+        tensorboard_logs = self._build_tensorboard_logs()
         self.log_dict(tensorboard_logs, logger=True)
 
-    def _build_tensorboard_logs(self, outputs, step_type="train"):
-        avg_loss = torch.stack([x["loss"] for x in outputs]).mean()
-        tensorboard_logs = {"avg_loss": {step_type: avg_loss}}
-        if len(outputs) == 0:
-            return tensorboard_logs
-        for loss_key in outputs[0]["log"].keys():
-            tensorboard_logs.update(
-                {
-                    f"avg_{loss_key}": {
-                        step_type: torch.stack(
-                            [x["log"][loss_key] for x in outputs]
-                        ).mean()
-                    }
-                }
-            )
+    def _build_tensorboard_logs(self, step_type="train"):
+        running_logs = self.running_logs[step_type]
+        tensorboard_logs = {
+            f"avg_{key}": {step_type: value}
+            for key, value in running_logs.compute().items()
+        }
+        running_logs.reset()
         return tensorboard_logs
 
-    def validation_epoch_end(self, outputs):
-        avg_iou = torch.stack([o["val_iou"] for o in outputs]).mean()
-        logs = {"val_iou": avg_iou}
-        tensorboard_logs = self._build_tensorboard_logs(outputs, step_type="val")
+    def on_validation_epoch_end(self):
+        tensorboard_logs = self._build_tensorboard_logs(step_type="val")
+        avg_iou = tensorboard_logs.pop("avg_val_iou")["val"]
         self.log_dict(tensorboard_logs, logger=True)
-        return {"avg_val_iou": avg_iou, "log": logs}
+        self.log("val_iou", avg_iou, logger=True)
 
 
 class InstanceSegmentationPLModel(ObjectDetectionPLModel):
@@ -20,8 +20,10 @@
  *   https://github.com/Lydorn/Polygonization-by-Frame-Field-Learning/     *
  ****
 """
+import itertools
 from logging import log
 from collections import OrderedDict
+import kornia
 import torch
 import torch.nn as nn
 import segmentation_models_pytorch as smp
@@ -231,6 +233,13 @@ class FrameFieldModel(nn.Module):
 
 
 class FrameFieldSegmentationPLModel(Model):
+    gpu_augmentation_mask_keys = (
+        "gt_polygons_image",
+        "gt_crossfield_angle",
+        "distances",
+        "sizes",
+    )
+
     def __init__(self, cfg):
         super(FrameFieldSegmentationPLModel, self).__init__(cfg)
         self.loss_norm_is_initializated = False
@@ -257,6 +266,90 @@ class FrameFieldSegmentationPLModel(Model):
                 trainable=self.cfg.pl_model.set_crossfield_trainable
             )
 
+    def get_gpu_augmentations(self, augmentation_list):
+        """Builds a kornia AugmentationSequential that transforms the batch image and
+        its ground truth masks together, on the device of the batch. Geometric
+        augmentations are applied to both with the same parameters, while intensity
+        augmentations only change the image.
+
+        Args:
+            augmentation_list (List): list of kornia augmentation configs
+
+        Returns:
+            kornia.augmentation.AugmentationSequential: the augmentation pipeline, or
+            None if augmentation_list is empty.
+        """
+        if len(augmentation_list) == 0:
+            return None
+        return kornia.augmentation.AugmentationSequential(
+            *[instantiate(aug, _recursive_=False) for aug in augmentation_list]
+        )
+
+    @staticmethod
+    def is_intensity_augmentation(augmentation):
+        """Tells if a kornia augmentation only changes pixel values, leaving the
+        geometry of the image untouched.
+
+        Args:
+            augmentation (torch.nn.Module): kornia augmentation
+
+        Returns:
+            bool: True for intensity augmentations, False otherwise.
+        """
+        intensity_base = getattr(
+            kornia.augmentation, "IntensityAugmentationBase2D", None
+        ) or getattr(
+            getattr(kornia.augmentation, "base", None),
+            "IntensityAugmentationBase2D",
+            None,
+        )
+        return intensity_base is not None and isinstance(augmentation, intensity_base)
+
+    def apply_gpu_augmentations(self, batch, transform):
+        """Applies transform to the batch image and its ground truth masks.
+
+        gt_crossfield_angle stores edge tangent angles as pixel values, which
+        geometric augmentations would move without rotating or reflecting, and
+        bilinear resampling would blend across the 0/pi wrap-around. Because of
+        that, only intensity augmentations are accepted when it is in the batch.
+
+        Args:
+            batch (Dict): batch with the image and its ground truth masks
+            transform (kornia.augmentation.AugmentationSequential): augmentations
+
+        Raises:
+            ValueError: if gt_crossfield_angle is in the batch and transform has a
+                geometric augmentation.
+
+        Returns:
+            Dict: the augmented batch
+        """
+        mask_keys = [key for key in self.gpu_augmentation_mask_keys if key in batch]
+        if "gt_crossfield_angle" in mask_keys:
+            geometric_augmentations = [
+                type(aug).__name__
+                for aug in transform.children()
+                if not self.is_intensity_augmentation(aug)
+            ]
+            if len(geometric_augmentations) > 0:
+                raise ValueError(
+                    "Geometric gpu augmentations ({}) would corrupt "
+                    "gt_crossfield_angle. Keep only intensity augmentations in "
+                    "gpu_augmentation_list when training with frame fields.".format(
+                        ", ".join(geometric_augmentations)
+                    )
+                )
+        outputs = transform(
+            batch["image"],
+            *[batch[key] for key in mask_keys],
+            data_keys=["input"] + ["mask"] * len(mask_keys),
+        )
+        if isinstance(outputs, torch.Tensor):
+            outputs = [outputs]
+        for key, value in zip(["image"] + mask_keys, outputs):
+            batch[key] = value
+        return batch
+
     def get_loss_function(self) -> MultiLoss:
         """Multi-loss model defined in frame field article
         Returns:
@@ -325,19 +418,21 @@ class FrameFieldSegmentationPLModel(Model):
             )  # Initialise
 
         batch_i = 0
-        while batch_i < total_batches:
-            batch = next(iter(dl))
-            # Update loss norms
-            batch = (
-                tensor_utils.batch_to_cuda(batch)
-                if self.cfg.device == "cuda"
-                else batch
-            )
-            pred = self.model(batch["image"])
-            self.loss_function.update_norm(pred, batch, batch["image"].shape[0])
-            if t is not None:
-                t.update(1)
-            batch_i += 1
+        while batch_i < total_batches and len(dl) > 0:
+            # a single iterator is consumed per pass, so the workers keep
+            # prefetching instead of being respawned for every batch.
+            for batch in itertools.islice(dl, total_batches - batch_i):
+                # Update loss norms
+                batch = (
+                    tensor_utils.batch_to_cuda(batch)
+                    if self.cfg.device == "cuda"
+                    else batch
+                )
+                pred = self.model(batch["image"])
+                self.loss_function.update_norm(pred, batch, batch["image"].shape[0])
+                if t is not None:
+                    t.update(1)
+                batch_i += 1
 
         # Now sync loss norms across GPUs:
         world_size = self.get_world_size()
@@ -355,11 +450,8 @@ class FrameFieldSegmentationPLModel(Model):
             return self.cfg.pl_trainer.gpus
 
     def training_step(self, batch, batch_idx):
-        batch["image"] = (
-            batch["image"]
-            if self.gpu_train_transform is None
-            else self.gpu_train_transform(batch["image"])
-        )
+        if self.gpu_train_transform is not None:
+            batch = self.apply_gpu_augmentations(batch, self.gpu_train_transform)
         pred = self.model(batch["image"])
         if self.use_mixup:
             (
@@ -418,12 +510,9 @@ class FrameFieldSegmentationPLModel(Model):
         return {"loss": loss, "log": tensorboard_logs}
 
     def validation_step(self, batch, batch_idx):
-        image = (
-            batch["image"]
-            if self.gpu_val_transform is None
-            else self.gpu_val_transform(batch["image"])
-        )
-        pred = self.model(image)
+        if self.gpu_val_transform is not None:
+            batch = self.apply_gpu_augmentations(batch, self.gpu_val_transform)
+        pred = self.model(batch["image"])
         loss, individual_metrics_dict, extra_dict = self.loss_function(
             pred, batch, epoch=self.current_epoch
         )
@@ -29,10 +29,19 @@ from hydra.utils import instantiate
 from shapely.geometry import Polygon
 from pytorch_lightning.trainer.supporters import CombinedLoader
 from pytorch_segmentation_models_trainer.custom_metrics import metrics
+from pytorch_segmentation_models_trainer.dataset_loader.dataset import (
+    decode_images_on_device,
+    normalize_on_device,
+)
 from pytorch_segmentation_models_trainer.utils import (
     object_detection_utils,
     polygonrnn_utils,
 )
+from pytorch_segmentation_models_trainer.utils.model_utils import (
+    loss_mode,
+    sum_losses,
+)
+from pytorch_segmentation_models_trainer.utils.tensor_utils import RunningMean
 from torch import nn
 from torch.utils.data import DataLoader
 from torchmetrics.detection import MAP
@@ -66,6 +75,12 @@ class GenericPolyMapperPLModel(pl.LightningModule):
             self.cfg.val_dataset.polygon_rnn, _recursive_=False
         )
         self.val_mAP = MAP()
+        self.device_normalization_params = (
+            dict(self.cfg.pl_model.device_normalization)
+            if "device_normalization" in self.cfg.pl_model
+            else {}
+        )
+        self.running_logs = {"train": RunningMean(), "val": RunningMean()}
 
     def get_model(self):
         model = instantiate(self.cfg.model, _recursive_=False)
@@ -99,13 +114,18 @@ class GenericPolyMapperPLModel(pl.LightningModule):
             batch_size=batch_size,
             shuffle=self.cfg.train_dataset.data_loader.shuffle,
             num_workers=self.cfg.train_dataset.data_loader.num_workers,
+            persistent_workers=self.cfg.train_dataset.data_loader.persistent_workers
+            if "persistent_workers" in self.cfg.train_dataset.data_loader
+            else self.cfg.train_dataset.data_loader.num_workers > 0,
             pin_memory=self.cfg.train_dataset.data_loader.pin_memory
             if "pin_memory" in self.cfg.train_dataset.data_loader
             else True,
             drop_last=self.cfg.train_dataset.data_loader.drop_last
             if "drop_last" in self.cfg.train_dataset.data_loader
             else True,
-            prefetch_factor=self.cfg.train_dataset.data_loader.prefetch_factor,
+            prefetch_factor=self.cfg.train_dataset.data_loader.prefetch_factor
+            if "prefetch_factor" in self.cfg.train_dataset.data_loader
+            else 2,
             collate_fn=ds.collate_fn if hasattr(ds, "collate_fn") else None,
         )
 
@@ -117,13 +137,18 @@ class GenericPolyMapperPLModel(pl.LightningModule):
             if "shuffle" in self.cfg.val_dataset.data_loader
             else False,
             num_workers=self.cfg.val_dataset.data_loader.num_workers,
+            persistent_workers=self.cfg.val_dataset.data_loader.persistent_workers
+            if "persistent_workers" in self.cfg.val_dataset.data_loader
+            else self.cfg.val_dataset.data_loader.num_workers > 0,
             pin_memory=self.cfg.val_dataset.data_loader.pin_memory
             if "pin_memory" in self.cfg.val_dataset.data_loader
             else True,
             drop_last=self.cfg.val_dataset.data_loader.drop_last
             if "drop_last" in self.cfg.val_dataset.data_loader
             else True,
-            prefetch_factor=self.cfg.val_dataset.data_loader.prefetch_factor,
+            prefetch_factor=self.cfg.val_dataset.data_loader.prefetch_factor
+            if "prefetch_factor" in self.cfg.val_dataset.data_loader
+            else 2,
             collate_fn=ds.collate_fn if hasattr(ds, "collate_fn") else None,
         )
 
@@ -158,37 +183,41 @@ class GenericPolyMapperPLModel(pl.LightningModule):
     def get_loss_function(self):
         return nn.CrossEntropyLoss()
 
-    def _build_tensorboard_logs(self, outputs, step_type="train"):
-        avg_loss = torch.stack([x["loss"] for x in outputs]).mean()
-        tensorboard_logs = {"avg_loss": {step_type: avg_loss}}
-        if len(outputs) == 0:
-            return tensorboard_logs
-        for key in outputs[0]["log"].keys():
-            if key in ["intersection", "union"]:
-                continue
-            tensorboard_logs.update(
-                {
-                    f"avg_{key}": {
-                        step_type: torch.cat(
-                            [
-                                x["log"][key].unsqueeze(0).float()
-                                if x["log"][key].shape == torch.Size([])
-                                else x["log"][key].float()
-                                for x in outputs
-                            ]
-                        ).mean()
-                    }
-                }
-            )
-        if "intersection" not in outputs[0]["log"] or "union" not in outputs[0]["log"]:
-            return tensorboard_logs
-        intersection = sum([x["log"]["intersection"] for x in outputs])
-        union = sum([x["log"]["intersection"] for x in outputs])
-        tensorboard_logs.update(
-            {"polygon_iou": {step_type: torch.tensor(intersection / union)}}
-        )
+    def _build_tensorboard_logs(self, step_type="train"):
+        running_logs = self.running_logs[step_type]
+        tensorboard_logs = {
+            f"avg_{key}": {step_type: value}
+            for key, value in running_logs.compute().items()
+            if key not in ["intersection", "union"]
+        }
+        if "intersection" in running_logs.sums and "union" in running_logs.sums:
+            tensorboard_logs["polygon_iou"] = {
+                step_type: running_logs.sums["intersection"]
+                / running_logs.sums["union"]
+            }
+        running_logs.reset()
         return tensorboard_logs
 
+    def on_before_batch_transfer(self, batch, dataloader_idx):
+        if "object_detection" not in batch:
+            return batch
+        obj_det_images, obj_det_targets, indexes = batch["object_detection"]
+        if isinstance(obj_det_images, list):
+            obj_det_images = decode_images_on_device(obj_det_images, self.device)
+            batch["object_detection"] = obj_det_images, obj_det_targets, indexes
+        return batch
+
+    def on_after_batch_transfer(self, batch, dataloader_idx):
+        if "object_detection" not in batch:
+            return batch
+        obj_det_images, obj_det_targets, indexes = batch["object_detection"]
+        if not obj_det_images.is_floating_point():
+            obj_det_images = normalize_on_device(
+                obj_det_images, **self.device_normalization_params
+            )
+            batch["object_detection"] = obj_det_images, obj_det_targets, indexes
+        return batch
+
     def _get_batch_images(self, batch):
         obj_det_images, obj_det_targets, _ = (
             batch["object_detection"]
@@ -202,7 +231,7 @@ class GenericPolyMapperPLModel(pl.LightningModule):
         loss_dict, acc = self.model(obj_det_images, obj_det_targets, polygon_rnn_batch)
         detached_loss_dict = {key: loss.detach() for key, loss in loss_dict.items()}
         detached_loss_dict.update({"acc": acc.detach()})
-        loss = sum(loss for loss in loss_dict.values())
+        loss = sum_losses(loss_dict)
         return acc, detached_loss_dict, loss
 
     def training_step(self, batch, batch_idx):
@@ -218,14 +247,14 @@ class GenericPolyMapperPLModel(pl.LightningModule):
         self.log(
             "train_acc", acc, on_step=True, prog_bar=True, logger=True, sync_dist=False
         )
-        return {"loss": loss, "log": detached_loss_dict}
+        self.running_logs["train"].update({"loss": loss, **detached_loss_dict})
+        return {"loss": loss}
 
     def validation_step(self, batch, batch_idx):
         obj_det_images, obj_det_targets, polygon_rnn_batch = self._get_batch_images(
             batch
         )
-        with torch.no_grad():
-            self.model.train()
+        with torch.no_grad(), loss_mode(self.model):
             acc, detached_loss_dict, loss = self._compute_acc_loss(
                 obj_det_images, obj_det_targets, polygon_rnn_batch
             )
@@ -247,13 +276,12 @@ class GenericPolyMapperPLModel(pl.LightningModule):
             logger=True,
             sync_dist=True,
         )
-        return_dict = {"loss": loss, "log": detached_loss_dict}
+        detached_loss_dict["loss"] = loss
         if self.perform_evaluation:
-            self.model.eval()
             outputs = self.model(obj_det_images)
-            metrics_dict_item = self.evaluate_output(batch, outputs)
-            return_dict["log"].update(metrics_dict_item)
-        return return_dict
+            detached_loss_dict.update(self.evaluate_output(batch, outputs))
+        self.running_logs["val"].update(detached_loss_dict)
+        return {"loss": loss}
 
     def evaluate_output(
         self, batch, outputs: List[Dict[str, torch.Tensor]]
@@ -277,11 +305,8 @@ class GenericPolyMapperPLModel(pl.LightningModule):
 
     def _evaluate_obj_det(self, outputs, batch):
         obj_det_images, obj_det_targets, _ = batch["object_detection"]
-        box_iou = torch.stack(
-            [
-                object_detection_utils.evaluate_box_iou(t, o)
-                for t, o in zip(obj_det_targets, outputs)
-            ]
+        box_iou = object_detection_utils.evaluate_batch_box_iou(
+            obj_det_targets, outputs
         )
         mAP = self.val_mAP(outputs, obj_det_targets)
 
@@ -306,12 +331,8 @@ class GenericPolyMapperPLModel(pl.LightningModule):
         batch_polis = torch.from_numpy(
             metrics.batch_polis(predicted_polygon_list, gt_polygon_list)
         )
-
-        def iou(x):
-            return metrics.polygon_iou(x[0], x[1])
-
-        output_tensor_iou = torch.tensor(
-            list(map(iou, zip(predicted_polygon_list, gt_polygon_list)))
+        output_tensor_iou = torch.from_numpy(
+            metrics.batch_polygon_iou(predicted_polygon_list, gt_polygon_list)
         )
         intersection = (
             output_tensor_iou[:, 1] if len(output_tensor_iou) > 0 else torch.tensor(0.0)
@@ -324,10 +345,10 @@ class GenericPolyMapperPLModel(pl.LightningModule):
 
         return batch_polis, intersection, union
 
-    def training_epoch_end(self, outputs):
-        tensorboard_logs = self._build_tensorboard_logs(outputs)
+    def on_train_epoch_end(self):
+        tensorboard_logs = self._build_tensorboard_logs()
         self.log_dict(tensorboard_logs, logger=True)
 
-    def validation_epoch_end(self, outputs):
-        tensorboard_logs = self._build_tensorboard_logs(outputs, step_type="val")
+    def on_validation_epoch_end(self):
+        tensorboard_logs = self._build_tensorboard_logs(step_type="val")
         self.log_dict(tensorboard_logs, logger=True)
@@ -24,6 +24,10 @@ import torchmetrics
 import torch
 import torch.nn as nn
 from hydra.utils import instantiate
+from pytorch_segmentation_models_trainer.dataset_loader.dataset import (
+    decode_images_on_device,
+    normalize_on_device,
+)
 
 from torch.utils.data import DataLoader
 
@@ -63,6 +67,11 @@ class Model(pl.LightningModule):
             if "gpu_augmentation_list" not in self.cfg.val_dataset
             else self.get_gpu_augmentations(self.cfg.val_dataset.gpu_augmentation_list)
         )
+        self.device_normalization_params = (
+            dict(cfg.pl_model.device_normalization)
+            if "pl_model" in cfg and "device_normalization" in cfg.pl_model
+            else {}
+        )
 
     def get_model(self):
         model = instantiate(self.cfg.model, _recursive_=False)
@@ -141,21 +150,39 @@ class Model(pl.LightningModule):
             scheduler_list.append(dict_item)
         return [optimizer], scheduler_list
 
+    def on_before_batch_transfer(self, batch, dataloader_idx):
+        if isinstance(batch, dict) and isinstance(batch.get("image"), list):
+            # encoded images of gpu_decode datasets
+            batch["image"] = normalize_on_device(
+                decode_images_on_device(batch["image"], self.device),
+                **self.device_normalization_params,
+            )
+        return batch
+
+    def get_collate_fn(self, ds):
+        return ds.collate_fn if getattr(ds, "gpu_decode", False) else None
+
     def train_dataloader(self):
         return DataLoader(
             self.train_ds,
             batch_size=self.cfg.hyperparameters.batch_size,
             shuffle=self.cfg.train_dataset.data_loader.shuffle,
             num_workers=self.cfg.train_dataset.data_loader.num_workers,
+            persistent_workers=self.cfg.train_dataset.data_loader.persistent_workers
+            if "persistent_workers" in self.cfg.train_dataset.data_loader
+            else self.cfg.train_dataset.data_loader.num_workers > 0,
             pin_memory=self.cfg.train_dataset.data_loader.pin_memory
             if "pin_memory" in self.cfg.train_dataset.data_loader
             else True,
             drop_last=self.cfg.train_dataset.data_loader.drop_last
             if "drop_last" in self.cfg.train_dataset.data_loader
             else True,
+            # prefetch_factor counts batches per worker, so the default must not
+            # grow with the batch size.
             prefetch_factor=self.cfg.train_dataset.data_loader.prefetch_factor
             if "prefetch_factor" in self.cfg.train_dataset.data_loader
-            else 4 * self.hyperparameters.batch_size,
+            else 2,
+            collate_fn=self.get_collate_fn(self.train_ds),
         )
 
     def val_dataloader(self):
@@ -166,6 +193,9 @@ class Model(pl.LightningModule):
             if "shuffle" in self.cfg.val_dataset.data_loader
             else False,
             num_workers=self.cfg.val_dataset.data_loader.num_workers,
+            persistent_workers=self.cfg.val_dataset.data_loader.persistent_workers
+            if "persistent_workers" in self.cfg.val_dataset.data_loader
+            else self.cfg.val_dataset.data_loader.num_workers > 0,
             pin_memory=self.cfg.val_dataset.data_loader.pin_memory
             if "pin_memory" in self.cfg.val_dataset.data_loader
             else True,
@@ -174,7 +204,8 @@ class Model(pl.LightningModule):
             else True,
             prefetch_factor=self.cfg.val_dataset.data_loader.prefetch_factor
             if "prefetch_factor" in self.cfg.val_dataset.data_loader
-            else 4 * self.hyperparameters.batch_size,
+            else 2,
+            collate_fn=self.get_collate_fn(self.val_ds),
         )
 
     def training_step(self, batch, batch_idx):
@@ -101,8 +101,11 @@ class TensorPolyOptimizer:
         return loss.item(), losses_dict
 
     def optimize(self):
-        for iter_num in range(self.config.steps):
-            loss, losses_dict = self.step(iter_num)
+        # the vertex positions are optimized by gradient descent, even when the
+        # polygonizer is called from a no_grad context.
+        with torch.enable_grad():
+            for iter_num in range(self.config.steps):
+                loss, losses_dict = self.step(iter_num)
         return self.tensorpoly
 
 
@@ -264,6 +267,9 @@ class TensorSkeletonOptimizer:
         return loss.item(), losses_dict
 
     def optimize(self) -> TensorSkeleton:
-        for iter_num in range(self.config.loss_params.coefs.step_thresholds[-1]):
-            loss, losses_dict = self.step(iter_num)
+        # the skeleton positions are optimized by gradient descent, even when the
+        # polygonizer is called from a no_grad context.
+        with torch.enable_grad():
+            for iter_num in range(self.config.loss_params.coefs.step_thresholds[-1]):
+                loss, losses_dict = self.step(iter_num)
         return self.tensorskeleton
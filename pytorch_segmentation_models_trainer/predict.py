@@ -20,10 +20,12 @@
 """
 import concurrent.futures
 import logging
+import multiprocessing
+import os
 from pytorch_segmentation_models_trainer.tools.parallel_processing.process_executor import (
     Executor,
 )
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import hydra
 import numpy as np
@@ -34,6 +36,9 @@ from omegaconf import DictConfig
 from omegaconf.omegaconf import OmegaConf
 from tqdm import tqdm
 
+from pytorch_segmentation_models_trainer.tools.data_handlers.data_writer import (
+    QueuedDataWriter,
+)
 from pytorch_segmentation_models_trainer.tools.inference.inference_processors import (
     AbstractInferenceProcessor,
 )
@@ -44,6 +49,8 @@ from pytorch_segmentation_models_trainer.utils.os_utils import import_module_fro
 
 logger = logging.getLogger(__name__)
 
+MAX_PENDING_POLYGONIZATIONS = 2
+
 
 def instantiate_model_from_checkpoint(cfg: DictConfig) -> torch.nn.Module:
     pl_model = import_module_from_cfg(cfg.pl_model).load_from_checkpoint(
@@ -52,6 +59,8 @@ def instantiate_model_from_checkpoint(cfg: DictConfig) -> torch.nn.Module:
     model = pl_model.model
     model.to(cfg.device)
     model.eval()
+    if hasattr(model, "fuse_conv_bn"):
+        model.fuse_conv_bn()
     return model
 
 
@@ -76,6 +85,18 @@ def instantiate_inference_processor(cfg: DictConfig) -> AbstractInferenceProcess
     return import_module_from_cfg(cfg.inference_processor)(**obj_params)
 
 
+def instantiate_polygonizer_executor(cfg: DictConfig) -> concurrent.futures.Executor:
+    """Builds the single worker executor of the polygonizations. With
+    polygonizer_executor=process, the polygonization runs in a separate (spawned)
+    process and no longer competes with the inference loop for the GIL.
+    """
+    if cfg.get("polygonizer_executor", "thread") == "process":
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+
 def get_images(cfg: DictConfig) -> List[str]:
     image_reader = instantiate(cfg.inference_image_reader, _recursive_=False)
     return image_reader.get_images()
@@ -87,15 +108,97 @@ def predict(cfg: DictConfig):
         "Starting the prediction of a model with the following configuration: \n%s",
         OmegaConf.to_yaml(cfg),
     )
-    inference_processor = instantiate_inference_processor(cfg)
-    images = get_images(cfg)
-    compute_func = lambda image: inference_processor.process(
-        image,
-        threshold=cfg.inference_threshold,
-        save_inference_output=cfg.save_inference if "save_inference" in cfg else True,
-    )
-    for image in tqdm(images):
-        compute_func(image)
+    num_gpus = cfg.get("num_gpus", 1)
+    if num_gpus > 1:
+        images = get_images(cfg)
+        # resolved here, since hydra interpolations are not available in the
+        # spawned processes
+        resolved_cfg = OmegaConf.create(OmegaConf.to_container(cfg, resolve=True))
+        torch.multiprocessing.spawn(
+            predict_on_gpu, args=(resolved_cfg, images, num_gpus), nprocs=num_gpus
+        )
+        return
+    # the input images are listed while the checkpoint is being loaded
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        images_future = executor.submit(get_images, cfg)
+        inference_processor = instantiate_inference_processor(cfg)
+        images = images_future.result()
+    predict_images(cfg, images, inference_processor=inference_processor)
+
+
+def predict_on_gpu(rank: int, cfg: DictConfig, images: List[str], num_gpus: int):
+    """Runs the prediction of every num_gpus-th image, starting from rank, on
+    cuda:rank. Inference needs no synchronization between the gpus, so each process
+    runs an independent model instead of wrapping it in DistributedDataParallel.
+    Polygon outputs get a rank suffix, so that the processes never write to the
+    same vector file.
+    """
+    cfg.device = f"cuda:{rank}"
+    torch.cuda.set_device(rank)
+    data_writer_cfg = OmegaConf.select(cfg, "polygonizer.data_writer")
+    if data_writer_cfg is not None and "output_file_path" in data_writer_cfg:
+        root, ext = os.path.splitext(data_writer_cfg.output_file_path)
+        data_writer_cfg.output_file_path = f"{root}_{rank}{ext}"
+    predict_images(cfg, images[rank::num_gpus])
+
+
+def predict_images(
+    cfg: DictConfig,
+    images: List[str],
+    inference_processor: Optional[AbstractInferenceProcessor] = None,
+):
+    if inference_processor is None:
+        inference_processor = instantiate_inference_processor(cfg)
+    queued_data_writer = get_queued_data_writer(inference_processor)
+    try:
+        run_predictions(cfg, inference_processor, images)
+    finally:
+        if queued_data_writer is not None:
+            queued_data_writer.close()
+
+
+def get_queued_data_writer(
+    inference_processor: AbstractInferenceProcessor,
+) -> Optional[QueuedDataWriter]:
+    """Moves the polygon writes to their own thread, so that the polygonization of
+    the next image does not wait for the disk. With a process executor the
+    polygons are sent back and written from this process as well, so that
+    writers keeping state between writes are never copied to the worker.
+    """
+    polygonizer = inference_processor.polygonizer
+    if polygonizer is None or polygonizer.data_writer is None:
+        return None
+    polygonizer.data_writer = QueuedDataWriter(data_writer=polygonizer.data_writer)
+    return polygonizer.data_writer
+
+
+def run_predictions(
+    cfg: DictConfig, inference_processor: AbstractInferenceProcessor, images: List[str]
+):
+    # A single long lived worker polygonizes image N while the model runs on
+    # image N+1. One worker keeps the data writer calls ordered and serialized.
+    with instantiate_polygonizer_executor(cfg) as pool:
+        compute_func = lambda image: inference_processor.process(
+            image,
+            threshold=cfg.inference_threshold,
+            save_inference_output=cfg.save_inference
+            if "save_inference" in cfg
+            else True,
+            polygonizer_executor=pool,
+        )
+        pending = set()
+        for image in tqdm(images):
+            output_dict = compute_func(image)
+            if "polygonizer_future" in output_dict:
+                pending.add(output_dict["polygonizer_future"])
+            if len(pending) >= MAX_PENDING_POLYGONIZATIONS:
+                done, pending = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    future.result()
+        for future in concurrent.futures.as_completed(pending):
+            future.result()
 
 
 if __name__ == "__main__":
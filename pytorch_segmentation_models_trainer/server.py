@@ -20,6 +20,7 @@
 """
 
 import io
+import json
 
 from fastapi.params import Depends
 from pytorch_segmentation_models_trainer.tools.polygonization.polygonizer import (
@@ -62,6 +63,13 @@ def get_inference_processor():
     return inference_processor
 
 
+@lru_cache()
+def get_polygonizer(polygonizer_json: str) -> TemplatePolygonizerProcessor:
+    polygonizer = instantiate(json.loads(polygonizer_json))
+    polygonizer.data_writer = None
+    return polygonizer
+
+
 app = FastAPI(
     title="pytorch-smt polygon inference service",
     description="""TODO.""",
@@ -75,9 +83,11 @@ async def get_polygons_from_image_path(
     inference_processor: Settings = Depends(get_inference_processor),
     polygonizer: Optional[dict] = None,
 ):
-    polygonizer = instantiate(polygonizer) if polygonizer is not None else None
-    if polygonizer is not None:
-        polygonizer.data_writer = None
+    polygonizer = (
+        get_polygonizer(json.dumps(polygonizer, sort_keys=True))
+        if polygonizer is not None
+        else None
+    )
     output_dict = inference_processor.process(
         file_path, save_inference_raster=False, polygonizer=polygonizer
     )
@@ -18,22 +18,69 @@
  *                                                                         *
  ****
 """
-from copy import deepcopy
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import io
 import json
 import pathlib
 from typing import List, Union
 import numpy as np
 import os
 import shapely
+import shapely.wkb
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from geopandas import GeoDataFrame, GeoSeries
 from omegaconf import MISSING
+from psycopg2 import sql
 import rasterio
 from rasterio.plot import reshape_as_raster
 from sqlalchemy.engine import create_engine
 from shapely.geometry.base import BaseGeometry, BaseMultipartGeometry
 
+try:
+    import pyogrio
+except ImportError:  # optional, geopandas writes through fiona otherwise
+    pyogrio = None
+
+
+def build_geodataframe(
+    input_data: List[Union[BaseGeometry, BaseMultipartGeometry]], crs
+) -> GeoDataFrame:
+    """Builds a geometry only GeoDataFrame straight from the geometries, without
+    the feature dict round trip of GeoDataFrame.from_features.
+    """
+    return GeoDataFrame(geometry=GeoSeries(input_data, crs=crs))
+
+
+def write_geodataframe(
+    gdf: GeoDataFrame, output_file_path: str, driver: str, mode: str
+):
+    """Writes gdf to a vector file. When pyogrio is installed, the whole dataframe
+    is handed to GDAL in a single call instead of being written feature by feature
+    through fiona.
+    """
+    append = mode == "a" and os.path.isfile(output_file_path)
+    if pyogrio is not None:
+        pyogrio.write_dataframe(gdf, output_file_path, driver=driver, append=append)
+    elif append or mode != "a":
+        gdf.to_file(output_file_path, driver=driver, mode=mode)
+    else:
+        gdf.to_file(output_file_path, driver=driver)
+
+
+@functools.lru_cache(maxsize=16)
+def get_engine(user: str, password: str, host: str, port: int, database: str):
+    """Returns a pooled engine for the database, built once per set of connection
+    parameters, so that consecutive writes reuse the same connections. pool_pre_ping
+    replaces connections dropped by the server while the pool was idle.
+    """
+    return create_engine(
+        f"postgresql://{user}:{password}@{host}:{port}/{database}",
+        pool_pre_ping=True,
+    )
+
 
 class AbstractDataWriter(ABC):
     @abstractmethod
@@ -47,10 +94,10 @@ class RasterDataWriter(AbstractDataWriter):
     output_profile: dict = None
 
     def write_data(self, input_data: np.array, profile: dict) -> None:
-        output_profile = (
-            deepcopy(profile)
-            if self.output_profile is None
-            else dict(self.output_profile)
+        # a shallow copy is enough: only top level keys are set below and the crs and
+        # transform values are immutable.
+        output_profile = dict(
+            profile if self.output_profile is None else self.output_profile
         )
         if "transform" not in output_profile:
             output_profile["transform"] = profile["transform"]
@@ -62,13 +109,18 @@ class RasterDataWriter(AbstractDataWriter):
                     np.zeros(input_data.shape[:-1] + (1,)),
                 )
             )
-        output_profile["count"] = (
-            input_data.shape[-1]
-            if output_profile["count"] != input_data.shape[-1]
-            else output_profile["count"]
-        )
+        output_profile["count"] = input_data.shape[-1]
+        if output_profile["driver"] == "GTiff":
+            output_profile.setdefault("tiled", True)
+            output_profile.setdefault("blockxsize", 256)
+            output_profile.setdefault("blockysize", 256)
         with rasterio.open(self.output_file_path, "w", **output_profile) as out:
-            out.write(reshape_as_raster(input_data))
+            # writes block by block, so only one tile of input_data is transposed
+            # to the band-first layout at a time.
+            for _, window in out.block_windows(1):
+                out.write(
+                    reshape_as_raster(input_data[window.toslices()]), window=window
+                )
 
 
 @dataclass
@@ -82,14 +134,10 @@ class VectorFileDataWriter(AbstractDataWriter):
         input_data: List[Union[BaseGeometry, BaseMultipartGeometry]],
         profile: dict,
     ) -> None:
-        geoseries = GeoSeries(input_data, crs=profile["crs"])
-        gdf = GeoDataFrame.from_features(geoseries, crs=profile["crs"])
+        gdf = build_geodataframe(input_data, crs=profile["crs"])
         if len(gdf) == 0:
             return
-        if not os.path.isfile(self.output_file_path) and self.mode == "a":
-            gdf.to_file(self.output_file_path, driver=self.driver)
-        else:
-            gdf.to_file(self.output_file_path, driver=self.driver, mode=self.mode)
+        write_geodataframe(gdf, self.output_file_path, self.driver, self.mode)
 
 
 @dataclass
@@ -107,16 +155,12 @@ class BatchVectorFileDataWriter(VectorFileDataWriter):
         input_data: List[Union[BaseGeometry, BaseMultipartGeometry]],
         profile: dict,
     ) -> None:
-        geoseries = GeoSeries(input_data, crs=profile["crs"])
-        gdf = GeoDataFrame.from_features(geoseries, crs=profile["crs"])
+        gdf = build_geodataframe(input_data, crs=profile["crs"])
         if len(gdf) == 0:
             self.current_index += 1
             return
         current_file_path = self._get_current_file_path()
-        if not os.path.isfile(current_file_path) and self.mode == "a":
-            gdf.to_file(current_file_path, driver=self.driver)
-        else:
-            gdf.to_file(current_file_path, driver=self.driver, mode=self.mode)
+        write_geodataframe(gdf, current_file_path, self.driver, self.mode)
         self.current_index += 1
 
 
@@ -137,15 +181,61 @@ class VectorDatabaseDataWriter(AbstractDataWriter):
         input_data: List[Union[BaseGeometry, BaseMultipartGeometry]],
         profile: dict,
     ) -> None:
-        geoseries = GeoSeries(input_data, crs=profile["crs"])
-        gdf = GeoDataFrame.from_features(geoseries, crs=profile["crs"])
+        gdf = build_geodataframe(input_data, crs=profile["crs"])
         if len(gdf) == 0:
             return
-        gdf.rename_geometry(self.geometry_column, inplace=True)
-        engine = create_engine(
-            f"postgresql://{self.user}:{self.password}@{self.host}:{self.port}/{self.database}"
+        srid = gdf.crs.to_epsg() if gdf.crs is not None else None
+        srid = 0 if srid is None else srid
+        # the geometries are streamed with a single COPY as hex EWKB, instead of
+        # one INSERT per row
+        rows = io.StringIO(
+            "\n".join(
+                "" if geom is None else shapely.wkb.dumps(geom, hex=True, srid=srid)
+                for geom in gdf.geometry
+            )
+        )
+        engine = get_engine(
+            self.user, self.password, self.host, self.port, self.database
+        )
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor() as cursor:
+                self._prepare_table(cursor, srid)
+                cursor.copy_expert(
+                    sql.SQL("COPY {} ({}) FROM STDIN WITH CSV").format(
+                        sql.Identifier(self.table_name),
+                        sql.Identifier(self.geometry_column),
+                    ),
+                    rows,
+                )
+            connection.commit()
+        finally:
+            connection.close()
+
+    def _prepare_table(self, cursor, srid: int) -> None:
+        """Creates the output table, with a gist index on its geometry column, the
+        same way to_postgis does, honoring if_exists.
+        """
+        table = sql.Identifier(self.table_name)
+        geometry_column = sql.Identifier(self.geometry_column)
+        if self.if_exists == "replace":
+            cursor.execute(sql.SQL("DROP TABLE IF EXISTS {}").format(table))
+        elif self.if_exists == "fail":
+            cursor.execute("SELECT to_regclass(%s)", (self.table_name,))
+            if cursor.fetchone()[0] is not None:
+                raise ValueError(f"Table '{self.table_name}' already exists.")
+        cursor.execute(
+            sql.SQL("CREATE TABLE IF NOT EXISTS {} ({} geometry(Geometry, {}))").format(
+                table, geometry_column, sql.Literal(srid)
+            )
+        )
+        cursor.execute(
+            sql.SQL("CREATE INDEX IF NOT EXISTS {} ON {} USING GIST ({})").format(
+                sql.Identifier(f"idx_{self.table_name}_{self.geometry_column}"),
+                table,
+                geometry_column,
+            )
         )
-        gdf.to_postgis(self.table_name, engine, if_exists=self.if_exists)
 
 
 @dataclass
@@ -155,3 +245,39 @@ class ObjectDetectionDataWriter(AbstractDataWriter):
     def write_data(self, input_data: np.array, profile=None) -> None:
         with open(self.output_file_path, "w") as f:
             f.write(json.dumps(input_data))
+
+
+@dataclass
+class QueuedDataWriter(AbstractDataWriter):
+    """Wraps a data writer, running its writes on a single background thread, so
+    that the caller can move on to the next item while the previous one is being
+    written. A single thread keeps the writes ordered. At most max_pending_writes
+    writes are queued; flush must be called to wait for them and to raise their
+    errors.
+    """
+
+    data_writer: AbstractDataWriter = MISSING
+    max_pending_writes: int = 4
+
+    def __post_init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_writes = deque()
+
+    def write_data(self, input_data, *args, **kwargs) -> None:
+        while len(self._pending_writes) >= self.max_pending_writes:
+            self._pending_writes.popleft().result()
+        self._pending_writes.append(
+            self._executor.submit(
+                self.data_writer.write_data, input_data, *args, **kwargs
+            )
+        )
+
+    def flush(self) -> None:
+        while self._pending_writes:
+            self._pending_writes.popleft().result()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
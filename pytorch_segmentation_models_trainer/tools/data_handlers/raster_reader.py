@@ -23,6 +23,7 @@ import json
 import os
 from abc import ABC, abstractmethod
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
 from pathlib import Path
@@ -42,7 +43,10 @@ from pytorch_segmentation_models_trainer.tools.data_handlers.vector_reader impor
     GeomTypeEnum,
     handle_features,
 )
-from pytorch_segmentation_models_trainer.utils.os_utils import create_folder
+from pytorch_segmentation_models_trainer.utils.os_utils import (
+    create_folder,
+    iter_files,
+)
 from pytorch_segmentation_models_trainer.utils.polygon_utils import (
     build_crossfield,
     compute_raster_masks,
@@ -99,9 +103,11 @@ class RasterFile:
             )
             output_dir = create_folder(output_dir)
             output_filename = os.path.join(output_dir, adjusted_filename)
-            input_raster = src.read()
             with rasterio.open(output_filename, "w", **profile) as out:
-                out.write(input_raster)
+                # copied block by block, so only one window of the input raster is
+                # held in memory at a time.
+                for _, window in src.block_windows(1):
+                    out.write(src.read(window=window), window=window)
         return output_filename
 
     def build_mask(
@@ -211,6 +217,7 @@ class RasterFile:
             else ""
         )
         subfolders = subfolders[1::] if subfolders.startswith(os.sep) else subfolders
+        raster_writes = []
         for key, path in output_dir_dict.items():
             if key not in raster_dict:
                 path_dict[key] = None
@@ -229,23 +236,31 @@ class RasterFile:
                 )
                 path_dict[key] = output
                 continue
-            profile["count"] = (
+            mask_profile = dict(profile)
+            mask_profile["count"] = (
                 1 if len(raster_dict[key].shape) == 2 else min(raster_dict[key].shape)
             )
             output = os.path.join(
                 path, subfolders, output_filename + "." + output_extension
             )
-            profile["dtype"] = raster_dict[key].dtype
-            if "photometric" in profile:
-                profile.pop("photometric")
-            with rasterio.open(output, "w", **profile) as out:
-                if len(raster_dict[key].shape) == 2:
-                    out.write(raster_dict[key], 1)
-                else:
-                    out.write(reshape_as_raster(raster_dict[key]))
+            mask_profile["dtype"] = raster_dict[key].dtype
+            mask_profile.pop("photometric", None)
+            raster_writes.append((output, mask_profile, raster_dict[key]))
             path_dict[key] = output
+        # rasterio releases the GIL while GDAL encodes and writes, so the masks of
+        # the same image are written concurrently.
+        with ThreadPoolExecutor(max_workers=max(len(raster_writes), 1)) as pool:
+            list(pool.map(lambda x: self._write_mask(*x), raster_writes))
         return path_dict
 
+    @staticmethod
+    def _write_mask(output: str, profile: dict, mask: np.ndarray) -> None:
+        with rasterio.open(output, "w", **profile) as out:
+            if len(mask.shape) == 2:
+                out.write(mask, 1)
+            else:
+                out.write(reshape_as_raster(mask))
+
     def save_bounding_boxes_to_disk(self, bounding_boxes, output: str):
         with open(output, "w") as out:
             json.dump(bounding_boxes, out)
@@ -417,9 +432,7 @@ class FolderImageReaderProcessor(AbstractRasterPathListGetter):
     image_extension: str = "tif"
 
     def get_images(self) -> List[str]:
-        return [
-            str(p) for p in Path(self.folder_name).glob(f"**/*.{self.image_extension}")
-        ]
+        return list(iter_files(self.folder_name, self.image_extension))
 
 
 @dataclass
@@ -20,20 +20,20 @@
 """
 import abc
 import concurrent.futures
-import functools
 import itertools
 import operator
 import os
+import struct
 from collections import defaultdict
 from dataclasses import MISSING, dataclass, field
 from enum import Enum
 from multiprocessing import Manager
-from pathlib import Path
 from typing import List, Union
 
 import fiona
 import geopandas
 import numpy as np
+import pandas as pd
 import psycopg2
 from affine import Affine
 from bidict import bidict
@@ -42,8 +42,10 @@ from pycocotools.coco import COCO
 from pytorch_segmentation_models_trainer.tools.parallel_processing.process_executor import (
     Executor,
 )
+from pytorch_segmentation_models_trainer.utils.os_utils import iter_files
 from shapely.geometry import (
     GeometryCollection,
+    LinearRing,
     LineString,
     MultiLineString,
     MultiPoint,
@@ -51,9 +53,25 @@ from shapely.geometry import (
     Point,
     Polygon,
     base,
+    box,
 )
 from tqdm import tqdm
 
+try:
+    import pyogrio
+except ImportError:  # optional, geopandas reads through fiona otherwise
+    pyogrio = None
+
+
+def read_vector_file(file_name: str) -> GeoDataFrame:
+    """Reads a vector file into a GeoDataFrame. Uses pyogrio when it is installed,
+    which reads the whole file in a single GDAL call instead of feature by feature
+    through fiona.
+    """
+    if pyogrio is not None:
+        return pyogrio.read_dataframe(file_name)
+    return geopandas.read_file(filename=file_name)
+
 
 class GeomType(Enum):
     POINT, LINE, POLYGON = range(3)
@@ -81,6 +99,24 @@ class GeoDF(abc.ABC):
     def get_geo_df(self):
         return self.gdf
 
+    def _build_spatial_filter(self, build_spatial_index: bool) -> None:
+        """Builds the spatial index of gdf. When it is disabled, caches the (N, 4)
+        bounds of the features instead, so that bbox queries do not recompute them.
+        """
+        self.spatial_index = self.gdf.sindex if build_spatial_index else None
+        self.bounds_array = None if build_spatial_index else self.gdf.bounds.to_numpy()
+
+    def _bbox_mask(
+        self, x_min: float, x_max: float, y_min: float, y_max: float
+    ) -> np.ndarray:
+        bounds = self.bounds_array
+        return (
+            (bounds[:, 0] <= x_max)
+            & (bounds[:, 2] >= x_min)
+            & (bounds[:, 1] <= y_max)
+            & (bounds[:, 3] >= y_min)
+        )
+
     def get_features_from_bbox(
         self,
         x_min: float,
@@ -107,19 +143,13 @@ class GeoDF(abc.ABC):
 
     def _get_features(self, x_min: float, x_max: float, y_min: float, y_max: float):
         if self.spatial_index is None:
-            return self.gdf.cx[x_min:x_max, y_min:y_max]
-        clip_polygon = Polygon(
-            [
-                (x_min, y_min),
-                (x_max, y_min),
-                (x_max, y_max),
-                (x_min, y_max),
-                (x_min, y_min),
-            ]
+            return self.gdf[self._bbox_mask(x_min, x_max, y_min, y_max)]
+        # the tree filters by bounding box and evaluates the exact predicate on the
+        # candidates in the same call, returning positional indexes.
+        matches = self.spatial_index.query(
+            box(x_min, y_min, x_max, y_max), predicate="intersects"
         )
-        candidates = list(self.spatial_index.intersection(clip_polygon.bounds))
-        possible_matches = self.gdf.iloc[candidates]
-        return possible_matches[possible_matches.intersects(clip_polygon)]
+        return self.gdf.iloc[np.sort(matches)]
 
     def clip_features_to_extent(
         self, feats, x_min: float, x_max: float, y_min: float, y_max: float
@@ -146,8 +176,8 @@ class FileGeoDF(GeoDF):
     build_spatial_index: bool = True
 
     def __post_init__(self):
-        self.gdf = geopandas.read_file(filename=self.file_name)
-        self.spatial_index = self.gdf.sindex if self.build_spatial_index else None
+        self.gdf = read_vector_file(self.file_name)
+        self._build_spatial_filter(self.build_spatial_index)
 
 
 @dataclass
@@ -169,10 +199,44 @@ class PostgisGeoDF(GeoDF):
             user=self.user,
             password=self.password,
         )
-        self.gdf = geopandas.read_postgis(
-            sql=self.sql, con=self.con, geom_col=self.geometry_column
-        )
-        self.spatial_index = self.gdf.sindex if self.build_spatial_index else None
+        self.gdf = read_postgis_dataframe(self.sql, self.con, self.geometry_column)
+        self._build_spatial_filter(self.build_spatial_index)
+
+
+def get_ewkb_srid(ewkb: bytes) -> Union[int, None]:
+    """Reads the srid from the header of an EWKB geometry, if it has one."""
+    byte_order = "<" if ewkb[0] == 1 else ">"
+    (geometry_type,) = struct.unpack_from(f"{byte_order}I", ewkb, 1)
+    if not geometry_type & 0x20000000:
+        return None
+    return struct.unpack_from(f"{byte_order}I", ewkb, 5)[0]
+
+
+def read_postgis_dataframe(sql: str, con, geom_col: str = "geom") -> GeoDataFrame:
+    """Reads the result of sql into a GeoDataFrame.
+
+    geopandas.read_postgis parses the hex EWKB of each row with a python call per
+    geometry. Here the whole column is unhexed and handed to GeoSeries.from_wkb at
+    once, which is vectorized when geopandas runs on pygeos. The crs is taken from
+    the srid of the first geometry, as read_postgis does.
+
+    Args:
+        sql (str): query to be run.
+        con: psycopg2 connection.
+        geom_col (str, optional): geometry column. Defaults to "geom".
+
+    Returns:
+        GeoDataFrame: query results.
+    """
+    df = pd.read_sql(sql, con)
+    wkb_values = [
+        bytes.fromhex(value) if value is not None else None for value in df[geom_col]
+    ]
+    srid = next(
+        (get_ewkb_srid(value) for value in wkb_values if value is not None), None
+    )
+    df[geom_col] = GeoSeries.from_wkb(wkb_values, index=df.index)
+    return GeoDataFrame(df, geometry=geom_col, crs=f"EPSG:{srid}" if srid else None)
 
 
 @dataclass
@@ -181,14 +245,35 @@ class BatchFileGeoDF:
     file_extension: str = "geojson"
 
     def __post_init__(self):
-        self.vector_dict = {
-            str(p).replace("." + str(p).split(".")[-1], ""): FileGeoDF(str(p))
-            for p in Path(self.root_dir).glob(f"**/*.{self.file_extension}")
+        # files are only read when their key is first requested (or on preload)
+        self.file_dict = {
+            os.path.splitext(p)[0]: p
+            for p in iter_files(self.root_dir, self.file_extension)
         }
+        self.vector_dict = dict()
         self.spatial_index = None
 
+    def preload(self, max_workers: int = None) -> None:
+        """Reads every file that was not read yet using a thread pool. GDAL releases
+        the GIL while reading, so the files are read concurrently.
+
+        Args:
+            max_workers (int, optional): number of threads. Defaults to None, which
+                uses the ThreadPoolExecutor default.
+        """
+        keys = [key for key in self.file_dict if key not in self.vector_dict]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for key, geo_df in zip(
+                keys, pool.map(lambda x: FileGeoDF(self.file_dict[x]), keys)
+            ):
+                self.vector_dict[key] = geo_df
+
     def get_geodf_item(self, key: str) -> GeoDataFrame:
-        return self.vector_dict[key].get_geo_df() if key in self.vector_dict else None
+        if key not in self.file_dict:
+            return None
+        if key not in self.vector_dict:
+            self.vector_dict[key] = FileGeoDF(self.file_dict[key])
+        return self.vector_dict[key].get_geo_df()
 
 
 @dataclass
@@ -286,18 +371,91 @@ class COCOGeoDF:
 def handle_features(
     input_features, output_type: GeomType = None, return_list: bool = False
 ) -> list:
+    """Converts every feature of input_features to output_type.
+
+    The geometry types are computed for the whole series at once, so features that
+    are already of output_type are kept as they are and polygon boundaries are built
+    by a single GeoSeries.boundary call (vectorized by geopandas when pygeos is
+    installed). Only geometry collections and polygon to point conversions go
+    through handle_geometry, one feature at a time.
+
+    Args:
+        input_features (GeoSeries): features to be handled.
+        output_type (GeomType, optional): output geometry type. Defaults to None,
+            which returns input_features untouched.
+        return_list (bool, optional): returns a list of geometries instead of a
+            GeoDataFrame. Defaults to False.
+
+    Returns:
+        Union[GeoDataFrame, list]: handled features.
+    """
     if output_type is None:
         return input_features
-    handler = lambda x: handle_geometry(x, output_type)
+    input_features = GeoSeries(input_features)
+    geometries = list(input_features)
+    geom_types = input_features.geom_type.to_numpy()
+    polygonal = np.isin(geom_types, ["Polygon", "MultiPolygon"])
+    if output_type == GeomType.LINE and polygonal.any():
+        boundaries = input_features[polygonal].boundary
+        for idx, boundary in zip(np.flatnonzero(polygonal), boundaries):
+            geometries[idx] = boundary
+    lineal = np.isin(geom_types, ["LineString", "LinearRing", "MultiLineString"])
+    needs_handler = geom_types == "GeometryCollection"
+    if output_type == GeomType.POINT:
+        needs_handler |= polygonal | lineal
+    elif output_type == GeomType.POLYGON:
+        needs_handler |= lineal
+    for idx in np.flatnonzero(needs_handler):
+        geometries[idx] = handle_geometry(geometries[idx], output_type)
     return (
-        GeoDataFrame(
-            {"geometry": list(map(handler, input_features))}, crs=input_features.crs
-        )
+        GeoDataFrame({"geometry": geometries}, crs=input_features.crs)
         if not return_list
-        else list(map(handler, input_features))
+        else geometries
     )
 
 
+def _polygon_to_points(geom):
+    """Returns the distinct boundary vertexes of a Polygon or MultiPolygon as a
+    MultiPoint. The coordinates of all rings are gathered in a single array and
+    deduplicated by np.unique.
+    """
+    boundary = geom.boundary
+    lines = boundary.geoms if hasattr(boundary, "geoms") else [boundary]
+    coords = [np.asarray(line.coords) for line in lines if not line.is_empty]
+    if len(coords) == 0:
+        return MultiPoint()
+    return MultiPoint(np.unique(np.concatenate(coords), axis=0))
+
+
+def _keep_geometry(geom):
+    return geom
+
+
+def _build_geometry_handlers():
+    """Builds the (geometry class, output type) -> handler table used by
+    handle_geometry. Dispatching on the exact class is a single dict lookup, instead
+    of a chain of isinstance checks per geometry.
+    """
+    handlers = {
+        (geom_class, output_type): _keep_geometry
+        for geom_class in (Point, MultiPoint)
+        for output_type in GeomType
+    }
+    for geom_class in (Polygon, MultiPolygon):
+        handlers[(geom_class, GeomType.POLYGON)] = _keep_geometry
+        # return type is LineString or MultiLinestring, depending whether the polygon
+        # has holes, or if it is a MultiPolygon
+        handlers[(geom_class, GeomType.LINE)] = operator.attrgetter("boundary")
+        handlers[(geom_class, GeomType.POINT)] = _polygon_to_points
+    for geom_class in (LineString, LinearRing, MultiLineString):
+        handlers[(geom_class, GeomType.LINE)] = _keep_geometry
+        handlers[(geom_class, GeomType.POINT)] = lambda x: MultiPoint(x.coords)
+    return handlers
+
+
+GEOMETRY_HANDLERS = _build_geometry_handlers()
+
+
 def handle_geometry(geom, output_type):
     """Handles geometry
 
@@ -308,44 +466,12 @@ def handle_geometry(geom, output_type):
     Returns:
         BaseGeometry: [description]
     """
-    if (
-        isinstance(geom, (Point, MultiPoint))
-        or (
-            isinstance(geom, (Polygon, MultiPolygon))
-            and output_type == GeomType.POLYGON
-        )
-        or (
-            isinstance(geom, (LineString, MultiLineString))
-            and output_type == GeomType.LINE
-        )
-    ):
-        return geom
-    elif isinstance(geom, GeometryCollection):
+    handler = GEOMETRY_HANDLERS.get((type(geom), output_type))
+    if handler is not None:
+        return handler(geom)
+    if isinstance(geom, GeometryCollection):
         return GeometryCollection([handle_geometry(i, output_type) for i in geom])
-    elif isinstance(geom, (Polygon, MultiPolygon)) and output_type == GeomType.LINE:
-        # return type is LineString or MultiLinestring, depending whether the polygon
-        # has holes, or if it is a MultiPolygon
-        return geom.boundary
-    elif isinstance(geom, (Polygon, MultiPolygon)) and output_type == GeomType.POINT:
-        # return type is MultiPoint
-        return MultiPoint(
-            list(
-                set(
-                    geom.boundary.coords
-                    if isinstance(geom, Polygon)
-                    else functools.reduce(
-                        operator.iconcat, [i.coords for i in geom.boundary]
-                    )
-                )
-            )
-        )
-    elif (
-        isinstance(geom, (LineString, MultiLineString))
-        and output_type == GeomType.POINT
-    ):
-        return MultiPoint(geom.coords)
-    else:
-        raise Exception("Invalid geometry handling")
+    raise Exception("Invalid geometry handling")
 
 
 def save_to_file(polygons, base_filepath, name, driver=None, crs=None):
@@ -23,6 +23,7 @@ import shapely
 import numpy as np
 from shapely.geometry import Polygon
 from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep
 from shapely.strtree import STRtree
 
 from pytorch_segmentation_models_trainer.custom_metrics.metrics import (
@@ -58,7 +59,11 @@ def match_polygon_lists_by_criteria(
     for target in target_list:
         if target.is_empty:
             raise ValueError("Target geometry is empty.")
-        candidates = [i for i in reference_tree.query(target) if i.intersects(target)]
+        # the target is prepared once and tested against all of its tree candidates
+        prepared_target = prep(target)
+        candidates = list(
+            filter(prepared_target.intersects, reference_tree.query(target))
+        )
         if len(candidates) == 0:
             continue
         metric_values_list = [criteria_func(target, i) for i in candidates]
@@ -19,13 +19,17 @@
  ****
 """
 from collections import defaultdict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+import copy
 from concurrent.futures.thread import ThreadPoolExecutor
 import os
 import math
 from abc import ABC, abstractmethod
-from pathlib import Path
 
 from PIL import Image
+from pytorch_segmentation_models_trainer.dataset_loader.prefetcher import (
+    DataPrefetcher,
+)
 from pytorch_segmentation_models_trainer.tools.detection.bbox_handler import (
     BboxTileMerger,
 )
@@ -65,6 +69,9 @@ class AbstractInferenceProcessor(ABC):
         step_shape=None,
         mask_bands=1,
         config=None,
+        inference_amp=False,
+        channels_last=False,
+        jit_trace=False,
     ):
         self.model = model
         self.device = device
@@ -79,6 +86,41 @@ class AbstractInferenceProcessor(ABC):
         self.step_shape = (224, 224) if step_shape is None else step_shape
         self.mask_bands = mask_bands
         self.normalize = A.Normalize()
+        # float16 autocast of the tile forward passes, only used on cuda devices
+        self.inference_amp = inference_amp and torch.device(device).type == "cuda"
+        self.memory_format = (
+            torch.channels_last if channels_last else torch.contiguous_format
+        )
+        if channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        # frozen TorchScript versions of the model, traced once per input shape
+        self.jit_trace = jit_trace
+        self._traced_models = dict()
+
+    def get_forward_model(self, inputs: torch.Tensor):
+        """Returns the model used on inputs. When jit_trace is enabled, the model is
+        traced and frozen (which folds batch norms into the convolutions) the first
+        time each input shape is seen, since the traced graph is only valid for the
+        shapes it was traced with.
+        """
+        if not self.jit_trace:
+            return self.model
+        key = (tuple(inputs.shape), inputs.dtype)
+        if key not in self._traced_models:
+            with torch.inference_mode(False), torch.no_grad():
+                self.model.eval()
+                traced_model = torch.jit.trace(self.model, inputs.clone(), strict=False)
+                self._traced_models[key] = torch.jit.freeze(traced_model)
+        return self._traced_models[key]
+
+    def iterate_tile_batches(self, tiles: List[np.array], tiler: ImageSlicer):
+        """Yields batches of tiles already on device, with their crop coordinates
+        on the cpu. The copy of the next tile batch runs on a side stream while the
+        model processes the current one.
+        """
+        tiles_loader = DataLoader(tiles, batch_size=self.batch_size, pin_memory=True)
+        coords_loader = DataLoader(tiler.crops, batch_size=self.batch_size)
+        return zip(DataPrefetcher(tiles_loader, self.device), coords_loader)
 
     def get_profile(self, image_path, restore_geo_transform=True):
         with rasterio.open(image_path, "r") as raster_ds:
@@ -94,6 +136,7 @@ class AbstractInferenceProcessor(ABC):
         save_inference_output: bool = True,
         polygonizer: Optional[TemplatePolygonizerProcessor] = None,
         restore_geo_transform: bool = True,
+        polygonizer_executor: Optional[Executor] = None,
         **kwargs: Optional[Any],
     ) -> Dict[str, Any]:
         image = cv2.imread(image_path)
@@ -103,7 +146,14 @@ class AbstractInferenceProcessor(ABC):
         inference = self.make_inference(image, **kwargs)
         output_dict = defaultdict(list)
         polygonizer = self.polygonizer if polygonizer is None else polygonizer
-        if polygonizer is not None:
+        if polygonizer is not None and polygonizer_executor is not None:
+            # the polygonization runs on the executor while the caller moves on
+            # to the next inference. Only the polygonizer and its input are
+            # submitted, so that process pools do not need to pickle the model.
+            output_dict["polygonizer_future"] = self.submit_polygonizer(
+                polygonizer_executor, polygonizer, inference, profile
+            )
+        elif polygonizer is not None:
             output_dict["polygons"] += self.process_polygonizer(
                 polygonizer, inference, profile
             )
@@ -113,18 +163,61 @@ class AbstractInferenceProcessor(ABC):
             output_dict["inference_output"].append(inference)
         return output_dict
 
-    def process_polygonizer(self, polygonizer, inference, profile):
-        return polygonizer.process(
-            {
-                key: image_to_tensor(value).unsqueeze(0)
-                for key, value in inference.items()
-            },
-            profile,
+    def submit_polygonizer(
+        self,
+        executor: Executor,
+        polygonizer: TemplatePolygonizerProcessor,
+        inference: Dict[str, np.ndarray],
+        profile: dict,
+    ) -> Future:
+        """Submits the polygonization of inference to executor. Process pools get a
+        copy of the polygonizer without its data writer, and the returned polygons
+        are written in this process when the polygonization finishes. Otherwise
+        the writer would be pickled on every submit, and the state it keeps
+        between writes (e.g. current_index of BatchVectorFileDataWriter) would only
+        be updated in the throwaway copy of the worker.
+
+        Returns:
+            Future: future of the projected polygons.
+        """
+        polygonizer_input = self.get_polygonizer_input(inference)
+        data_writer = polygonizer.data_writer
+        if not isinstance(executor, ProcessPoolExecutor) or data_writer is None:
+            return executor.submit(polygonizer.process, polygonizer_input, profile)
+        worker_polygonizer = copy.copy(polygonizer)
+        worker_polygonizer.data_writer = None
+        polygonizer_future = executor.submit(
+            worker_polygonizer.process, polygonizer_input, profile
         )
+        output_future = Future()
+        # the caller may update profile (e.g. save_inference) before the write runs
+        writer_profile = dict(profile)
+
+        def write_polygons(future: Future) -> None:
+            # the callbacks run one at a time, and a single worker finishes the
+            # polygonizations in submission order, so the writes keep that order.
+            try:
+                polygons = future.result()
+                data_writer.write_data(polygons, writer_profile)
+            except BaseException as error:
+                output_future.set_exception(error)
+            else:
+                output_future.set_result(polygons)
+
+        polygonizer_future.add_done_callback(write_polygons)
+        return output_future
+
+    def process_polygonizer(self, polygonizer, inference, profile):
+        return polygonizer.process(self.get_polygonizer_input(inference), profile)
+
+    def get_polygonizer_input(self, inference):
+        return {
+            key: image_to_tensor(value).unsqueeze(0) for key, value in inference.items()
+        }
 
     def save_inference(self, image_path, threshold, profile, inference, output_dict):
         inference["seg"] = (inference["seg"] > threshold).astype(np.uint8)
-        profile["input_name"] = Path(image_path).stem
+        profile["input_name"] = os.path.splitext(os.path.basename(image_path))[0]
         if self.export_strategy is not None:
             output_dict["inference"].append(
                 self.export_strategy.save_inference(inference, profile)
@@ -157,6 +250,9 @@ class SingleImageInfereceProcessor(AbstractInferenceProcessor):
         step_shape=None,
         mask_bands=1,
         config=None,
+        inference_amp=False,
+        channels_last=False,
+        jit_trace=False,
     ):
         super(SingleImageInfereceProcessor, self).__init__(
             model,
@@ -168,6 +264,9 @@ class SingleImageInfereceProcessor(AbstractInferenceProcessor):
             step_shape=step_shape,
             mask_bands=mask_bands,
             config=config,
+            inference_amp=inference_amp,
+            channels_last=channels_last,
+            jit_trace=jit_trace,
         )
 
     def make_inference(
@@ -217,14 +316,14 @@ class SingleImageInfereceProcessor(AbstractInferenceProcessor):
         tiler: ImageSlicer,
         merger_dict: Dict[str, TileMerger],
     ):
-        with torch.no_grad():
-            for tiles_batch, coords_batch in DataLoader(
-                list(zip(tiles, tiler.crops)),
-                batch_size=self.batch_size,
-                pin_memory=True,
-            ):
-                tiles_batch = tiles_batch.float().to(self.device)
-                pred_batch = self.model(tiles_batch)
+        with torch.inference_mode(), torch.autocast(
+            device_type="cuda", dtype=torch.float16, enabled=self.inference_amp
+        ):
+            for tiles_batch, coords_batch in self.iterate_tile_batches(tiles, tiler):
+                tiles_batch = tiles_batch.float().contiguous(
+                    memory_format=self.memory_format
+                )
+                pred_batch = self.get_forward_model(tiles_batch)(tiles_batch)
                 self.integrate_batch(pred_batch, coords_batch, merger_dict)
 
     def integrate_batch(self, pred_batch, coords_batch, merger_dict):
@@ -247,6 +346,9 @@ class SingleImageFromFrameFieldProcessor(SingleImageInfereceProcessor):
         step_shape=None,
         mask_bands=1,
         config=None,
+        inference_amp=False,
+        channels_last=False,
+        jit_trace=False,
     ):
         super(SingleImageFromFrameFieldProcessor, self).__init__(
             model,
@@ -258,6 +360,9 @@ class SingleImageFromFrameFieldProcessor(SingleImageInfereceProcessor):
             step_shape=step_shape,
             mask_bands=mask_bands,
             config=config,
+            inference_amp=inference_amp,
+            channels_last=channels_last,
+            jit_trace=jit_trace,
         )
 
     def get_merger_dict(self, tiler: ImageSlicer):
@@ -360,13 +465,10 @@ class ObjectDetectionInferenceProcessor(AbstractInferenceProcessor):
         self, tiles: List[np.array], tiler: ImageSlicer, merger: BboxTileMerger
     ):
         with torch.no_grad():
-            for tiles_batch, crop_coords_batch in DataLoader(
-                list(zip(tiles, tiler.crops)),
-                batch_size=self.batch_size,
-                pin_memory=True,
+            for tiles_batch, crop_coords_batch in self.iterate_tile_batches(
+                tiles, tiler
             ):
-                tiles_batch = tiles_batch.float().to(self.device)
-                pred_batch = self.model(tiles_batch)
+                pred_batch = self.model(tiles_batch.float())
                 merger.integrate_boxes(pred_batch, crop_coords_batch)
 
     def save_inference(self, image_path, threshold, profile, inference, output_dict):
@@ -433,7 +535,8 @@ class PolygonRNNInferenceProcessor(AbstractInferenceProcessor):
                 image_tensor_list_dict, batch_size=self.batch_size, pin_memory=True
             ):
                 output_batch_polygons = self.model.test(
-                    batch["croped_images"].to(self.device), self.sequence_length
+                    batch["croped_images"].to(self.device, non_blocking=True),
+                    self.sequence_length,
                 )
                 batch.pop("croped_images")
                 batch["output_batch_polygons"] = output_batch_polygons
@@ -487,5 +590,5 @@ class PolygonRNNInferenceProcessor(AbstractInferenceProcessor):
         scale_w = self.image_size / object_w
         return scale_h, scale_w
 
-    def process_polygonizer(self, polygonizer, inference, profile):
-        return self.polygonizer.process(inference, profile)
+    def get_polygonizer_input(self, inference):
+        return inference
@@ -22,6 +22,7 @@ from abc import ABC, abstractmethod
 from collections import OrderedDict
 import csv
 import dataclasses
+import itertools
 import os
 import pandas as pd
 from dataclasses import dataclass, field
@@ -41,7 +42,10 @@ from pytorch_segmentation_models_trainer.tools.data_handlers.vector_reader impor
     GeomType,
     GeomTypeEnum,
 )
-from pytorch_segmentation_models_trainer.utils.os_utils import make_path_relative
+from pytorch_segmentation_models_trainer.utils.os_utils import (
+    iter_files,
+    make_path_relative,
+)
 from rasterio.plot import reshape_as_image
 from hydra.utils import instantiate
 
@@ -72,19 +76,12 @@ def build_destination_dirs(input_base_path: str, output_base_path: str):
     ]
 
 
-def build_output_raster_list(input_raster_path: str, cfg: DictConfig) -> List[str]:
-    image_dir_name = os.path.basename(os.path.normpath(cfg.image_root_dir))
-    output_list = [
-        str(
-            os.path.join(
-                getattr(cfg, f"{mask_type}_folder_name"),
-                os.path.dirname(
-                    os.path.normpath(
-                        str(input_raster_path).split(f"{image_dir_name}/")[-1]
-                    )
-                ),
-            )
-        )
+def get_output_folder_names(cfg: DictConfig) -> List[str]:
+    """Returns the output folder names of the outputs enabled on cfg, in the order
+    used by build_output_raster_list.
+    """
+    folder_names = [
+        getattr(cfg, f"{mask_type}_folder_name")
         for mask_type in [
             "polygon_mask",
             "boundary_mask",
@@ -96,33 +93,39 @@ def build_output_raster_list(input_raster_path: str, cfg: DictConfig) -> List[st
         if getattr(cfg, f"build_{mask_type}")
     ]
     if getattr(cfg, "build_bounding_box_list"):
-        output_list.append(
-            str(
-                os.path.join(
-                    getattr(cfg, "bounding_box_list_folder_name"),
-                    os.path.dirname(
-                        os.path.normpath(
-                            str(input_raster_path).split(f"{image_dir_name}/")[-1]
-                        )
-                    ),
-                )
-            )
-        )
+        folder_names.append(getattr(cfg, "bounding_box_list_folder_name"))
     if getattr(cfg, "build_polygon_list"):
-        output_list.append(
-            str(
-                os.path.join(
-                    getattr(cfg, "polygon_list_folder_name"),
-                    os.path.dirname(
-                        os.path.normpath(
-                            str(input_raster_path).split(f"{image_dir_name}/")[-1]
-                        )
-                    ),
-                )
-            )
-        )
-
-    return output_list
+        folder_names.append(getattr(cfg, "polygon_list_folder_name"))
+    return folder_names
+
+
+def build_output_raster_list(
+    input_raster_path: str,
+    cfg: DictConfig,
+    output_folder_names: List[str] = None,
+    image_dir_name: str = None,
+) -> List[str]:
+    """Builds the output folders of input_raster_path. output_folder_names and
+    image_dir_name only depend on cfg, so callers that handle many rasters may
+    compute them once and pass them along.
+    """
+    image_dir_name = (
+        os.path.basename(os.path.normpath(cfg.image_root_dir))
+        if image_dir_name is None
+        else image_dir_name
+    )
+    output_folder_names = (
+        get_output_folder_names(cfg)
+        if output_folder_names is None
+        else output_folder_names
+    )
+    relative_dir = os.path.dirname(
+        os.path.normpath(str(input_raster_path).split(f"{image_dir_name}/")[-1])
+    )
+    return [
+        str(os.path.join(folder_name, relative_dir))
+        for folder_name in output_folder_names
+    ]
 
 
 def build_csv_file_from_concurrent_futures_output(cfg, result_list):
@@ -132,20 +135,32 @@ def build_csv_file_from_concurrent_futures_output(cfg, result_list):
         if "merge_existing" in cfg and cfg.merge_existing
         else f"{cfg.dataset_name}.csv",
     )
-    with open(output_file, "w") as data_file:
+    # a 1 MB buffer coalesces the rows into few write calls
+    with open(output_file, "w", newline="", buffering=1 << 20) as data_file:
         csv_writer = csv.writer(data_file)
-        for i, result in enumerate(result_list):
-            data = dataclasses.asdict(result)
-            if i == 0:
-                # writes header
-                csv_writer.writerow(data.keys())
-            csv_writer.writerow(data.values())
+        result_iter = iter(result_list)
+        first_result = next(result_iter, None)
+        if first_result is not None:
+            # dataclasses.asdict deep copies every field of every row, reading the
+            # attributes directly is enough to write them.
+            field_names = [f.name for f in dataclasses.fields(first_result)]
+            csv_writer.writerow(field_names)
+            csv_writer.writerows(
+                [getattr(result, name) for name in field_names]
+                for result in itertools.chain([first_result], result_iter)
+            )
     if "merge_existing" in cfg and cfg.merge_existing:
         output_file = os.path.join(cfg.output_csv_path, f"{cfg.dataset_name}.csv")
         merge_csv_datasets(
             output_file, os.path.join(cfg.output_csv_path, f"temp.csv"), "image"
         )
         os.remove(os.path.join(cfg.output_csv_path, f"temp.csv"))
+    if "write_parquet" in cfg and cfg.write_parquet and os.path.getsize(output_file):
+        # datasets also load parquet tables (see read_dataset_table), which skips
+        # parsing the csv text on every training run
+        pd.read_csv(output_file).to_parquet(
+            os.path.splitext(output_file)[0] + ".parquet", index=False
+        )
 
     return output_file
 
@@ -205,6 +220,7 @@ class TemplateMaskBuilder(ABC):
     output_csv_path: str = "/data"
     dataset_name: str = "dsg_dataset"
     merge_existing: bool = False
+    write_parquet: bool = False
     dataset_has_relative_path: bool = True
     image_root_dir: str = "images"
     image_extension: str = "tif"
@@ -349,14 +365,18 @@ class TemplateMaskBuilder(ABC):
             if self.image_dir_is_relative_to_root_dir
             else self.image_root_dir
         )
+        output_folder_names = get_output_folder_names(self)
+        image_dir_name = os.path.basename(os.path.normpath(self.image_root_dir))
         return (
             (
                 input_raster_path,
                 self.root_dir,
-                build_output_raster_list(input_raster_path, self),
+                build_output_raster_list(
+                    input_raster_path, self, output_folder_names, image_dir_name
+                ),
             )
-            for input_raster_path in Path(image_base_path).glob(
-                f"**/*.{self.image_extension}"
+            for input_raster_path in map(
+                Path, iter_files(image_base_path, self.image_extension)
             )
         )
 
@@ -366,9 +386,7 @@ class TemplateMaskBuilder(ABC):
             if self.image_dir_is_relative_to_root_dir
             else self.image_root_dir
         )
-        return len(
-            [i for i in Path(image_base_path).glob(f"**/*.{self.image_extension}")]
-        )
+        return sum(1 for _ in iter_files(image_base_path, self.image_extension))
 
     def build_mask_and_ds_entry(
         self, input_raster_path, input_vector_layer, output_dir, filter_area
@@ -66,8 +66,14 @@ class TemplatePolygonizerProcessor(ABC):
             pool (concurrent.futures.ThreadPool, optional): Thread object in case of parallel execution.
                 Defaults to None.
         """
+        # the active contour and skeleton methods optimize the polygons with autograd,
+        # so they can't run in inference mode. The network outputs are detached
+        # instead, which keeps their graph out of the optimization.
         out_contours_batch, out_probs_batch = self.polygonize_method(
-            inference["seg"], inference["crossfield"], self.config, pool=pool
+            inference["seg"].detach(),
+            inference["crossfield"].detach(),
+            self.config,
+            pool=pool,
         )
         return self.post_process(out_contours_batch[0], profile)
 
@@ -202,9 +208,10 @@ class SimplePolygonizerProcessor(TemplatePolygonizerProcessor):
             pool (concurrent.futures.ThreadPool, optional): Thread object in case of
             parallel execution. Defaults to None.
         """
-        out_contours_batch, out_probs_batch = self.polygonize_method(
-            inference["seg"], self.config, pool=pool
-        )
+        with torch.inference_mode():
+            out_contours_batch, out_probs_batch = self.polygonize_method(
+                inference["seg"], self.config, pool=pool
+            )
         return self.post_process(out_contours_batch[0], profile)
 
 
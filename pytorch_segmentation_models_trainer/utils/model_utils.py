@@ -19,9 +19,12 @@
  ****
 """
 
-from typing import List, Optional
+from contextlib import contextmanager
+from typing import Dict, List, Optional
 import torch
 from copy import deepcopy
+from torch.nn.modules.batchnorm import _NormBase
+from torch.nn.modules.dropout import _DropoutNd
 
 
 def replace_activation(model, old_activation, new_activation):
@@ -47,3 +50,33 @@ def set_model_components_trainable(
     for name, param in model.named_parameters():
         if not any(exception in name for exception in exception_list):
             param.requires_grad = trainable
+
+
+def sum_losses(loss_dict: Dict[str, torch.Tensor]) -> torch.Tensor:
+    """
+    Sums the scalar losses of a loss dict with a single reduction, instead of one
+    chained addition (and autograd node) per loss.
+    :param loss_dict: The dict of scalar losses.
+    :return: The total loss.
+    """
+    return torch.stack(list(loss_dict.values())).sum()
+
+
+@contextmanager
+def loss_mode(model: torch.nn.Module):
+    """
+    Puts the model in training mode, so that detection models return their losses,
+    but keeps the normalization and dropout layers in eval mode, so that evaluating
+    the losses does not update the running statistics nor drop activations. The
+    previous mode is restored on exit.
+    :param model: The model whose losses will be evaluated.
+    """
+    was_training = model.training
+    model.train()
+    for module in model.modules():
+        if isinstance(module, (_NormBase, _DropoutNd)):
+            module.eval()
+    try:
+        yield model
+    finally:
+        model.train(was_training)
@@ -18,6 +18,7 @@
  *                                                                         *
  ****
 """
+import functools
 import hashlib
 from importlib import import_module
 import os
@@ -41,14 +42,45 @@ def create_folder(path_to_folder):
     return path_to_folder
 
 
+def iter_files(root_dir, extension):
+    """Yields the paths of the files of root_dir and of its subfolders that end with
+    extension. Uses os.scandir, whose entries already know whether they are
+    directories, so no extra stat call is made per entry. Symlinked folders are not
+    followed, as in Path.glob("**"), so symlink cycles cannot loop forever.
+
+    Args:
+        root_dir (str): folder to be searched.
+        extension (str): file extension, without the leading dot.
+
+    Yields:
+        str: file paths.
+    """
+    suffix = f".{extension}"
+    folders = [str(root_dir)]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.name.endswith(suffix) and not entry.is_dir():
+                    yield entry.path
+
+
 def hash_file(filename):
     """"This function returns the SHA-1 hash
-    of the file passed into it"""
+    of the file passed into it. Hashes are cached by path, inode, size and
+    modification time, so an unchanged file is read only once."""
+    stat = os.stat(filename)
+    return _hash_file(
+        os.path.abspath(filename), stat.st_ino, stat.st_size, stat.st_mtime_ns
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def _hash_file(filename, inode, size, mtime_ns):
     h = hashlib.sha1()
     with open(filename, "rb") as file:
-        chunk = 0
-        while chunk != b"":
-            chunk = file.read(1024)
+        for chunk in iter(lambda: file.read(1 << 20), b""):
             h.update(chunk)
     return h.hexdigest()
 
@@ -63,12 +63,23 @@ def _draw_circle(draw, center, radius, fill):
     )
 
 
+def apply_transform_to_coords(transform, coords):
+    """Applies an affine transform to a (N, 2) array of coordinates at once, instead
+    of multiplying the transform by one point at a time. Extra dimensions (z) are
+    dropped.
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    a, b, c, d, e, f = tuple(transform)[:6]
+    x, y = coords[:, 0], coords[:, 1]
+    return np.stack([a * x + b * y + c, d * x + e * y + f], axis=-1)
+
+
 def polygons_to_pixel_coords(polygons, transform):
     item_list = []
     for polygon in polygons:
         item_list += polygon.geoms if polygon.geom_type == "MultiPolygon" else [polygon]
     return [
-        np.array([~transform * point for point in np.array(polygon.exterior.coords)])
+        apply_transform_to_coords(~transform, polygon.exterior.coords)
         for polygon in item_list
     ]
 
@@ -79,7 +90,7 @@ def polygons_to_world_coords(polygons, transform, epsg_number):
         item_list += polygon.geoms if polygon.geom_type == "MultiPolygon" else [polygon]
     return [
         shapely.geometry.Polygon(
-            np.array([transform * point for point in np.array(polygon.exterior.coords)])
+            apply_transform_to_coords(transform, polygon.exterior.coords)
         )
         for polygon in item_list
     ]
@@ -149,15 +160,18 @@ def compute_raster_masks(
     polygons = [polygon for polygon in polygons if polygon.area > 0]
     channel_count = fill + edges + vertices
     polygons_raster = np.zeros((*shape, channel_count), dtype=np.uint8)
-    distance_maps = np.ones(
-        (*shape, len(polygons))
-    )  # Init with max value (distances are normed)
+    # Only the closest and second-closest distances of each pixel are needed, so they
+    # are kept as two running minimums instead of one distance map per polygon.
+    closest_distances = np.full((2, *shape), np.inf) if compute_distances else None
     sizes = np.ones(shape)  # Init with max value (sizes are normed)
     image_area = shape[0] * shape[1]
-    for i, polygon in enumerate(polygons):
-        if polygon.geom_type == "Polygon":
-            _process_polygon(
-                polygon,
+    for polygon in polygons:
+        polygon_dist = None
+        for single_polygon in (
+            [polygon] if polygon.geom_type == "Polygon" else polygon.geoms
+        ):
+            polygon_dist = _process_polygon(
+                single_polygon,
                 shape,
                 transform,
                 fill,
@@ -166,28 +180,13 @@ def compute_raster_masks(
                 line_width,
                 antialiasing,
                 polygons_raster,
-                distance_maps,
                 sizes,
                 image_area,
-                i,
+                compute_distances,
+                compute_sizes,
             )
-        else:
-            for single_polygon in polygon.geoms:
-                _process_polygon(
-                    single_polygon,
-                    shape,
-                    transform,
-                    fill,
-                    edges,
-                    vertices,
-                    line_width,
-                    antialiasing,
-                    polygons_raster,
-                    distance_maps,
-                    sizes,
-                    image_area,
-                    i,
-                )
+        if polygon_dist is not None:
+            _update_closest_distances(closest_distances, polygon_dist)
 
     polygons_raster = np.clip(polygons_raster, 0, 255)
     # skimage.io.imsave("polygons_raster.png", polygons_raster)
@@ -195,8 +194,7 @@ def compute_raster_masks(
     if edges:
         _compute_edges(fill, edges, polygons_raster, line_width)
 
-    distances = _compute_distances(distance_maps)
-    distances = distances.astype(np.float32)
+    distances = _compute_distances(closest_distances) if compute_distances else None
     sizes = sizes.astype(np.float32)
     return_dict = {
         key: mask.transpose()
@@ -206,7 +204,7 @@ def compute_raster_masks(
         )
     }
     if compute_distances:
-        return_dict["distance_masks"] = distances
+        return_dict["distance_masks"] = distances.astype(np.float32)
     if compute_sizes:
         return_dict["size_masks"] = sizes
     return return_dict
@@ -222,13 +220,13 @@ def _process_polygon(
     line_width,
     antialiasing,
     polygons_raster,
-    distance_maps,
     sizes,
     image_area,
-    i,
+    compute_distances=True,
+    compute_sizes=True,
 ):
     polygon = shapely.geometry.Polygon(
-        np.array([~transform * point for point in np.array(polygon.exterior.coords)])
+        apply_transform_to_coords(~transform, polygon.exterior.coords)
     )
     mini, minj, maxi, maxj = _compute_raster_bounds_coods(
         polygon, polygons_raster, line_width
@@ -243,9 +241,7 @@ def _process_polygon(
     )
     bbox_mask = np.sum(bbox_raster, axis=2) > 0
     # Polygon interior + edge + vertexif bbox_mask.max():  # Make sure mask is not empty
-    _compute_distance_and_sizes(
-        i,
-        distance_maps,
+    return _compute_distance_and_sizes(
         sizes,
         polygon,
         image_area,
@@ -256,6 +252,8 @@ def _process_polygon(
         maxj,
         bbox_mask,
         line_width,
+        compute_distances,
+        compute_sizes,
     )
 
 
@@ -269,8 +267,6 @@ def _compute_raster_bounds_coods(polygon, polygons_raster, line_width):
 
 
 def _compute_distance_and_sizes(
-    i,
-    distance_maps,
     sizes,
     polygon,
     image_area,
@@ -281,21 +277,29 @@ def _compute_distance_and_sizes(
     maxj,
     bbox_mask,
     line_width,
+    compute_distances=True,
+    compute_sizes=True,
 ):
-    polygon_mask = np.zeros(shape, dtype=np.bool_)
-    polygon_mask[mini:maxi, minj:maxj] = bbox_mask
-    polygon_dist = cv.distanceTransform(
-        1 - polygon_mask.astype(np.uint8),
-        distanceType=cv.DIST_L2,
-        maskSize=cv.DIST_MASK_5,
-        dstType=cv.CV_64F,
-    )
-    polygon_dist /= polygon_mask.shape[0] + polygon_mask.shape[1]  # Normalize dist
-    distance_maps[:, :, i] = polygon_dist
+    """Updates sizes in place and returns the normalized distance map of the
+    polygon, or None if compute_distances is False.
+    """
+    polygon_dist = None
+    if compute_distances:
+        polygon_mask = np.zeros(shape, dtype=np.bool_)
+        polygon_mask[mini:maxi, minj:maxj] = bbox_mask
+        polygon_dist = cv.distanceTransform(
+            1 - polygon_mask.astype(np.uint8),
+            distanceType=cv.DIST_L2,
+            maskSize=cv.DIST_MASK_5,
+            dstType=cv.CV_64F,
+        )
+        polygon_dist /= polygon_mask.shape[0] + polygon_mask.shape[1]  # Normalize dist
 
-    selem = skimage.morphology.disk(line_width)
-    bbox_dilated_mask = skimage.morphology.binary_dilation(bbox_mask, selem=selem)
-    sizes[mini:maxi, minj:maxj][bbox_dilated_mask] = polygon.area / image_area
+    if compute_sizes:
+        selem = skimage.morphology.disk(line_width)
+        bbox_dilated_mask = skimage.morphology.binary_dilation(bbox_mask, selem=selem)
+        sizes[mini:maxi, minj:maxj][bbox_dilated_mask] = polygon.area / image_area
+    return polygon_dist
 
 
 def _compute_edges(fill, edges, polygons_raster, line_width):
@@ -307,10 +311,22 @@ def _compute_edges(fill, edges, polygons_raster, line_width):
     polygons_raster[:, -line_width:, edge_channels] = 0
 
 
-def _compute_distances(distance_maps):
-    distance_maps.sort(axis=2)
-    distance_maps = distance_maps[:, :, :2]
-    distances = np.sum(distance_maps, axis=2)
+def _update_closest_distances(closest_distances, polygon_dist):
+    """Inserts polygon_dist into the (2, H, W) running closest and second-closest
+    distances, in place.
+    """
+    np.minimum(
+        closest_distances[1],
+        np.maximum(closest_distances[0], polygon_dist),
+        out=closest_distances[1],
+    )
+    np.minimum(closest_distances[0], polygon_dist, out=closest_distances[0])
+
+
+def _compute_distances(closest_distances):
+    # slots never filled (images with less than two polygons) do not add up
+    closest_distances[np.isinf(closest_distances)] = 0
+    distances = np.sum(closest_distances, axis=0)
     return distances
 
 
@@ -39,13 +39,24 @@ def label2vertex(labels):
     :param labels: 1D labels
     :return: 2D vertices coordinates: [(x1, y1),(x2,y2),...]
     """
-    vertices = []
-    for label in labels:
-        if label == 784:
-            break
-        vertex = ((label % 28) * 8, (label / 28) * 8)
-        vertices.append(vertex)
-    return vertices
+    labels = truncate_at_end_token(labels, 784)
+    rows, cols = np.divmod(labels, 28)
+    return list(zip((cols * 8).tolist(), (rows * 8).tolist()))
+
+
+def truncate_at_end_token(labels, end_token: int) -> np.ndarray:
+    """Returns the labels that come before the first end_token as a numpy array.
+
+    Args:
+        labels (Union[List, np.ndarray]): 1D labels.
+        end_token (int): end of sequence token.
+
+    Returns:
+        np.ndarray: labels up to, and not including, the first end_token.
+    """
+    labels = np.asarray(labels)
+    end = np.flatnonzero(labels == end_token)
+    return labels[: end[0]] if end.size > 0 else labels
 
 
 def get_vertex_list(
@@ -56,7 +67,7 @@ def get_vertex_list(
     min_row: Optional[int] = 0,
     return_cast_func: Optional[Callable] = None,
     grid_size: Optional[int] = 28,
-) -> List[float]:
+) -> np.ndarray:
     """Gets vertex list from input.
 
     Args:
@@ -67,19 +78,19 @@ def get_vertex_list(
         min_row (Optional[int], optional): Minimun row. Defaults to 0.
 
     Returns:
-        List[float]: List of the vertexes
+        np.ndarray: (N, 2) array of the vertexes
     """
     return_cast_func = return_cast_func if return_cast_func is not None else lambda x: x
+    labels = truncate_at_end_token(input_list, grid_size * grid_size)
+    rows, cols = np.divmod(labels, grid_size)
     return return_cast_func(
-        [
-            (
-                ((label % grid_size) * 8.0 + 4) / scale_w + min_col,
-                ((float(label // grid_size)) * 8.0 + 4) / scale_h + min_row,
-            )
-            for label in itertools.takewhile(
-                lambda x: x != grid_size * grid_size, input_list
-            )
-        ]
+        np.stack(
+            [
+                (cols * 8.0 + 4) / scale_w + min_col,
+                (rows * 8.0 + 4) / scale_h + min_row,
+            ],
+            axis=-1,
+        )
     )
 
 
@@ -246,23 +257,26 @@ def getbboxfromkps(kps, h, w):
 
 def img2tensor(img):
     """
-
-    :param img:
-    :return:
+    Wraps a HWC image as a CHW tensor. The permutation only changes the strides, so
+    no pixel is copied unless img is not contiguous.
+    :param img: HWC numpy image
+    :return: CHW tensor sharing memory with img
     """
-    img = np.rollaxis(img, 2, 0)
-    return torch.from_numpy(img)
+    return torch.from_numpy(np.ascontiguousarray(img)).permute(2, 0, 1)
 
 
-def tensor2img(tensor):
+def tensor2img(tensor, out=None):
     """
-
-    :param tensor:
-    :return:
+    Converts a CHW tensor with values in [0, 1] into a HWC uint8 image.
+    :param tensor: CHW tensor
+    :param out: optional preallocated HWC uint8 numpy array to write the image to
+    :return: HWC uint8 numpy image
     """
-    img = (tensor.numpy() * 255).astype("uint8")
-    img = np.rollaxis(img, 0, 3)
-    return img
+    img = torch.mul(tensor, 255).clamp_(0, 255).permute(1, 2, 0)
+    if out is None:
+        return img.to(torch.uint8).contiguous().numpy()
+    torch.from_numpy(out).copy_(img)
+    return out
 
 
 def poly01_to_poly0g(poly, grid_size):
@@ -289,77 +303,51 @@ def poly0g_to_poly01(polygon, grid_side):
 
 
 def build_arrays(polygon, num_vertexes, sequence_length, grid_size=28):
-    point_count = 2
-    label_array = np.zeros([sequence_length, grid_size * grid_size + 3])
-    label_index_array = np.zeros([sequence_length])
+    """Encodes a polygon as the polygon rnn target sequence. The first two steps are
+    left empty, the vertexes follow and, for short polygons, the sequence is padded
+    by cycling through [end, start, start, vertex_0, ..., vertex_n-1].
+
+    Args:
+        polygon (np.ndarray): (N, 2) polygon vertexes in the 224x224 crop coordinates
+        num_vertexes (int): number of vertexes of the polygon
+        sequence_length (int): length of the output sequence
+        grid_size (int, optional): Defaults to 28.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: one-hot encoded sequence
+            (sequence_length, grid_size * grid_size + 3) and its indexes
+            (sequence_length,).
+    """
+    end_index = grid_size * grid_size
     polygon = poly0g_to_poly01(polygon, 224)
     polygon = poly01_to_poly0g(polygon, grid_size)
+    vertex_indexes = polygon[:, 0] + polygon[:, 1] * grid_size
+    label_index_array = np.zeros([sequence_length])
     if num_vertexes < sequence_length - 3:
-        for points in polygon:
-            _initialize_label_index_array(
-                point_count, label_array, label_index_array, points, grid_size=grid_size
-            )
-            point_count += 1
-        _populate_label_index_array(
-            polygon,
-            num_vertexes,
-            sequence_length,
-            point_count,
-            label_array,
-            label_index_array,
+        point_count = 2 + len(vertex_indexes)
+        label_index_array[2:point_count] = vertex_indexes
+        label_index_array[point_count] = end_index
+        cycle = np.concatenate(
+            [
+                [end_index + 1, end_index + 2],
+                vertex_indexes[:num_vertexes],
+                [end_index],
+            ]
         )
+        steps = np.arange(point_count + 1, sequence_length)
+        label_index_array[point_count + 1 :] = cycle[steps % (num_vertexes + 3)]
     else:
         scale = num_vertexes * 1.0 / (sequence_length - 3)
         index_list = (np.arange(0, sequence_length - 3) * scale).astype(int)
-        for points in polygon[index_list]:
-            _initialize_label_index_array(
-                point_count, label_array, label_index_array, points, grid_size=grid_size
-            )
-            point_count += 1
-        for kkk in range(point_count, sequence_length):
-            index = grid_size * grid_size
-            label_array[kkk, index] = 1
-            label_index_array[kkk] = index
+        label_index_array[2 : sequence_length - 1] = vertex_indexes[index_list]
+        label_index_array[sequence_length - 1] = end_index
+    label_array = np.zeros([sequence_length, end_index + 3])
+    label_array[
+        np.arange(2, sequence_length), label_index_array[2:].astype(np.int64)
+    ] = 1
     return label_array, label_index_array
 
 
-def _populate_label_index_array(
-    polygon,
-    num_vertexes,
-    sequence_length,
-    point_count,
-    label_array,
-    label_index_array,
-    grid_size=28,
-):
-    label_array[point_count, grid_size * grid_size] = 1
-    label_index_array[point_count] = grid_size * grid_size
-    for kkk in range(point_count + 1, sequence_length):
-        if kkk % (num_vertexes + 3) == num_vertexes + 2:
-            index = grid_size * grid_size
-        elif kkk % (num_vertexes + 3) == 0:
-            index = grid_size * grid_size + 1
-        elif kkk % (num_vertexes + 3) == 1:
-            index = grid_size * grid_size + 2
-        else:
-            index_a = polygon[kkk % (num_vertexes + 3) - 2][0]
-            index_b = polygon[kkk % (num_vertexes + 3) - 2][1]
-            index = index_b * grid_size + index_a
-        label_array[kkk, index] = 1
-        label_index_array[kkk] = index
-
-
-def _initialize_label_index_array(
-    point_count, label_array, label_index_array, points, grid_size=28
-):
-    # index_a = int(points[0] / 8)
-    # index_b = int(points[1] / 8)
-    # index = index_b * grid_size + index_a
-    index = points[0] + points[1] * grid_size
-    label_array[point_count, index] = 1
-    label_index_array[point_count] = index
-
-
 def handle_vertices(vertices: Union[List, BaseGeometry]) -> BaseGeometry:
     if isinstance(vertices, BaseGeometry):
         return vertices
@@ -331,3 +331,26 @@ def batch_to_cuda(batch):
         if hasattr(item, "cuda"):
             batch[key] = item.cuda(non_blocking=True)
     return batch
+
+
+class RunningMean(object):
+    """Keeps running sums and element counts of the detached tensors logged at each
+    step, so that epoch averages do not require keeping every step output.
+    """
+
+    def __init__(self):
+        self.sums = dict()
+        self.counts = dict()
+
+    def update(self, values):
+        for key, value in values.items():
+            value = torch.as_tensor(value).detach().float()
+            self.sums[key] = self.sums.get(key, 0.0) + value.sum()
+            self.counts[key] = self.counts.get(key, 0) + value.numel()
+
+    def compute(self):
+        return {key: self.sums[key] / self.counts[key] for key in self.sums}
+
+    def reset(self):
+        self.sums.clear()
+        self.counts.clear()
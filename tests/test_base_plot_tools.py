@@ -20,6 +20,7 @@
  ****
 """
 import os
+import tempfile
 import unittest
 import warnings
 from pathlib import Path
@@ -36,10 +37,6 @@ from pytorch_segmentation_models_trainer.dataset_loader.dataset import (
 )
 from numpy.testing import assert_array_equal
 from parameterized import parameterized
-from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
-    remove_folder,
-)
 from pytorch_segmentation_models_trainer.tools.visualization.base_plot_tools import (
     visualize_image_with_bboxes,
 )
@@ -55,10 +52,11 @@ class Test_BasePlotTools(unittest.TestCase):
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
 
     def tearDown(self):
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_visualize_image_with_bboxes(self):
         csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
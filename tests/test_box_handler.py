@@ -21,6 +21,7 @@
 """
 
 import os
+import tempfile
 import unittest
 import warnings
 from hydra import compose, initialize
@@ -40,10 +41,6 @@ from pytorch_segmentation_models_trainer.tools.dataset_handlers.convert_dataset
 from pytorch_segmentation_models_trainer.tools.detection.bbox_handler import (
     BboxTileMerger,
 )
-from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
-    remove_folder,
-)
 from pytorch_segmentation_models_trainer.tools.detection import bbox_handler
 
 current_dir = os.path.dirname(__file__)
@@ -56,10 +53,11 @@ class Test_BoxHandler(unittest.TestCase):
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
 
     def tearDown(self):
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_shift_bbox(self) -> None:
         """
@@ -20,6 +20,7 @@
  ****
 """
 import os
+import tempfile
 import unittest
 from pathlib import Path
 import warnings
@@ -35,13 +36,13 @@ from numpy.testing import assert_array_equal
 from parameterized import parameterized
 from pytorch_segmentation_models_trainer.tools.data_handlers.data_writer import (
     BatchVectorFileDataWriter,
+    QueuedDataWriter,
     RasterDataWriter,
     VectorDatabaseDataWriter,
     VectorFileDataWriter,
 )
-from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
-    remove_folder,
+from pytorch_segmentation_models_trainer.tools.data_handlers.vector_reader import (
+    read_vector_file,
 )
 from rasterio.plot import reshape_as_raster
 from shapely.geometry import Polygon
@@ -56,10 +57,11 @@ class Test_DataWriter(unittest.TestCase):
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
 
     def tearDown(self):
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_raster_data_writer(self) -> None:
         input_data = np.ones([256, 256, 1], dtype=np.uint8)
@@ -85,13 +87,35 @@ class Test_DataWriter(unittest.TestCase):
             output_data = raster_ds.read()
         assert_array_equal(reshape_as_raster(input_data), output_data)
 
+    def test_raster_data_writer_tiled(self) -> None:
+        input_data = np.random.randint(0, 256, size=(600, 520, 3), dtype=np.uint8)
+        profile = {
+            "driver": "GTiff",
+            "dtype": "uint8",
+            "nodata": None,
+            "width": 520,
+            "height": 600,
+            "count": 3,
+            "crs": pyproj.CRS.from_epsg(31982),
+            "transform": Affine(
+                0.35, 0.0, 456828.3563822131, 0.0, -0.35, 6717252.490058491
+            ),
+        }
+        output_file_path = os.path.join(self.output_dir, "output.tif")
+        data_writer = RasterDataWriter(output_file_path=output_file_path)
+        data_writer.write_data(input_data=input_data, profile=profile)
+        with rasterio.open(output_file_path, "r") as raster_ds:
+            self.assertEqual(raster_ds.block_shapes, [(256, 256)] * 3)
+            output_data = raster_ds.read()
+        assert_array_equal(reshape_as_raster(input_data), output_data)
+
     def test_vector_file_data_writer(self) -> None:
         input_data = [Polygon([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])]
         output_file_path = os.path.join(self.output_dir, "output.geojson")
         data_writer = VectorFileDataWriter(output_file_path=output_file_path)
         data_writer.write_data(input_data=input_data, profile={"crs": "EPSG:4326"})
         assert os.path.isfile(output_file_path)
-        output_data = geopandas.read_file(filename=output_file_path)
+        output_data = read_vector_file(output_file_path)
         assert input_data[0].equals(output_data["geometry"][0])
 
     def test_batch_vector_file_data_writer(self) -> None:
@@ -104,7 +128,24 @@ class Test_DataWriter(unittest.TestCase):
                 self.output_dir, f"output_{i:08}.geojson"
             )
             assert os.path.isfile(current_output_file_path)
-            output_data = geopandas.read_file(filename=current_output_file_path)
+            output_data = read_vector_file(current_output_file_path)
+            assert input_data[0].equals(output_data["geometry"][0])
+
+    def test_queued_data_writer(self) -> None:
+        input_data = [Polygon([[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]])]
+        output_file_path = os.path.join(self.output_dir, "output.geojson")
+        data_writer = QueuedDataWriter(
+            data_writer=BatchVectorFileDataWriter(output_file_path=output_file_path),
+            max_pending_writes=2,
+        )
+        for _ in range(4):
+            data_writer.write_data(input_data=input_data, profile={"crs": "EPSG:4326"})
+        data_writer.close()
+        for i in range(4):
+            current_output_file_path = os.path.join(
+                self.output_dir, f"output_{i:08}.geojson"
+            )
+            output_data = read_vector_file(current_output_file_path)
             assert input_data[0].equals(output_data["geometry"][0])
 
     def test_vector_database_data_writer(self) -> None:
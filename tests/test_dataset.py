@@ -21,8 +21,11 @@
 """
 
 import dataclasses
+import importlib.util
 import json
 import os
+import tempfile
+import unittest
 
 import albumentations as A
 from albumentations.pytorch.transforms import ToTensorV2
@@ -39,13 +42,22 @@ from pytorch_segmentation_models_trainer.config_definitions.coco_dataset_config
     LicenseConfig,
 )
 from pytorch_segmentation_models_trainer.dataset_loader.dataset import (
+    FrameFieldSegmentationDataset,
     InstanceSegmentationDataset,
     NaiveModPolyMapperDataset,
     ObjectDetectionDataset,
+    PackedStringArray,
     PolygonRNNDataset,
     SegmentationDataset,
     load_augmentation_object,
     ModPolyMapperDataset,
+    normalize_on_device,
+)
+from pytorch_segmentation_models_trainer.dataset_loader.prefetcher import (
+    DataPrefetcher,
+)
+from pytorch_segmentation_models_trainer.dataset_loader.samplers import (
+    ShapeGroupedBatchSampler,
 )
 
 from tests.utils import CustomTestCase
@@ -100,11 +112,77 @@ class Test_Dataset(CustomTestCase):
                 ds_from_cfg[0]["image"], ds_from_ref[0]["image"]
             ) and np.array_equal(ds_from_cfg[0]["mask"], ds_from_ref[0]["mask"])
 
+    def test_load_image_with_cv2_decoder(self) -> None:
+        ds_pil = SegmentationDataset(input_csv_path=self.csv_ds_file)
+        ds_cv2 = SegmentationDataset(
+            input_csv_path=self.csv_ds_file, image_decoder="cv2"
+        )
+        for idx in range(2):
+            np.testing.assert_array_equal(ds_pil[idx]["image"], ds_cv2[idx]["image"])
+            np.testing.assert_array_equal(ds_pil[idx]["mask"], ds_cv2[idx]["mask"])
+
+    def test_packed_string_columns(self) -> None:
+        ds = SegmentationDataset(
+            input_csv_path=self.csv_ds_file_without_root, root_dir=self.root_dir
+        )
+        self.assertIsInstance(ds._columns[ds.image_key], PackedStringArray)
+        self.assertEqual(list(ds._columns[ds.image_key]), ds.df[ds.image_key].tolist())
+        self.assertEqual(
+            ds._columns[ds.image_key][np.array([1, 0])],
+            ds.df[ds.image_key].iloc[[1, 0]].tolist(),
+        )
+        self.assertEqual(
+            ds.get_path(0), ds._add_root_dir_to_path(ds.df[ds.image_key].iloc[0])
+        )
+
+    @unittest.skipIf(
+        importlib.util.find_spec("pyarrow") is None
+        and importlib.util.find_spec("fastparquet") is None,
+        reason="Reading parquet requires pyarrow or fastparquet",
+    )
+    def test_load_dataset_from_parquet(self) -> None:
+        ds_csv = SegmentationDataset(input_csv_path=self.csv_ds_file)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            parquet_path = os.path.join(tmp_dir, "dataset.parquet")
+            ds_csv.df.to_parquet(parquet_path)
+            ds_parquet = SegmentationDataset(input_csv_path=parquet_path)
+            self.assertTrue(ds_parquet.df.equals(ds_csv.df))
+            np.testing.assert_array_equal(ds_parquet[0]["image"], ds_csv[0]["image"])
+
+    def test_segmentation_dataset_gpu_decode(self) -> None:
+        ds = SegmentationDataset(input_csv_path=self.csv_ds_file, gpu_decode=True)
+        ds_ref = SegmentationDataset(input_csv_path=self.csv_ds_file)
+        item = ds[0]
+        with open(ds.get_path(0), "rb") as f:
+            self.assertEqual(item["image"].numpy().tobytes(), f.read())
+        np.testing.assert_array_equal(item["mask"], ds_ref[0]["mask"])
+        batch = ds.collate_fn([ds[0], ds[1]])
+        self.assertIsInstance(batch["image"], list)
+        self.assertEqual(batch["mask"].shape[0], 2)
+        with self.assertRaises(ValueError):
+            SegmentationDataset(
+                input_csv_path=self.csv_ds_file,
+                augmentation_list=A.Compose([A.CenterCrop(512, 512)]),
+                gpu_decode=True,
+            )
+
+    def test_load_image_with_image_cache(self) -> None:
+        ds = SegmentationDataset(input_csv_path=self.csv_ds_file)
+        cached_ds = SegmentationDataset(
+            input_csv_path=self.csv_ds_file, image_cache_size=2
+        )
+        for _ in range(2):
+            for idx in range(3):
+                np.testing.assert_array_equal(ds[idx]["image"], cached_ds[idx]["image"])
+                np.testing.assert_array_equal(ds[idx]["mask"], cached_ds[idx]["mask"])
+                self.assertLessEqual(len(cached_ds._image_cache), 2)
+
     def test_load_augmentations(self) -> None:
         with initialize(config_path="./test_configs"):
             cfg = compose(config_name="augmentations.yaml")
             transformer = load_augmentation_object(cfg["augmentation_list"])
             assert isinstance(transformer, A.Compose)
+            assert load_augmentation_object(cfg["augmentation_list"]) is transformer
 
     def test_dataset_size_limit(self) -> None:
         with initialize(config_path="./test_configs"):
@@ -131,10 +209,32 @@ class Test_Dataset(CustomTestCase):
             )
             frame_field_ds = hydra.utils.instantiate(cfg, _recursive_=False)
         self.assertEqual(len(frame_field_ds), 12)
-        self.assertEqual(frame_field_ds[0]["image"].shape, (571, 571, 3))
-        self.assertEqual(frame_field_ds[0]["gt_polygons_image"].shape, (571, 571, 3))
+        self.assertEqual(frame_field_ds[0]["image"].shape, (3, 571, 571))
+        self.assertEqual(frame_field_ds[0]["gt_polygons_image"].shape, (3, 571, 571))
         self.assertEqual(frame_field_ds[0]["gt_crossfield_angle"].shape, (1, 571, 571))
 
+    def test_frame_field_dataset_packed_mask_transform(self):
+        csv_path = os.path.join(frame_field_root_dir, "dsg_dataset.csv")
+        frame_field_ds = FrameFieldSegmentationDataset(
+            input_csv_path=csv_path, root_dir=frame_field_root_dir
+        )
+        image = np.random.randint(0, 255, (64, 64, 3), dtype=np.uint8)
+        masks = [
+            np.random.randint(0, 2, (64, 64), dtype=np.uint8),
+            np.random.randint(0, 2, (64, 64), dtype=np.uint8),
+            np.random.rand(64, 64).astype(np.float32),
+            np.random.randint(0, 2, (64, 64), dtype=np.uint8),
+        ]
+        transform = A.Compose([A.Resize(32, 32)])
+        transformed = frame_field_ds.apply_transform_to_packed_masks(
+            transform, image, masks
+        )
+        expected = transform(image=image, masks=masks)
+        np.testing.assert_array_equal(transformed["image"], expected["image"])
+        self.assertEqual(len(transformed["masks"]), len(masks))
+        for mask, expected_mask in zip(transformed["masks"], expected["masks"]):
+            np.testing.assert_array_equal(mask, expected_mask)
+
     def test_coco_dataset(self):
         coco_ds = CocoDatasetConfig(
             info=CocoDatasetInfoConfig(
@@ -561,6 +661,58 @@ class Test_Dataset(CustomTestCase):
             ds_item["ta"].shape, (58,)
         )  # tensor (N, 3, 300, 300), 3 lists of N tensors each
 
+    def test_polygon_rnn_dataset_label_dtype_fits_grid_size(self):
+        csv_path = os.path.join(polygon_rnn_root_dir, "polygonrnn_dataset.csv")
+        for grid_size, expected_dtype in [(28, torch.int16), (182, torch.int32)]:
+            polygon_rnn_ds = PolygonRNNDataset(
+                input_csv_path=csv_path,
+                root_dir=polygon_rnn_root_dir,
+                grid_size=grid_size,
+            )
+            self.assertEqual(polygon_rnn_ds._label_index_arrays.dtype, expected_dtype)
+
+    def test_polygon_rnn_dataset_with_polygon_cache(self):
+        csv_path = os.path.join(polygon_rnn_root_dir, "polygonrnn_dataset.csv")
+        polygon_rnn_ds = PolygonRNNDataset(
+            input_csv_path=csv_path, root_dir=polygon_rnn_root_dir
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached_polygon_rnn_ds = PolygonRNNDataset(
+                input_csv_path=csv_path,
+                root_dir=polygon_rnn_root_dir,
+                polygon_cache_dir=cache_dir,
+            )
+            for idx in [0, 10, len(polygon_rnn_ds) - 1]:
+                polygon, num_vertexes = polygon_rnn_ds.load_polygon(idx)
+                (
+                    cached_polygon,
+                    cached_num_vertexes,
+                ) = cached_polygon_rnn_ds.load_polygon(idx)
+                np.testing.assert_array_equal(polygon, cached_polygon)
+                self.assertEqual(num_vertexes, cached_num_vertexes)
+
+    def test_polygon_rnn_dataset_rebuilds_stale_polygon_cache(self):
+        csv_path = os.path.join(polygon_rnn_root_dir, "polygonrnn_dataset.csv")
+        polygon_rnn_ds = PolygonRNNDataset(
+            input_csv_path=csv_path, root_dir=polygon_rnn_root_dir
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            PolygonRNNDataset(
+                input_csv_path=csv_path,
+                root_dir=polygon_rnn_root_dir,
+                polygon_cache_dir=cache_dir,
+                n_first_rows_to_read=10,
+            )
+            cached_polygon_rnn_ds = PolygonRNNDataset(
+                input_csv_path=csv_path,
+                root_dir=polygon_rnn_root_dir,
+                polygon_cache_dir=cache_dir,
+            )
+            idx = len(polygon_rnn_ds) - 1
+            polygon, _ = polygon_rnn_ds.load_polygon(idx)
+            cached_polygon, _ = cached_polygon_rnn_ds.load_polygon(idx)
+            np.testing.assert_array_equal(polygon, cached_polygon)
+
     def test_object_detection_dataset(self):
         csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
         obj_det_ds = ObjectDetectionDataset(
@@ -584,6 +736,169 @@ class Test_Dataset(CustomTestCase):
         self.assertEqual(target["boxes"].shape, (1, 4))
         self.assertEqual(target["labels"].shape, (1,))
 
+    def test_object_detection_dataset_with_bbox_cache(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path, root_dir=os.path.dirname(csv_path)
+        )
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cached_obj_det_ds = ObjectDetectionDataset(
+                input_csv_path=csv_path,
+                root_dir=os.path.dirname(csv_path),
+                bbox_cache_dir=cache_dir,
+            )
+            for idx in range(len(obj_det_ds)):
+                bboxes, labels = obj_det_ds.load_bounding_boxes_and_labels(idx)
+                (
+                    cached_bboxes,
+                    cached_labels,
+                ) = cached_obj_det_ds.load_bounding_boxes_and_labels(idx)
+                self.assertTrue(torch.equal(bboxes.reshape(-1, 4), cached_bboxes))
+                self.assertTrue(torch.equal(labels, cached_labels))
+
+    def test_object_detection_dataset_convert_bboxes(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path, root_dir=os.path.dirname(csv_path)
+        )
+        bbox_list = [[19.23, 383.18, 314.5, 244.46], [376.81, 189.76, 96.7, 56.95]]
+        self.assertTrue(
+            torch.allclose(
+                obj_det_ds.convert_bboxes(bbox_list),
+                torch.tensor(
+                    [obj_det_ds.convert_bbox(bbox) for bbox in bbox_list],
+                    dtype=torch.float32,
+                ),
+            )
+        )
+        self.assertEqual(obj_det_ds.convert_bboxes([]).shape, (0, 4))
+
+    def test_object_detection_dataset_uint8_images(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path,
+            root_dir=os.path.dirname(csv_path),
+            augmentation_list=A.Compose(
+                [A.CenterCrop(512, 512)],
+                bbox_params=A.BboxParams(format="coco", label_fields=["labels"]),
+            ),
+        )
+        image, _, _ = obj_det_ds[0]
+        self.assertEqual(image.shape, (3, 512, 512))
+        self.assertEqual(image.dtype, torch.uint8)
+        mean, std = [0.485, 0.456, 0.406], [0.229, 0.224, 0.225]
+        normalized = normalize_on_device(image.unsqueeze(0), mean=mean, std=std)
+        expected = A.Normalize(mean=mean, std=std)(
+            image=image.permute(1, 2, 0).numpy()
+        )["image"]
+        np.testing.assert_allclose(
+            normalized[0].permute(1, 2, 0).numpy(), expected, atol=1e-5
+        )
+
+    def test_object_detection_dataset_gpu_decode(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path, root_dir=os.path.dirname(csv_path), gpu_decode=True
+        )
+        image, target, _ = obj_det_ds[0]
+        with open(obj_det_ds.get_path(0), "rb") as f:
+            self.assertEqual(image.numpy().tobytes(), f.read())
+        images, targets, _ = obj_det_ds.collate_fn([obj_det_ds[0], obj_det_ds[1]])
+        self.assertIsInstance(images, list)
+        self.assertEqual(len(targets), 2)
+        with self.assertRaises(ValueError):
+            ObjectDetectionDataset(
+                input_csv_path=csv_path,
+                augmentation_list=A.Compose([A.CenterCrop(512, 512)]),
+                gpu_decode=True,
+            )
+
+    @unittest.skipIf(
+        not torch.cuda.is_available(), reason="Pinned memory requires a GPU"
+    )
+    def test_object_detection_dataloader_pins_memory(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path,
+            root_dir=os.path.dirname(csv_path),
+            augmentation_list=A.Compose(
+                [A.CenterCrop(512, 512), A.Normalize(), ToTensorV2()],
+                bbox_params=A.BboxParams(format="coco", label_fields=["labels"]),
+            ),
+        )
+        data_loader = torch.utils.data.DataLoader(
+            obj_det_ds,
+            batch_size=2,
+            num_workers=1,
+            pin_memory=True,
+            collate_fn=obj_det_ds.collate_fn,
+        )
+        images, targets, indexes = next(iter(data_loader))
+        self.assertTrue(images.is_pinned())
+        self.assertTrue(indexes.is_pinned())
+        for target in targets:
+            self.assertTrue(target["boxes"].is_pinned())
+            self.assertTrue(target["labels"].is_pinned())
+
+    def test_shape_grouped_batch_sampler(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path, root_dir=os.path.dirname(csv_path)
+        )
+        obj_det_ds.df.loc[obj_det_ds.df.index[:3], "width"] += 1
+        sampler = ShapeGroupedBatchSampler(obj_det_ds, batch_size=2, shuffle=True)
+        batches = list(sampler)
+        self.assertEqual(len(batches), len(sampler))
+        self.assertEqual(
+            sorted(idx for batch in batches for idx in batch),
+            list(range(len(obj_det_ds))),
+        )
+        for batch in batches:
+            self.assertEqual(
+                len(
+                    set(
+                        map(
+                            tuple,
+                            obj_det_ds.df[["width", "height"]].iloc[batch].to_numpy(),
+                        )
+                    )
+                ),
+                1,
+            )
+
+    def test_object_detection_data_prefetcher(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        obj_det_ds = ObjectDetectionDataset(
+            input_csv_path=csv_path,
+            root_dir=os.path.dirname(csv_path),
+            augmentation_list=A.Compose(
+                [A.CenterCrop(512, 512), A.Normalize(), ToTensorV2()],
+                bbox_params=A.BboxParams(format="coco", label_fields=["labels"]),
+            ),
+        )
+        data_loader = torch.utils.data.DataLoader(
+            obj_det_ds,
+            batch_size=4,
+            pin_memory=torch.cuda.is_available(),
+            collate_fn=obj_det_ds.collate_fn,
+        )
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        prefetcher = DataPrefetcher(data_loader, device)
+        self.assertEqual(len(prefetcher), 3)
+        for (images, targets, indexes), (
+            expected_images,
+            expected_targets,
+            _,
+        ) in zip(prefetcher, data_loader):
+            self.assertEqual(images.device.type, device.type)
+            self.assertEqual(indexes.device.type, device.type)
+            self.assertTrue(torch.equal(images.cpu(), expected_images))
+            for target, expected_target in zip(targets, expected_targets):
+                self.assertEqual(target["boxes"].device.type, device.type)
+                self.assertTrue(
+                    torch.equal(target["boxes"].cpu(), expected_target["boxes"])
+                )
+
     def test_instance_segmentation_dataset(self):
         csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
         obj_det_ds = InstanceSegmentationDataset(
@@ -661,6 +976,15 @@ class Test_Dataset(CustomTestCase):
         self.assertEqual(target["x2"].shape, (2, 58, 787))
         self.assertEqual(target["x3"].shape, (2, 58, 787))
         self.assertEqual(target["ta"].shape, (2, 58))
+        polygon_rnn_ds = ds.polygon_rnn_dataset
+        for i, idx in enumerate(
+            polygon_rnn_ds.get_indices_from_image_path(
+                ds.object_detection_dataset.get_path(0, add_root_dir=False)
+            ).tolist()
+        ):
+            item = polygon_rnn_ds.__getitem__(idx, load_images=False)
+            for key in ["x1", "x2", "x3", "ta"]:
+                self.assertTrue(torch.equal(target[key][i], item[key]))
         # test batch build
         data_loader = torch.utils.data.DataLoader(
             ds,
@@ -678,3 +1002,35 @@ class Test_Dataset(CustomTestCase):
         self.assertEqual(targets[0]["x2"].shape, (2, 58, 787))
         self.assertEqual(targets[0]["x3"].shape, (2, 58, 787))
         self.assertEqual(targets[0]["ta"].shape, (2, 58))
+
+    @unittest.skipIf(
+        not torch.cuda.is_available(), reason="Pinned memory requires a GPU"
+    )
+    def test_mod_polymapper_dataloader_pins_memory(self):
+        csv_path = os.path.join(detection_root_dir, "geo", "dsg_dataset.csv")
+        poly_csv_path = os.path.join(polygon_rnn_root_dir, "polygonrnn_dataset.csv")
+        ds = ModPolyMapperDataset(
+            object_detection_dataset=ObjectDetectionDataset(
+                input_csv_path=csv_path,
+                root_dir=os.path.dirname(csv_path),
+                augmentation_list=A.Compose(
+                    [A.CenterCrop(512, 512), A.Normalize(), ToTensorV2()],
+                    bbox_params=A.BboxParams(format="coco", label_fields=["labels"]),
+                ),
+            ),
+            polygon_rnn_dataset=PolygonRNNDataset(
+                input_csv_path=poly_csv_path,
+                sequence_length=60,
+                root_dir=polygon_rnn_root_dir,
+                augmentation_list=[A.Normalize(), ToTensorV2()],
+            ),
+        )
+        data_loader = torch.utils.data.DataLoader(
+            ds, batch_size=2, num_workers=1, pin_memory=True, collate_fn=ds.collate_fn
+        )
+        images, targets, indexes = next(iter(data_loader))
+        self.assertTrue(images.is_pinned())
+        self.assertTrue(indexes.is_pinned())
+        for target in targets:
+            for key in ("boxes", "labels", "x1", "x2", "x3", "ta"):
+                self.assertTrue(target[key].is_pinned())
@@ -25,6 +25,7 @@ import unittest
 from importlib import import_module
 
 import hydra
+import kornia
 import numpy as np
 import segmentation_models_pytorch as smp
 import torch
@@ -154,6 +155,58 @@ class Test_FrameFieldModel(CustomTestCase):
             frame_field_model = getattr(module, class_name)(cfg)
         self.assertIsInstance(frame_field_model, FrameFieldSegmentationPLModel)
 
+    def get_gpu_augmentation_batch(self):
+        image = torch.rand([2, 3, 32, 32])
+        return {
+            "image": image,
+            "gt_polygons_image": image.clone(),
+            "gt_crossfield_angle": image[:, :1].clone(),
+        }
+
+    def test_apply_gpu_augmentations(self) -> None:
+        flip = kornia.augmentation.AugmentationSequential(
+            kornia.augmentation.RandomHorizontalFlip(p=1.0)
+        )
+        batch = self.get_gpu_augmentation_batch()
+        batch.pop("gt_crossfield_angle")
+        expected = torch.flip(batch["image"], dims=[-1])
+        batch = FrameFieldSegmentationPLModel.apply_gpu_augmentations(
+            FrameFieldSegmentationPLModel, batch, flip
+        )
+        torch.testing.assert_allclose(batch["image"], expected)
+        torch.testing.assert_allclose(batch["gt_polygons_image"], expected)
+
+    def test_apply_gpu_augmentations_keeps_crossfield_angle(self) -> None:
+        torch.manual_seed(0)
+        color_jitter = kornia.augmentation.AugmentationSequential(
+            kornia.augmentation.ColorJitter(0.1, 0.1, 0.1, 0.1, p=1.0)
+        )
+        batch = self.get_gpu_augmentation_batch()
+        expected_angle = batch["gt_crossfield_angle"].clone()
+        batch = FrameFieldSegmentationPLModel.apply_gpu_augmentations(
+            FrameFieldSegmentationPLModel, batch, color_jitter
+        )
+        torch.testing.assert_allclose(batch["gt_crossfield_angle"], expected_angle)
+
+    @parameterized.expand(
+        [
+            (kornia.augmentation.RandomHorizontalFlip(p=1.0),),
+            (kornia.augmentation.RandomRotation(degrees=45.0, p=1.0),),
+        ]
+    )
+    def test_apply_gpu_augmentations_rejects_geometric_with_crossfield(
+        self, augmentation
+    ) -> None:
+        torch.manual_seed(0)
+        transform = kornia.augmentation.AugmentationSequential(augmentation)
+        batch = self.get_gpu_augmentation_batch()
+        expected_angle = batch["gt_crossfield_angle"].clone()
+        with self.assertRaises(ValueError):
+            FrameFieldSegmentationPLModel.apply_gpu_augmentations(
+                FrameFieldSegmentationPLModel, batch, transform
+            )
+        torch.testing.assert_allclose(batch["gt_crossfield_angle"], expected_angle)
+
     @parameterized.expand(input_model_overrides_list)
     def test_train_frame_field_model(self, overrides_list) -> None:
         csv_path = os.path.join(frame_field_root_dir, "dsg_dataset.csv")
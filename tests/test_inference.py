@@ -19,7 +19,10 @@
  *                                                                         *
  ****
 """
+import concurrent.futures
+import functools
 import json
+import multiprocessing
 import os
 from pathlib import Path
 import unittest
@@ -46,6 +49,7 @@ from pytorch_segmentation_models_trainer.model_loader.frame_field_model import (
     FrameFieldSegmentationPLModel,
 )
 from pytorch_segmentation_models_trainer.tools.data_handlers.data_writer import (
+    BatchVectorFileDataWriter,
     VectorFileDataWriter,
 )
 from pytorch_segmentation_models_trainer.tools.inference.export_inference import (
@@ -93,18 +97,41 @@ pretrained_checkpoints_download_links = {
 }
 
 
+@functools.lru_cache(maxsize=None)
+def load_frame_field_ds(config_name):
+    """Composes and instantiates the frame field dataset once per config, instead
+    of once per test.
+    """
+    csv_path = os.path.join(frame_field_root_dir, "dsg_dataset.csv")
+    with initialize(config_path="./test_configs"):
+        cfg = compose(
+            config_name=config_name,
+            overrides=[
+                "input_csv_path=" + csv_path,
+                "root_dir=" + frame_field_root_dir,
+            ],
+        )
+        return hydra.utils.instantiate(cfg, _recursive_=False)
+
+
 class Test_Inference(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.frame_field_ds = load_frame_field_ds("frame_field_dataset.yaml")
+        # building smp.Unet loads the pretrained encoder weights, the processors
+        # only run it, so one instance is shared by the tests
+        cls.unet = smp.Unet().eval()
+        with rasterio.open(cls.frame_field_ds[0]["path"], "r") as raster_ds:
+            cls.crs = raster_ds.crs
+            cls.profile = raster_ds.profile
+            cls.transform = raster_ds.transform
+
     def setUp(self):
         warnings.simplefilter("ignore", category=ImportWarning)
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
         self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
-        self.frame_field_ds = self.get_frame_field_ds()
-        with rasterio.open(self.frame_field_ds[0]["path"], "r") as raster_ds:
-            self.crs = raster_ds.crs
-            self.profile = raster_ds.profile
-            self.transform = raster_ds.transform
         self.polygonizers_dict = {
             "simple": self.get_simple_polygonizer(),
             "acm": self.get_acm_polygonizer(),
@@ -117,22 +144,11 @@ class Test_Inference(unittest.TestCase):
         remove_folder(self.output_dir)
 
     def get_frame_field_ds(self, with_center_crop=False):
-        config_name = (
+        return load_frame_field_ds(
             "frame_field_dataset.yaml"
             if not with_center_crop
             else "frame_field_dataset_with_center_crop.yaml"
         )
-        csv_path = os.path.join(frame_field_root_dir, "dsg_dataset.csv")
-        with initialize(config_path="./test_configs"):
-            cfg = compose(
-                config_name=config_name,
-                overrides=[
-                    "input_csv_path=" + csv_path,
-                    "root_dir=" + frame_field_root_dir,
-                ],
-            )
-            frame_field_ds = hydra.utils.instantiate(cfg, _recursive_=False)
-        return frame_field_ds
 
     def get_simple_polygonizer(self):
         config = SimplePolConfig()
@@ -200,15 +216,59 @@ class Test_Inference(unittest.TestCase):
 
         output_file_path = os.path.join(self.output_dir, "output.tif")
         inference_processor = SingleImageInfereceProcessor(
-            model=smp.Unet(),
+            model=self.unet,
+            device=device,
+            batch_size=1,
+            export_strategy=RasterExportInferenceStrategy(
+                output_file_path=output_file_path
+            ),
+        )
+        inference_processor.process(image_path=self.frame_field_ds[0]["path"])
+        assert os.path.isfile(output_file_path)
+
+    def test_batch_data_writer_with_process_polygonizer_executor(self) -> None:
+        data_writer = BatchVectorFileDataWriter(
+            output_file_path=os.path.join(self.output_dir, "output.geojson")
+        )
+        inference_processor = SingleImageInfereceProcessor(
+            model=self.unet,
+            device=device,
+            batch_size=1,
+            export_strategy=None,
+            polygonizer=SimplePolygonizerProcessor(
+                data_writer=data_writer, config=SimplePolConfig()
+            ),
+        )
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [
+                inference_processor.process(
+                    image_path=self.frame_field_ds[0]["path"],
+                    save_inference_output=False,
+                    polygonizer_executor=pool,
+                )["polygonizer_future"]
+                for _ in range(2)
+            ]
+            for future in futures:
+                future.result()
+        # the writer stays in this process, so its index counts both images
+        self.assertEqual(data_writer.current_index, 2)
+
+    def test_create_inference_with_jit_trace(self) -> None:
+        output_file_path = os.path.join(self.output_dir, "output.tif")
+        inference_processor = SingleImageInfereceProcessor(
+            model=self.unet,
             device=device,
             batch_size=1,
             export_strategy=RasterExportInferenceStrategy(
                 output_file_path=output_file_path
             ),
+            jit_trace=True,
         )
         inference_processor.process(image_path=self.frame_field_ds[0]["path"])
         assert os.path.isfile(output_file_path)
+        self.assertEqual(len(inference_processor._traced_models), 1)
 
     @parameterized.expand([(False,), (True,)])
     def test_create_frame_field_inference_from_inference_processor(
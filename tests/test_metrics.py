@@ -51,6 +51,27 @@ class Test_Metrics(unittest.TestCase):
         iou, _, __ = metrics.polygon_iou(polygon1, polygon2)
         self.assertAlmostEqual(iou, 0.5)
 
+    def test_polygon_iou_batch(self) -> None:
+        batch1 = [
+            [2, 0, 2, 2, 0, 2, 0, 0],
+            [2, 0, 2, 2, 0, 2, 0, 0],
+            [[1, 1]],
+            [5, 5, 6, 5, 6, 6, 5, 6],
+        ]
+        batch2 = [
+            [1, 1, 4, 1, 4, 4, 1, 4],
+            [0, 0, 2, 2, 2, 0, 0, 2],
+            [2, 0, 2, 2, 0, 2, 0, 0],
+            [0, 0, 2, 2, 2, 0, 0, 2],
+        ]
+        output = metrics.batch_polygon_iou(batch1, batch2)
+        self.assertEqual(output.shape, (4, 3))
+        np.testing.assert_array_almost_equal(
+            output,
+            np.array([metrics.polygon_iou(a, b) for a, b in zip(batch1, batch2)]),
+        )
+        self.assertEqual(metrics.batch_polygon_iou([], []).shape, (0, 3))
+
     def test_polis(self) -> None:
         polygon1 = Polygon([(0, 0), (0, 2), (2, 2), (2, 0), (0, 0)])
         polygon2 = Polygon([(0, 0), (0, 2), (3, 3), (2, 0), (0, 0)])
@@ -19,6 +19,7 @@
  *                                                                         *
  ****
 """
+import copy
 import os
 import subprocess
 from typing import Dict, Optional
@@ -51,6 +52,7 @@ from pytorch_segmentation_models_trainer.model_loader.polygon_rnn_model import (
     PolygonRNN,
 )
 from pytorch_segmentation_models_trainer.custom_models.mod_polymapper.modpolymapper import (
+    FinalConvBlock,
     ModPolyMapper,
 )
 from pytorch_segmentation_models_trainer.train import train
@@ -180,6 +182,62 @@ class Test_ModPolyMapperModel(BasicTestCase):
         self.assertEqual(len(out), 2)
         self.assertEqual(len(out[0].keys()), 8)
 
+    def test_model_forward_channels_last(self) -> None:
+        model = self._get_model(channels_last=True)
+        sample = torch.randn([2, 3, 256, 256])
+        model.eval()
+        with torch.no_grad():
+            out = model(sample)
+        self.assertEqual(len(out), 2)
+        self.assertEqual(len(out[0].keys()), 8)
+
+    def test_fuse_conv_bn(self) -> None:
+        model = self._get_model()
+        sample = torch.randn([2, 3, 224, 224])
+        model.eval()
+        with torch.no_grad():
+            expected = model.polygonrnn_model.get_backbone_output_features(sample)
+            model.fuse_conv_bn()
+            output = model.polygonrnn_model.get_backbone_output_features(sample)
+        self.assertTrue(torch.allclose(output, expected, atol=1e-5))
+
+    def test_group_final_conv_blocks_after_fuse_conv_bn(self) -> None:
+        model = self._get_model().polygonrnn_model
+        model.eval()
+        grouped_then_fused = copy.deepcopy(model)
+        grouped_then_fused.group_final_conv_blocks()
+        grouped_then_fused.fuse_conv_bn()
+        model.fuse_conv_bn()
+        model.group_final_conv_blocks()
+        sample = torch.randn([2, 3, 224, 224])
+        with torch.no_grad():
+            expected = grouped_then_fused.get_backbone_output_features(sample)
+            output = model.get_backbone_output_features(sample)
+        self.assertTrue(torch.allclose(output, expected, atol=1e-5))
+
+    def test_final_conv_block_rejects_old_layout(self) -> None:
+        block = FinalConvBlock(in_channels=8, out_channels=4)
+        # the old Conv -> ReLU -> BN layout stored the batch norm at index 3
+        old_state_dict = {
+            key.replace("conv_block.2.", "conv_block.3."): value
+            for key, value in block.state_dict().items()
+        }
+        with self.assertRaisesRegex(RuntimeError, "retrained"):
+            FinalConvBlock(in_channels=8, out_channels=4).load_state_dict(
+                old_state_dict
+            )
+
+    @unittest.skipIf(not torch.cuda.is_available(), reason="CUDA graphs require a GPU")
+    def test_polygonrnn_cuda_graph_inference(self) -> None:
+        model = self._get_model().cuda()
+        model.eval()
+        sample = torch.randn([3, 3, 224, 224], device="cuda")
+        with torch.no_grad():
+            expected = model.polygonrnn_model.test(sample, 10)
+            model.polygonrnn_model.cuda_graph_inference = True
+            output = model.polygonrnn_model.test(sample, 10)
+        self.assertTrue(torch.equal(output, expected))
+
     def test_model_backwards(self) -> None:
         model = self._get_model(backbone_trainable_layers=5, pretrained=True)
         data_loader = self._get_dataloader()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+/***************************************************************************
+ segmentation_models_trainer
+                              -------------------
+        begin                : 2021-03-30
+        git sha              : $Format:%H$
+        copyright            : (C) 2021 by Philipe Borba -
+                                    Cartographic Engineer @ Brazilian Army
+        email                : philipeborba at gmail dot com
+ ***************************************************************************/
+
+/***************************************************************************
+ *                                                                         *
+ *   This program is free software; you can redistribute it and/or modify  *
+ *   it under the terms of the GNU General Public License as published by  *
+ *   the Free Software Foundation; either version 2 of the License, or     *
+ *   (at your option) any later version.                                   *
+ *                                                                         *
+ ****
+"""
+import os
+import tempfile
+import unittest
+
+from pytorch_segmentation_models_trainer.utils.os_utils import iter_files
+
+
+class Test_OsUtils(unittest.TestCase):
+    def setUp(self) -> None:
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root_dir = self.temp_dir.name
+        nested_dir = os.path.join(self.root_dir, "a", "b")
+        os.makedirs(nested_dir)
+        for path in [
+            os.path.join(self.root_dir, "image.tif"),
+            os.path.join(self.root_dir, "a", "image.tif"),
+            os.path.join(nested_dir, "image.tif"),
+            os.path.join(nested_dir, "image.png"),
+        ]:
+            open(path, "w").close()
+        # cycle: a/b/loop points back to the root folder
+        os.symlink(self.root_dir, os.path.join(nested_dir, "loop"))
+        os.symlink(nested_dir, os.path.join(self.root_dir, "link.tif"))
+
+    def tearDown(self) -> None:
+        self.temp_dir.cleanup()
+
+    def test_iter_files(self) -> None:
+        self.assertEqual(
+            sorted(iter_files(self.root_dir, "tif")),
+            sorted(
+                [
+                    os.path.join(self.root_dir, "image.tif"),
+                    os.path.join(self.root_dir, "a", "image.tif"),
+                    os.path.join(self.root_dir, "a", "b", "image.tif"),
+                ]
+            ),
+        )
+        self.assertEqual(
+            list(iter_files(self.root_dir, "png")),
+            [os.path.join(self.root_dir, "a", "b", "image.png")],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
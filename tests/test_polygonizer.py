@@ -21,18 +21,20 @@
 """
 
 import os
+import tempfile
 import unittest
 import warnings
 
-import geopandas
 import hydra
 import rasterio
-import torch
 from geopandas.testing import geom_almost_equals
 from hydra import compose, initialize
 from pytorch_segmentation_models_trainer.tools.data_handlers.data_writer import (
     VectorFileDataWriter,
 )
+from pytorch_segmentation_models_trainer.tools.data_handlers.vector_reader import (
+    read_vector_file,
+)
 from pytorch_segmentation_models_trainer.tools.polygonization.polygonizer import (
     ACMConfig,
     ACMPolygonizerProcessor,
@@ -42,10 +44,6 @@ from pytorch_segmentation_models_trainer.tools.polygonization.polygonizer import
     SimplePolygonizerProcessor,
 )
 from pytorch_segmentation_models_trainer.utils import frame_field_utils
-from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
-    remove_folder,
-)
 
 current_dir = os.path.dirname(__file__)
 root_dir = os.path.join(current_dir, "testing_data")
@@ -58,22 +56,34 @@ device = "cpu"
 
 
 class Test_Polygonize(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # the dataset and the raster profile are read only by the tests, so they are
+        # built once for the whole class
+        cls.frame_field_ds = cls.get_frame_field_ds()
+        with rasterio.open(cls.frame_field_ds[0]["path"], "r") as raster_ds:
+            cls.crs = raster_ds.crs
+            cls.profile = raster_ds.profile
+            cls.transform = raster_ds.transform
+        sample = cls.frame_field_ds[0]
+        cls.seg = sample["gt_polygons_image"].unsqueeze(0)
+        cls.crossfield = frame_field_utils.compute_crossfield_to_plot(
+            sample["gt_crossfield_angle"]
+        )
+
     def setUp(self):
         warnings.simplefilter("ignore", category=ImportWarning)
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
-        self.frame_field_ds = self.get_frame_field_ds()
-        with rasterio.open(self.frame_field_ds[0]["path"], "r") as raster_ds:
-            self.crs = raster_ds.crs
-            self.profile = raster_ds.profile
-            self.transform = raster_ds.transform
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
 
     def tearDown(self):
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
-    def get_frame_field_ds(self):
+    @staticmethod
+    def get_frame_field_ds():
         csv_path = os.path.join(frame_field_root_dir, "dsg_dataset.csv")
         with initialize(config_path="./test_configs"):
             cfg = compose(
@@ -92,20 +102,16 @@ class Test_Polygonize(unittest.TestCase):
         data_writer = VectorFileDataWriter(output_file_path=output_file_path)
         processor = SimplePolygonizerProcessor(data_writer=data_writer, config=config)
         processor.process(
-            {
-                "seg": torch.movedim(
-                    self.frame_field_ds[0]["gt_polygons_image"], -1, 0
-                ).unsqueeze(0)
-            },
+            {"seg": self.seg},
             self.profile,
         )
         assert os.path.isfile(output_file_path)
-        expected_output_gdf = geopandas.read_file(
-            filename=os.path.join(
+        expected_output_gdf = read_vector_file(
+            os.path.join(
                 root_dir, "expected_outputs", "polygonize", "simple_polygonizer.geojson"
             )
         )
-        output_features_gdf = geopandas.read_file(filename=output_file_path)
+        output_features_gdf = read_vector_file(output_file_path)
         assert geom_almost_equals(
             expected_output_gdf["geometry"], output_features_gdf["geometry"]
         )
@@ -116,23 +122,16 @@ class Test_Polygonize(unittest.TestCase):
         data_writer = VectorFileDataWriter(output_file_path=output_file_path)
         processor = ACMPolygonizerProcessor(data_writer=data_writer, config=config)
         processor.process(
-            {
-                "seg": torch.movedim(
-                    self.frame_field_ds[0]["gt_polygons_image"], -1, 0
-                ).unsqueeze(0),
-                "crossfield": frame_field_utils.compute_crossfield_to_plot(
-                    self.frame_field_ds[0]["gt_crossfield_angle"]
-                ),
-            },
+            {"seg": self.seg, "crossfield": self.crossfield},
             self.profile,
         )
         assert os.path.isfile(output_file_path)
-        expected_output_gdf = geopandas.read_file(
-            filename=os.path.join(
+        expected_output_gdf = read_vector_file(
+            os.path.join(
                 root_dir, "expected_outputs", "polygonize", "acm_polygonizer.geojson"
             )
         )
-        output_features_gdf = geopandas.read_file(filename=output_file_path)
+        output_features_gdf = read_vector_file(output_file_path)
         assert geom_almost_equals(
             expected_output_gdf["geometry"], output_features_gdf["geometry"]
         )
@@ -143,23 +142,16 @@ class Test_Polygonize(unittest.TestCase):
         data_writer = VectorFileDataWriter(output_file_path=output_file_path)
         processor = ASMPolygonizerProcessor(data_writer=data_writer, config=config)
         processor.process(
-            {
-                "seg": torch.movedim(
-                    self.frame_field_ds[0]["gt_polygons_image"], -1, 0
-                ).unsqueeze(0),
-                "crossfield": frame_field_utils.compute_crossfield_to_plot(
-                    self.frame_field_ds[0]["gt_crossfield_angle"]
-                ),
-            },
+            {"seg": self.seg, "crossfield": self.crossfield},
             self.profile,
         )
         assert os.path.isfile(output_file_path)
-        expected_output_gdf = geopandas.read_file(
-            filename=os.path.join(
+        expected_output_gdf = read_vector_file(
+            os.path.join(
                 root_dir, "expected_outputs", "polygonize", "asm_polygonizer.geojson"
             )
         )
-        output_features_gdf = geopandas.read_file(filename=output_file_path)
+        output_features_gdf = read_vector_file(output_file_path)
         assert geom_almost_equals(
             expected_output_gdf["geometry"], output_features_gdf["geometry"]
         )
@@ -78,6 +78,31 @@ class Test_PolygonRNNUtils(unittest.TestCase):
         output_vertex_list = polygonrnn_utils.get_vertex_list(label_index_array[2::])
         np.testing.assert_array_almost_equal(polygon, output_vertex_list)
 
+    def test_get_vertex_list_stops_at_end_token(self) -> None:
+        labels = np.array([30, 1, 784, 5, 784])
+        output_vertex_list = polygonrnn_utils.get_vertex_list(
+            labels, scale_h=2.0, scale_w=0.5, min_col=3, min_row=4
+        )
+        np.testing.assert_array_almost_equal(
+            output_vertex_list, [[43.0, 10.0], [27.0, 6.0]]
+        )
+        self.assertEqual(polygonrnn_utils.label2vertex(labels), [(16, 8), (8, 0)])
+        self.assertEqual(
+            polygonrnn_utils.get_vertex_list(np.array([784, 1])).shape, (0, 2)
+        )
+
+    def test_img2tensor_round_trip(self) -> None:
+        img = np.random.randint(0, 256, size=(8, 6, 3), dtype=np.uint8)
+        tensor = polygonrnn_utils.img2tensor(img)
+        self.assertEqual(tensor.shape, (3, 8, 6))
+        self.assertEqual(tensor.data_ptr(), img.ctypes.data)
+        output = polygonrnn_utils.tensor2img(tensor.float() / 255)
+        self.assertEqual(output.dtype, np.uint8)
+        np.testing.assert_allclose(output, img, atol=1)
+        out = np.empty_like(img)
+        self.assertIs(polygonrnn_utils.tensor2img(tensor.float() / 255, out=out), out)
+        np.testing.assert_array_equal(out, output)
+
     def test_encode_polygons_on_batch(self) -> None:
         polygon1 = np.array([[100, 100], [100, 204], [204, 204], [204, 100]])
         polygon2 = np.array([[204, 204], [220, 204], [220, 220], [220, 204]])
@@ -22,6 +22,7 @@
 
 import os
 import shutil
+import tempfile
 import unittest
 
 from collections.abc import Iterable
@@ -31,9 +32,7 @@ from pytorch_segmentation_models_trainer.tools.parallel_processing.process_execu
     Executor,
 )
 from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
     hash_file,
-    remove_folder,
 )
 
 current_dir = os.path.dirname(__file__)
@@ -51,11 +50,11 @@ class Test_ProcessExecutor(unittest.TestCase):
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
-        create_folder(self.output_dir)
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
 
     def tearDown(self):
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_execute_process(self) -> None:
         directory_in_str = os.path.join(root_dir, "data", "images")
@@ -20,6 +20,7 @@
  ****
 """
 import os
+import tempfile
 import unittest
 import warnings
 
@@ -36,10 +37,6 @@ from pytorch_segmentation_models_trainer.tools.polygonization.skeletonize_tensor
     skeletons_to_tensorskeleton,
     tensorskeleton_to_skeletons,
 )
-from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
-    remove_folder,
-)
 
 
 def build_skeleton1():
@@ -71,11 +68,12 @@ class Test_Skeletonize(unittest.TestCase):
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
         self.skan_skeletons_list = [build_skeleton1(), build_skeleton2()]
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
         return super().setUp()
 
     def tearDown(self) -> None:
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_skeletonize(self) -> None:
         device = "cpu"
@@ -20,6 +20,7 @@
  ****
 """
 import os
+import tempfile
 import unittest
 import warnings
 
@@ -30,13 +31,10 @@ import matplotlib.pyplot as plt
 from matplotlib.testing.compare import compare_images
 from parameterized.parameterized import parameterized
 from pytorch_segmentation_models_trainer.utils.tensor_utils import (
+    RunningMean,
     polygons_to_tensorpoly,
     tensorpoly_pad,
 )
-from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
-    remove_folder,
-)
 
 current_dir = os.path.dirname(__file__)
 root_dir = os.path.join(current_dir, "testing_data")
@@ -48,11 +46,12 @@ class Test_TensorUtils(unittest.TestCase):
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
         return super().setUp()
 
     def tearDown(self) -> None:
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_tensor_utils(self) -> None:
         device = "cpu"
@@ -129,3 +128,13 @@ class Test_TensorUtils(unittest.TestCase):
                 ]
             ),
         )
+
+    def test_running_mean(self) -> None:
+        running_mean = RunningMean()
+        running_mean.update({"loss": torch.tensor(1.0), "polis": torch.tensor([1, 2])})
+        running_mean.update({"loss": torch.tensor(3.0), "polis": torch.tensor([6])})
+        output = running_mean.compute()
+        self.assertAlmostEqual(output["loss"].item(), 2.0)
+        self.assertAlmostEqual(output["polis"].item(), 3.0)
+        running_mean.reset()
+        self.assertEqual(running_mean.compute(), {})
@@ -32,10 +32,11 @@ from pytorch_segmentation_models_trainer.tools.data_handlers.vector_reader impor
     COCOGeoDF,
     FileGeoDF,
     GeomTypeEnum,
+    get_ewkb_srid,
     handle_features,
     handle_geometry,
 )
-from shapely.geometry import LinearRing, LineString, Polygon
+from shapely.geometry import LinearRing, LineString, Polygon, box
 from shapely.geometry.multilinestring import MultiLineString
 from shapely.geometry.multipoint import MultiPoint
 
@@ -66,6 +67,43 @@ class Test_VectorReader(unittest.TestCase):
         geo_df = obj.get_geo_df()
         assert len(geo_df) > 0
 
+    def test_get_features_from_bbox_with_spatial_index(self) -> None:
+        file_name = os.path.join(root_dir, "data", "vectors", "test_polygons2.geojson")
+        obj = FileGeoDF(file_name=file_name)
+        x_min, y_min, x_max, y_max = obj.get_geo_df().total_bounds
+        x_max, y_max = (x_min + x_max) / 2, (y_min + y_max) / 2
+        feats = obj.get_features_from_bbox(
+            x_min, x_max, y_min, y_max, clip_to_extent=False
+        )
+        gdf = obj.get_geo_df()
+        expected = gdf[gdf.intersects(box(x_min, y_min, x_max, y_max))]
+        self.assertGreater(len(feats), 0)
+        self.assertListEqual(list(feats.index), list(expected.index))
+
+    def test_get_features_from_bbox_with_cached_bounds(self) -> None:
+        file_name = os.path.join(root_dir, "data", "vectors", "test_polygons2.geojson")
+        obj = FileGeoDF(file_name=file_name, build_spatial_index=False)
+        self.assertEqual(obj.bounds_array.shape, (len(obj.get_geo_df()), 4))
+        x_min, y_min, x_max, y_max = obj.get_geo_df().total_bounds
+        x_max, y_max = (x_min + x_max) / 2, (y_min + y_max) / 2
+        feats = obj.get_features_from_bbox(
+            x_min, x_max, y_min, y_max, clip_to_extent=False
+        )
+        expected = obj.get_geo_df().cx[x_min:x_max, y_min:y_max]
+        self.assertGreater(len(feats), 0)
+        self.assertListEqual(list(feats.index), list(expected.index))
+
+    def test_get_ewkb_srid(self) -> None:
+        self.assertEqual(
+            get_ewkb_srid(
+                bytes.fromhex("0101000020E6100000000000000000F03F0000000000000040")
+            ),
+            4326,
+        )
+        self.assertIsNone(
+            get_ewkb_srid(bytes.fromhex("0101000000000000000000F03F0000000000000040"))
+        )
+
     def test_instantiate_batch_file_reader(self) -> None:
         test_root_dir = os.path.join(root_dir, "data", "vectors")
         obj = BatchFileGeoDF(root_dir=test_root_dir)
@@ -75,6 +113,16 @@ class Test_VectorReader(unittest.TestCase):
         for key in json_key_list:
             assert len(obj.get_geodf_item(key)) > 0
 
+    def test_batch_file_reader_preload(self) -> None:
+        test_root_dir = os.path.join(root_dir, "data", "vectors")
+        obj = BatchFileGeoDF(root_dir=test_root_dir)
+        self.assertEqual(len(obj.vector_dict), 0)
+        obj.preload(max_workers=2)
+        self.assertEqual(obj.vector_dict.keys(), obj.file_dict.keys())
+        for key in obj.file_dict:
+            assert len(obj.get_geodf_item(key)) > 0
+        self.assertIsNone(obj.get_geodf_item("missing_key"))
+
     @parameterized.expand(
         [
             (
@@ -20,6 +20,7 @@
  ****
 """
 import os
+import tempfile
 import unittest
 import warnings
 
@@ -41,9 +42,7 @@ from pytorch_segmentation_models_trainer.utils.math_utils import (
     compute_crossfield_uv,
 )
 from pytorch_segmentation_models_trainer.utils.os_utils import (
-    create_folder,
     hash_file,
-    remove_folder,
 )
 
 current_dir = os.path.dirname(__file__)
@@ -62,10 +61,11 @@ class Test_Visualization(unittest.TestCase):
         warnings.simplefilter("ignore", category=DeprecationWarning)
         warnings.simplefilter("ignore", category=FutureWarning)
         warnings.simplefilter("ignore", category=UserWarning)
-        self.output_dir = create_folder(os.path.join(root_dir, "test_output"))
+        self._output_dir = tempfile.TemporaryDirectory()
+        self.output_dir = self._output_dir.name
 
     def tearDown(self):
-        remove_folder(self.output_dir)
+        self._output_dir.cleanup()
 
     def test_seg_display_real_example(self) -> None:
         csv_path = os.path.join(frame_field_root_dir, "dsg_dataset.csv")
@@ -82,9 +82,8 @@ class Test_Visualization(unittest.TestCase):
             frame_field_ds[0]["gt_crossfield_angle"]
         )
         image_seg_display = get_tensorboard_image_seg_display(
-            torch.movedim(frame_field_ds[0]["image"], -1, 0).unsqueeze(0),
-            255
-            * torch.movedim(frame_field_ds[0]["gt_polygons_image"], -1, 0).unsqueeze(0),
+            frame_field_ds[0]["image"].unsqueeze(0),
+            255 * frame_field_ds[0]["gt_polygons_image"].unsqueeze(0),
             crossfield=crossfield,
             crossfield_stride=8,
             width=1,